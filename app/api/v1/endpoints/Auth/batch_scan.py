@@ -0,0 +1,119 @@
+from datetime import datetime, timedelta, timezone
+from typing import Any, Dict, List, Optional
+
+from fastapi import APIRouter, Depends, HTTPException
+from sqlalchemy.orm import Session
+
+from app.core.config import get
+from app.db.database import get_db
+from app.models.user import User
+from app.schemas.batch_scan import BatchScanItem as BatchScanItemSchema
+from app.schemas.compliance_scan import ComplianceScanRequest
+from app.services.batch_scan import BatchScanService
+from app.services.batch_scan.poller import batch_poller
+from app.services.compliance_scan.compliance_scanner import ComplianceScanAgent
+from app.services.org_profiles import OrgProfileService
+from app.services.scan_history import ScanHistoryService
+from app.services.token_usage import TokenUsageService
+from app.utils.auth import get_current_active_superuser, get_current_user
+
+router = APIRouter()
+
+
+@router.post("/batch_scans", response_model=List[BatchScanItemSchema], status_code=202)
+def enqueue_batch_scans(
+    *,
+    db: Session = Depends(get_db),
+    scans: List[ComplianceScanRequest],
+    current_user: User = Depends(get_current_user),
+) -> Any:
+    """
+    Queue compliance scans for deferred batch processing, e.g. periodic
+    re-audits of stored documents.
+
+    Each scan takes the same body as /compliance_scan. Queued scans are
+    submitted to the batch backend off-peak, at the batch price, and finish
+    within a day; the result is then stored in the scan history under the
+    item's document_id. Poll /batch_scans/{item_id} for progress.
+    """
+    if len(scans) > get("BATCH_MAX_ITEMS"):
+        raise HTTPException(
+            status_code=400,
+            detail=f"At most {get('BATCH_MAX_ITEMS')} scans may be queued at once"
+        )
+
+    # Check every scan before queueing any of them, each on top of the scans already queued for its account
+    queued = []
+    pending_tokens: Dict[str, int] = {}
+    for compliance_data in scans:
+        formatted_data = {
+            "compliance_data": "\n\n".join([item.content for item in compliance_data.compliance_data]),
+            "questions": compliance_data.questions
+        }
+        if compliance_data.user_context:
+            formatted_data["user_context"] = compliance_data.user_context
+        org_profile = None
+        if compliance_data.org_profile_id is not None:
+            org_profile = OrgProfileService.resolve_for_user(db, compliance_data.org_profile_id, current_user)
+            formatted_data["user_context"] = {**(compliance_data.user_context or {}), "organization": org_profile.profile}
+            formatted_data["org_profile_json"] = org_profile.canonical_json
+        org_name = ScanHistoryService.org_name_from_context(formatted_data.get("user_context"))
+        usage_account = TokenUsageService.usage_account(org_profile, current_user)
+        if usage_account not in pending_tokens:
+            pending_tokens[usage_account] = BatchScanService.queued_tokens(db, usage_account)
+        estimated_tokens = TokenUsageService.check_budget(
+            db, usage_account, org_profile,
+            lambda: ComplianceScanAgent().estimate_prompt_tokens(formatted_data),
+            pending_tokens=pending_tokens[usage_account],
+        )
+        pending_tokens[usage_account] += estimated_tokens
+        queued.append((formatted_data, org_name, usage_account, compliance_data.org_profile_id, current_user.id,
+                       estimated_tokens))
+
+    return [BatchScanService.enqueue(db, *scan) for scan in queued]
+
+
+@router.get("/batch_scans/report")
+def batch_scan_report(
+    days: int = 7,
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_active_superuser),
+) -> Any:
+    """
+    Compare batch and interactive scans over the last `days` days: scans,
+    tokens and cost, scans and tokens per dollar, batch turnaround, and this
+    worker's live model latency and queue wait next to its batch cycles.
+
+    Only for superusers.
+    """
+    since = datetime.now(timezone.utc) - timedelta(days=max(days, 1))
+    return BatchScanService.report(db, since)
+
+
+@router.post("/batch_scans/run")
+async def run_batch_cycle(
+    current_user: User = Depends(get_current_active_superuser),
+) -> Any:
+    """
+    Collect finished batches and submit pending scans now, outside the
+    off-peak window.
+
+    Only for superusers.
+    """
+    return await batch_poller.run_cycle()
+
+
+@router.get("/batch_scans/{item_id}", response_model=BatchScanItemSchema)
+def read_batch_scan(
+    item_id: str,
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_user),
+) -> Any:
+    """Get a queued batch scan and its status."""
+    item = BatchScanService.get_item(db, item_id)
+    if not item:
+        raise HTTPException(
+            status_code=404,
+            detail="The batch scan with this item id does not exist",
+        )
+    return item
@@ -1,20 +1,36 @@
-from typing import Any
+from typing import Any, Optional
+import time
 
-from fastapi import APIRouter, Depends, HTTPException
+from fastapi import APIRouter, Depends, HTTPException, Query, Request
 from sqlalchemy.orm import Session
+from starlette.concurrency import run_in_threadpool
 
+from app.core import deadlines
+from app.core.responses import MeasuredORJSONResponse
 from app.db.database import get_db
+from app.models.user import User
 from app.schemas.compliance_scan import ComplianceScanRequest, ComplianceScanResponse
 from app.services.compliance_scan.compliance_scanner import ComplianceScanAgent
+from app.services.compliance_scan.scheduler import traffic_class
+from app.services.compliance_scan.single_flight import run_scan
+from app.services.near_duplicates import NearDuplicateService
+from app.services.org_profiles import OrgProfileService
+from app.services.scan_history import ScanHistoryService
+from app.services.token_usage import TokenUsageService
+from app.utils.auth import get_optional_user
+from app.utils.report_fields import parse_report_fields, select_report_fields
 
 router = APIRouter()
 
 
 @router.post("/compliance_scan", response_model=ComplianceScanResponse)
-def run_compliance_scan(
+async def run_compliance_scan(
     *,
+    request: Request,
     db: Session = Depends(get_db),
-    compliance_data: ComplianceScanRequest
+    current_user: Optional[User] = Depends(get_optional_user),
+    compliance_data: ComplianceScanRequest,
+    fields: Optional[str] = Query(None, description="Comma-separated detailed report fields to return, e.g. compliance_score,section_scores")
 ) -> Any:
     """
     Run a compliance scan on the provided data.
@@ -24,11 +40,33 @@ def run_compliance_scan(
     
     The user_context field can contain any JSON data that provides additional context
     for the compliance scan, such as organization information, relevant regulations,
-    or previous compliance history.
+    or previous compliance history. Set org_profile_id to use a registered
+    organization profile as the organization context; that requires signing
+    in as the user who registered it.
+
+    Successful scans are stored in the scan history.
+
+    Pass `fields` to return only some detailed report fields (for example
+    scores and status without the long narrative text).
+
+    The model call is cancelled if the client disconnects or the scan deadline
+    (SCAN_DEADLINE_SECONDS, or the X-Request-Deadline header) passes.
     
-    Note: Authentication is temporarily disabled for this endpoint.
+    Note: Authentication is temporarily disabled for this endpoint. Requests
+    with a valid bearer token are still identified, and signed-in users and
+    superusers get priority for the model over anonymous requests.
     """
+    selected_fields = parse_report_fields(fields)
+    deadlines.start(request)
+
+    # Resolve a registered organization profile if one is referenced; only its owner may use it
+    org_profile = None
+    if compliance_data.org_profile_id is not None:
+        org_profile = OrgProfileService.resolve_for_user(db, compliance_data.org_profile_id, current_user)
+
     try:
+        started = time.perf_counter()
+
         # Format the data for the compliance scanner
         formatted_data = {
             "compliance_data": "\n\n".join([item.content for item in compliance_data.compliance_data]),
@@ -38,14 +76,77 @@ def run_compliance_scan(
         # Add user context if provided
         if compliance_data.user_context:
             formatted_data["user_context"] = compliance_data.user_context
+        if org_profile is not None:
+            formatted_data["user_context"] = {**(compliance_data.user_context or {}), "organization": org_profile.profile}
+            formatted_data["org_profile_json"] = org_profile.canonical_json
         
         # Initialize the compliance scan agent
         compliance_agent = ComplianceScanAgent()
+        org_name = ScanHistoryService.org_name_from_context(formatted_data.get("user_context"))
+        document_hash = ScanHistoryService.hash_document(formatted_data["compliance_data"].encode("utf-8"))
+
+        # Reuse the assessment of near-identical earlier data instead of calling the model
+        signature = await run_in_threadpool(NearDuplicateService.signature, formatted_data["compliance_data"])
+        context_hash = NearDuplicateService.context_hash(formatted_data)
+        near_duplicate = await run_in_threadpool(
+            NearDuplicateService.find_match,
+            db, signature, org_name, context_hash, compliance_agent.llm_model, compliance_agent.prompt_version
+        )
+        if near_duplicate is not None:
+            prior, similarity = near_duplicate
+            document_info = compliance_agent._extract_document_info(formatted_data)
+            result = NearDuplicateService.reuse_response(prior, document_info["name"], document_info["size"], similarity)
+            await run_in_threadpool(
+                ScanHistoryService.record_scan,
+                db,
+                result,
+                document_hash=document_hash,
+                org_name=org_name,
+                model=compliance_agent.llm_model,
+                prompt_version=compliance_agent.prompt_version,
+                context_hash=context_hash,
+                timings={"total_ms": (time.perf_counter() - started) * 1000},
+                minhash=signature,
+                org_profile_id=org_profile.id if org_profile is not None else None,
+                user_id=current_user.id if current_user is not None else None,
+                reused_from=prior.document_id,
+            )
+            if selected_fields:
+                return MeasuredORJSONResponse(select_report_fields(result.model_dump(), selected_fields))
+            return result
+
+        usage_account = TokenUsageService.usage_account(org_profile, current_user)
+        await run_in_threadpool(TokenUsageService.check_budget, db, usage_account, org_profile,
+                                lambda: compliance_agent.estimate_prompt_tokens(formatted_data))
         
-        # Generate the compliance scan
-        result = compliance_agent.generate_compliance_scan(formatted_data)
-        
+        # Generate the compliance scan; the scan may wait for a model slot, so don't hold a connection
+        db.close()
+        scan = await deadlines.guard(request, run_scan(formatted_data, usage_account, document_type="json",
+                                                         traffic_class=traffic_class(current_user)), "llm_call")
+        result = scan["result"]
+
+        if not scan["used_fallback"]:
+            stored = await run_in_threadpool(
+                ScanHistoryService.record_scan,
+                db,
+                result,
+                document_hash=document_hash,
+                org_name=org_name,
+                model=scan["model"],
+                prompt_version=scan["prompt_version"],
+                context_hash=context_hash,
+                timings={"llm_ms": scan["llm_ms"], "total_ms": (time.perf_counter() - started) * 1000},
+                minhash=signature,
+                org_profile_id=org_profile.id if org_profile is not None else None,
+                user_id=current_user.id if current_user is not None else None,
+            )
+            NearDuplicateService.remember(stored, signature)
+
+        if selected_fields:
+            return MeasuredORJSONResponse(select_report_fields(result.model_dump(), selected_fields))
         return result
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(
             status_code=500,
@@ -0,0 +1,53 @@
+from typing import Any
+
+from fastapi import APIRouter, Depends, HTTPException
+from sqlalchemy.orm import Session
+
+from app.db.database import get_db
+from app.models.user import User
+from app.schemas.org_profile import OrgProfile as OrgProfileSchema, OrgProfileCreate
+from app.services.org_profiles import OrgProfileService
+from app.utils.auth import get_current_user
+
+router = APIRouter()
+
+
+@router.post("/org_profiles", response_model=OrgProfileSchema)
+def register_org_profile(
+    *,
+    db: Session = Depends(get_db),
+    profile_in: OrgProfileCreate,
+    current_user: User = Depends(get_current_user),
+) -> Any:
+    """
+    Register an organization profile, or replace the profile stored under the same name.
+
+    Scans can then reference the profile by id (`org_profile_id`) instead of
+    sending the organization JSON with every upload. The profile belongs to
+    the user who registers it: only they (and superusers) can scan with it,
+    read it or replace it. Only superusers can set `daily_token_budget`.
+    """
+    if profile_in.daily_token_budget is not None and not current_user.is_superuser:
+        raise HTTPException(
+            status_code=403,
+            detail="Only superusers can set a token budget"
+        )
+    return OrgProfileService.register(db, profile_in.name, profile_in.profile, current_user, profile_in.daily_token_budget)
+
+
+@router.get("/org_profiles/{profile_id}", response_model=OrgProfileSchema)
+def read_org_profile(
+    profile_id: int,
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_user),
+) -> Any:
+    """
+    Get a registered organization profile by id, if it is yours.
+    """
+    org_profile = OrgProfileService.get(db, profile_id)
+    if not org_profile or not OrgProfileService.can_use(org_profile.owner_id, current_user):
+        raise HTTPException(
+            status_code=404,
+            detail="The organization profile with this id does not exist",
+        )
+    return org_profile
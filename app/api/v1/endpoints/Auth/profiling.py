@@ -0,0 +1,67 @@
+from typing import Any
+from fastapi import APIRouter, Depends, HTTPException, Query
+from fastapi.responses import PlainTextResponse
+import asyncio
+import time
+
+from app.core import profiling
+from app.core.config import get
+from app.core.logging import log_info, log_request
+from app.models.user import User
+from app.utils.auth import get_current_active_superuser
+
+router = APIRouter()
+
+
+@router.get("/profiling/sample")
+async def sample_worker(
+    seconds: float = Query(10, gt=0, description="How long to sample for"),
+    interval_ms: float = Query(10, ge=1, le=1000, description="Time between samples"),
+    format: str = Query("collapsed", pattern="^(collapsed|json)$"),
+    include_idle: bool = Query(False, description="Keep samples of threads parked in waits and selects"),
+    current_user: User = Depends(get_current_active_superuser),
+) -> Any:
+    """
+    Sample the stacks of every thread in the worker serving this request.
+    Only for superusers.
+
+    The default ``collapsed`` format is a flamegraph-ready file (flamegraph.pl,
+    speedscope); ``json`` returns the stacks with the run summary, including
+    the measured sampling overhead. With several gunicorn workers, only the
+    worker that receives this request is profiled; the pid is in the
+    X-Profile-Pid header.
+    """
+    log_request("/profiling/sample", "GET", {"seconds": seconds, "interval_ms": interval_ms})
+    if seconds > get("PROFILING_MAX_SECONDS"):
+        raise HTTPException(
+            status_code=400,
+            detail=f"seconds must be at most {get('PROFILING_MAX_SECONDS')}"
+        )
+    if not profiling.try_acquire():
+        raise HTTPException(
+            status_code=409,
+            detail="A profile is already running on this worker"
+        )
+
+    profiler = profiling.SamplingProfiler(interval=interval_ms / 1000, include_idle=include_idle)
+    try:
+        profiler.start()
+        await asyncio.sleep(seconds)
+    finally:
+        profiler.stop()
+        profiling.release()
+
+    profiling.record_overhead(profiler)
+    summary = profiler.summary()
+    log_info(f"Sampling profile finished: {summary}")
+
+    if format == "json":
+        return {**summary, "stacks": dict(profiler.stacks.most_common())}
+    return PlainTextResponse(
+        profiler.collapsed(),
+        headers={
+            "Content-Disposition": f'attachment; filename="profile-{summary["pid"]}-{int(time.time())}.collapsed"',
+            "X-Profile-Pid": str(summary["pid"]),
+            "X-Profile-Overhead-Pct": str(summary["overhead_pct"]),
+        },
+    )
@@ -0,0 +1,107 @@
+from datetime import date
+from typing import Any, List, Optional
+
+from fastapi import APIRouter, Depends, HTTPException, Query
+from fastapi.responses import StreamingResponse
+from sqlalchemy.orm import Session
+
+from app.core.responses import MeasuredORJSONResponse
+from app.db.database import get_db
+from app.models.user import User
+from app.schemas.scan_result import ScanResult as ScanResultSchema, ScanResultSummary
+from app.services.scan_history import ScanExportService, ScanHistoryService
+from app.services.scan_history.scan_export import EXPORT_FORMATS
+from app.utils.auth import get_current_user
+from app.utils.report_fields import parse_report_fields, select_report_fields
+
+router = APIRouter()
+
+
+@router.get("/scan_results", response_model=List[ScanResultSummary])
+def list_scan_results(
+    db: Session = Depends(get_db),
+    org: Optional[str] = None,
+    document_hash: Optional[str] = None,
+    skip: int = 0,
+    limit: int = 100,
+    current_user: User = Depends(get_current_user),
+) -> Any:
+    """
+    List stored compliance scans, newest first.
+
+    Filter by organization name and/or the SHA-256 of the scanned document.
+    Only scans run with your registered profiles, or by you, are listed;
+    superusers see every scan.
+    """
+    return ScanHistoryService.list_scans(
+        db, org_name=org, document_hash=document_hash, skip=skip, limit=min(limit, 500),
+        scope=ScanHistoryService.scope(db, current_user),
+    )
+
+
+@router.get("/scan_results/export")
+def export_scan_results(
+    format: str = Query("ndjson", description="ndjson (one scan with its full response per line) or csv"),
+    org: Optional[str] = None,
+    status: Optional[str] = Query(None, description="Comma-separated compliance statuses, e.g. issues,review"),
+    min_score: Optional[int] = Query(None, ge=0, le=100),
+    max_score: Optional[int] = Query(None, ge=0, le=100),
+    start: Optional[date] = None,
+    end: Optional[date] = None,
+    after: Optional[int] = Query(None, ge=0, description="Resume after the row with this cursor"),
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_user),
+) -> Any:
+    """
+    Export stored compliance scans as a stream, oldest first.
+
+    Filter by organization name, compliance status, score range and an
+    inclusive day range. Rows are streamed from the database in batches, so
+    exports of any size start at once and use constant memory. Every row has a
+    `cursor`; to resume an interrupted export, repeat the request with `after`
+    set to the last cursor received. Like the list, only your scans (or all,
+    for superusers) are exported.
+    """
+    if format not in EXPORT_FORMATS:
+        raise HTTPException(status_code=400, detail=f"format must be one of: {', '.join(EXPORT_FORMATS)}")
+    if min_score is not None and max_score is not None and min_score > max_score:
+        raise HTTPException(status_code=400, detail="min_score must not be greater than max_score")
+    statuses = [value.strip() for value in status.split(",") if value.strip()] if status else None
+    query = ScanExportService.build_query(
+        org_name=org, statuses=statuses, min_score=min_score, max_score=max_score, start=start, end=end, after=after,
+        scope=ScanHistoryService.scope(db, current_user),
+    )
+    # The stream reads with its own session
+    db.close()
+    return StreamingResponse(
+        ScanExportService.stream(query, format),
+        media_type="application/x-ndjson" if format == "ndjson" else "text/csv",
+        headers={"Content-Disposition": f'attachment; filename="scan_results.{format}"'},
+    )
+
+
+@router.get("/scan_results/{document_id}", response_model=ScanResultSchema)
+def read_scan_result(
+    document_id: str,
+    db: Session = Depends(get_db),
+    fields: Optional[str] = Query(None, description="Comma-separated detailed report fields to return, e.g. compliance_score,section_scores"),
+    current_user: User = Depends(get_current_user),
+) -> Any:
+    """
+    Get a stored compliance scan, including the full report, by document id.
+    Scans you may not read (see the list) are reported as missing.
+
+    Pass `fields` to return only some detailed report fields.
+    """
+    selected_fields = parse_report_fields(fields)
+    scan_result = ScanHistoryService.get_scan(db, document_id, scope=ScanHistoryService.scope(db, current_user))
+    if not scan_result:
+        raise HTTPException(
+            status_code=404,
+            detail="The scan result with this document id does not exist",
+        )
+    if selected_fields:
+        body = ScanResultSchema.model_validate(scan_result, from_attributes=True).model_dump(mode="json")
+        body["response"] = select_report_fields(body["response"], selected_fields)
+        return MeasuredORJSONResponse(body)
+    return scan_result
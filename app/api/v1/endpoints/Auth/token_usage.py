@@ -0,0 +1,35 @@
+from datetime import date
+from typing import Any, List, Optional
+
+from fastapi import APIRouter, Depends
+from sqlalchemy.orm import Session
+
+from app.db.database import get_db
+from app.models.user import User
+from app.schemas.token_usage import TokenUsageDaily as TokenUsageDailySchema
+from app.services.token_usage import TokenUsageService
+from app.utils.auth import get_current_user
+
+router = APIRouter()
+
+
+@router.get("/token_usage", response_model=List[TokenUsageDailySchema])
+def list_token_usage(
+    db: Session = Depends(get_db),
+    org: Optional[str] = None,
+    start: Optional[date] = None,
+    end: Optional[date] = None,
+    skip: int = 0,
+    limit: int = 100,
+    current_user: User = Depends(get_current_user),
+) -> Any:
+    """
+    List LLM token usage per organization, model and UTC day, newest day first.
+
+    Filter by organization name and an inclusive day range. Users see the
+    accounts of the profiles they registered and their own; superusers see all.
+    """
+    return TokenUsageService.list_usage(
+        db, org_name=org, start=start, end=end, skip=skip, limit=min(limit, 500),
+        accounts=TokenUsageService.readable_accounts(db, current_user),
+    )
@@ -0,0 +1,146 @@
+from typing import Any, Optional
+from fastapi import APIRouter, Depends, HTTPException, Header, Query, Request, UploadFile
+from sqlalchemy.orm import Session
+from starlette.concurrency import run_in_threadpool
+import json
+
+from app.api.v1.endpoints.UnAuth.pdf_compliance_scan import run_pdf_compliance_scan
+from app.core.config import get
+from app.db.database import get_db
+from app.models.user import User
+from app.schemas.chunked_upload import ChunkedUploadCreate, ChunkedUploadStatus
+from app.schemas.compliance_scan import ComplianceScanResponse
+from app.services.org_profiles import OrgProfileService
+from app.services.uploads import ChunkedUploadService
+from app.utils.auth import get_optional_user
+from app.core.logging import log_info, log_request
+
+router = APIRouter()
+
+# Scan failures the client may retry with the same upload: busy, over budget, out of time, or a server error
+RETRYABLE_STATUS_CODES = {408, 429, 499}
+
+
+@router.post("/uploads", response_model=ChunkedUploadStatus)
+async def initiate_upload(
+    upload_in: ChunkedUploadCreate,
+    request: Request,
+    db: Session = Depends(get_db),
+    current_user: Optional[User] = Depends(get_optional_user),
+) -> Any:
+    """
+    Start a resumable chunked upload of a PDF.
+
+    Send the file with PUT /uploads/{upload_id}?offset=N, then call
+    POST /uploads/{upload_id}/complete to run the compliance scan. An
+    org_profile_id is checked here, before the file is sent, and again at
+    completion; both requests must be signed in as the profile's owner.
+    Each signed-in user, or anonymous client address, may only have a few
+    unfinished uploads at a time.
+    """
+    log_request("/uploads", "POST", {"filename": upload_in.filename, "total_size": upload_in.total_size})
+    if upload_in.org_profile_id is not None:
+        OrgProfileService.resolve_for_user(db, upload_in.org_profile_id, current_user)
+    elif upload_in.org_context is None:
+        raise HTTPException(
+            status_code=400,
+            detail="Either org_context or org_profile_id is required"
+        )
+    db.close()
+
+    if current_user is not None:
+        caller = f"user:{current_user.id}"
+    else:
+        caller = f"ip:{request.client.host if request.client else 'unknown'}"
+    state = await run_in_threadpool(
+        ChunkedUploadService.initiate,
+        upload_in.filename,
+        upload_in.total_size,
+        upload_in.sha256,
+        upload_in.org_context,
+        upload_in.org_profile_id,
+        caller,
+    )
+    return ChunkedUploadService.public_state(state)
+
+
+@router.put("/uploads/{upload_id}", response_model=ChunkedUploadStatus)
+async def upload_chunk(
+    upload_id: str,
+    request: Request,
+    offset: int = Query(..., ge=0, description="Byte offset of this chunk in the file"),
+    chunk_sha256: Optional[str] = Header(None, alias="X-Chunk-SHA256"),
+) -> Any:
+    """
+    Store one chunk of an upload. The request body is the raw chunk bytes.
+
+    Chunks must be sent in order; after a failure, GET /uploads/{upload_id} and
+    resume from ``received``.
+    """
+    max_chunk_bytes = get("UPLOAD_MAX_CHUNK_BYTES")
+    data = bytearray()
+    async for block in request.stream():
+        data.extend(block)
+        if len(data) > max_chunk_bytes:
+            raise HTTPException(status_code=413, detail=f"Chunks may be at most {max_chunk_bytes} bytes")
+
+    state = await run_in_threadpool(ChunkedUploadService.append_chunk, upload_id, offset, bytes(data), chunk_sha256)
+    return ChunkedUploadService.public_state(state)
+
+
+@router.get("/uploads/{upload_id}", response_model=ChunkedUploadStatus)
+async def get_upload(upload_id: str) -> Any:
+    """Get the state of an upload, including the offset to resume from."""
+    state = await run_in_threadpool(ChunkedUploadService.status, upload_id)
+    return ChunkedUploadService.public_state(state)
+
+
+@router.delete("/uploads/{upload_id}")
+async def delete_upload(upload_id: str) -> Any:
+    """Abandon an upload and delete its temp files."""
+    await run_in_threadpool(ChunkedUploadService.status, upload_id)
+    await run_in_threadpool(ChunkedUploadService.discard, upload_id)
+    return {"message": "Upload deleted"}
+
+
+@router.post("/uploads/{upload_id}/complete", response_model=ComplianceScanResponse)
+async def complete_upload(
+    upload_id: str,
+    *,
+    request: Request,
+    db: Session = Depends(get_db),
+    current_user: Optional[User] = Depends(get_optional_user),
+    fields: Optional[str] = Query(None, description="Comma-separated detailed report fields to return, e.g. compliance_score,section_scores")
+) -> Any:
+    """
+    Finish an upload and run the compliance scan on the assembled PDF.
+
+    The assembled file goes through the same pipeline as /pdf_compliance_scan.
+    The upload's temp files are deleted once the scan has run, or has failed in
+    a way retrying cannot fix. After a retryable error (429, 503, 504, ...) the
+    upload is kept, so /complete can be called again until it expires.
+    """
+    log_request(f"/uploads/{upload_id}/complete", "POST")
+    state = await run_in_threadpool(ChunkedUploadService.complete, upload_id)
+    log_info(f"Chunked upload {upload_id} assembled: {state['filename']} ({state['total_size']} bytes)")
+
+    org_context = json.dumps(state["org_context"]) if state["org_context"] is not None else None
+    try:
+        with open(ChunkedUploadService.data_path(upload_id), "rb") as f:
+            pdf_file = UploadFile(f, filename=state["filename"], size=state["total_size"])
+            response = await run_pdf_compliance_scan(
+                request=request,
+                db=db,
+                current_user=current_user,
+                pdf_file=pdf_file,
+                org_context=org_context,
+                org_profile_id=state["org_profile_id"],
+                fields=fields,
+            )
+    except HTTPException as e:
+        # Keep the upload when a retry can succeed; cleanup_expired removes it if none comes
+        if e.status_code < 500 and e.status_code not in RETRYABLE_STATUS_CODES:
+            await run_in_threadpool(ChunkedUploadService.discard, upload_id)
+        raise
+    await run_in_threadpool(ChunkedUploadService.discard, upload_id)
+    return response
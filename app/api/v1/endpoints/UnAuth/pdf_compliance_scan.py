@@ -1,11 +1,26 @@
-from typing import Any
-from fastapi import APIRouter, HTTPException, File, UploadFile, Form
+from typing import Any, Optional
+from fastapi import APIRouter, Depends, HTTPException, File, UploadFile, Form, Query, Request
+from sqlalchemy.orm import Session
+from starlette.concurrency import run_in_threadpool
 import json
 import random
+import time
 
+from app.core import deadlines, memory, tracing
+from app.core.responses import MeasuredORJSONResponse
+from app.db.database import get_db
+from app.models.user import User
 from app.schemas.compliance_scan import ComplianceScanResponse
 from app.services.compliance_scan.compliance_scanner import ComplianceScanAgent
+from app.services.compliance_scan.scheduler import traffic_class
+from app.services.compliance_scan.single_flight import run_scan
+from app.services.near_duplicates import NearDuplicateService
+from app.services.org_profiles import OrgProfileService
 from app.services.pdf_reader import PDFService
+from app.services.scan_history import ScanHistoryService
+from app.services.token_usage import TokenUsageService
+from app.utils.auth import get_optional_user
+from app.utils.report_fields import parse_report_fields, select_report_fields
 from app.core.logging import log_info, log_error, log_request, log_response, log_warning, log_exception
 
 router = APIRouter()
@@ -14,8 +29,13 @@ router = APIRouter()
 @router.post("/pdf_compliance_scan", response_model=ComplianceScanResponse)
 async def run_pdf_compliance_scan(
     *,
+    request: Request,
+    db: Session = Depends(get_db),
+    current_user: Optional[User] = Depends(get_optional_user),
     pdf_file: UploadFile = File(...),
-    org_context: str = Form(...)
+    org_context: Optional[str] = Form(None),
+    org_profile_id: Optional[int] = Form(None),
+    fields: Optional[str] = Query(None, description="Comma-separated detailed report fields to return, e.g. compliance_score,section_scores")
 ) -> Any:
     """
     Run a compliance scan on an uploaded PDF file.
@@ -24,67 +44,109 @@ async def run_pdf_compliance_scan(
     1. Extracts text from the uploaded PDF
     2. Processes the text along with organization context
     3. Generates a comprehensive compliance scan report based on FCC regulations
+    4. Stores the result in the scan history
+
+    The scan must finish within SCAN_DEADLINE_SECONDS of the upload being
+    received, or the number of seconds in the X-Request-Deadline header. PDF
+    extraction and the model call are cancelled when the deadline passes (504)
+    or the client disconnects.
+
+    Before extraction, the scan's memory need is estimated from the file size
+    and reserved from the worker's memory budget: a file over the per-request
+    budget is rejected (413), and when the budget is in use the scan waits in
+    line, or gets 503 if it does not free up in time.
+
+    The request is anonymous unless it carries a bearer token; signed-in users
+    and superusers get priority for the model (see the LLM scheduler). Only
+    the user who registered a profile (or a superuser) can scan with its
+    org_profile_id.
     
     Args:
         pdf_file: The PDF file to analyze
         org_context: JSON string containing organization context
+        org_profile_id: Id of a registered organization profile, used instead of org_context
+        fields: Optional comma-separated list of detailed report fields to return
         
     Returns:
         ComplianceScanResponse: The compliance scan results
     """
     log_request("/pdf_compliance_scan", "POST", {"filename": pdf_file.filename})
+    started = time.perf_counter()
+    timings = {}
+    selected_fields = parse_report_fields(fields)
+    deadlines.start(request)
+    memory.start_request()
+    estimated_bytes = reserved_bytes = 0
     
     try:
-        # Parse the organization context
-        try:
-            org_context_dict = json.loads(org_context)
-            log_info(f"Organization context parsed successfully: {org_context_dict.get('name', 'Unknown')}")
-        except json.JSONDecodeError:
-            log_error("Invalid organization context JSON format")
+        # Resolve the organization context, from the profile registry or the inline JSON
+        org_profile = org_profile_json = None
+        if org_profile_id is not None:
+            org_profile = OrgProfileService.resolve_for_user(db, org_profile_id, current_user)
+            org_context_dict, org_profile_json = org_profile.profile, org_profile.canonical_json
+            log_info(f"Organization profile {org_profile_id} resolved: {org_context_dict.get('name', 'Unknown')}")
+        elif org_context is not None:
+            try:
+                org_context_dict = json.loads(org_context)
+                log_info(f"Organization context parsed successfully: {org_context_dict.get('name', 'Unknown')}")
+            except json.JSONDecodeError:
+                log_error("Invalid organization context JSON format")
+                raise HTTPException(
+                    status_code=400,
+                    detail="Invalid organization context JSON format"
+                )
+        else:
             raise HTTPException(
                 status_code=400,
-                detail="Invalid organization context JSON format"
+                detail="Either org_context or org_profile_id is required"
             )
         
         # Get file size information
-        file_size_bytes = 0
-        try:
-            # Try to get the content length from the request
-            file_size_bytes = pdf_file.size
-            log_info(f"File size from request: {file_size_bytes} bytes")
-        except AttributeError:
-            # If that fails, read the file to determine its size
-            log_info("File size not available from request, reading file content")
-            content = await pdf_file.read()
-            file_size_bytes = len(content)
-            await pdf_file.seek(0)  # Reset file position
-            log_info(f"File size from content: {file_size_bytes} bytes")
+        file_size_bytes = pdf_file.size
+        if file_size_bytes is None:
+            # Not sent with the upload: measure the spooled file instead of reading it into memory
+            pdf_file.file.seek(0, 2)
+            file_size_bytes = pdf_file.file.tell()
+            await pdf_file.seek(0)
+        log_info(f"File size: {file_size_bytes} bytes")
         
         # Format file size for display
         file_size = format_file_size(file_size_bytes)
         log_info(f"Formatted file size: {file_size}")
+
+        # Wait for memory to scan this file, or reject it if it cannot fit. The
+        # session's pooled connection is returned first so waiting scans don't exhaust the pool.
+        db.close()
+        estimated_bytes = reserved_bytes = await memory.reserve_for_upload(file_size_bytes)
         
         # Extract text from the PDF
         log_info("Extracting text from PDF")
         pdf_service = PDFService()
-        pdf_data = await pdf_service.extract_text_from_pdf(pdf_file)
-        log_info(f"Extracted {len(pdf_data['text'])} characters from {pdf_data['page_count']} pages")
+        stage_started = time.perf_counter()
+        with tracing.span("pdf_parse", **{"file.name": pdf_file.filename, "file.size": file_size_bytes}) as parse_span, \
+                memory.stage("pdf_parse"):
+            pdf_data = await deadlines.guard(request, pdf_service.extract_text_from_pdf(pdf_file), "pdf_parse")
+            parse_span.set_attribute("pdf.page_count", pdf_data["page_count"])
+        timings["extraction_ms"] = (time.perf_counter() - stage_started) * 1000
+        # The parsed document is gone; the rest of the scan only holds its text
+        reserved_bytes = memory.memory_budget.shrink(reserved_bytes, memory.estimate_text_bytes(len(pdf_data["text"])))
+        skipped_pages = [page["page"] for page in pdf_data["pages"] if page["status"] == "skipped"]
+        log_info(f"Extracted {len(pdf_data['text'])} characters from {pdf_data['page_count']} pages with {pdf_data['backend']} "
+                 f"({len(skipped_pages)} image-only or empty pages skipped: {skipped_pages})")
+        log_info(f"Page cache: {pdf_data['page_cache']['hits']} hits, {pdf_data['page_cache']['misses']} misses "
+                 f"(hit rate {pdf_data['page_cache']['hit_rate']:.0%})")
         
         # Check if the PDF has enough content
         if len(pdf_data['text'].strip()) < 50:
             log_warning(f"PDF has very little content: '{pdf_data['text']}'")
         
-        # Try to get PDF metadata
-        log_info("Extracting PDF metadata")
-        pdf_metadata = await pdf_service.get_pdf_metadata(pdf_file)
+        # PDF metadata, read along with the text
+        pdf_metadata = pdf_data["metadata"]
         if pdf_metadata:
             log_info(f"PDF metadata: {pdf_metadata}")
         else:
             log_info("No metadata found in PDF")
         
-        # Log the PDF data for debugging
-        log_info(f"PDF data: {pdf_data}")
-        
         # Format the data for the compliance scanner
         log_info("Formatting data for compliance scanner")
         formatted_data = {
@@ -98,26 +160,96 @@ async def run_pdf_compliance_scan(
                     "page_count": pdf_data["page_count"],
                     "metadata": pdf_metadata
                 }
-            }
+            },
+            "org_profile_json": org_profile_json
         }
         
         # Initialize the compliance scan agent
         log_info("Initializing compliance scan agent")
         compliance_agent = ComplianceScanAgent()
+        org_name = ScanHistoryService.org_name_from_context(formatted_data["user_context"])
+
+        # Reuse the assessment of a near-identical earlier upload instead of calling the model
+        signature = await run_in_threadpool(NearDuplicateService.signature, pdf_data["text"])
+        context_hash = NearDuplicateService.context_hash(formatted_data)
+        near_duplicate = await run_in_threadpool(
+            NearDuplicateService.find_match,
+            db, signature, org_name, context_hash, compliance_agent.llm_model, compliance_agent.prompt_version
+        )
+        if near_duplicate is not None:
+            prior, similarity = near_duplicate
+            result = NearDuplicateService.reuse_response(prior, pdf_file.filename, file_size, similarity)
+            timings["total_ms"] = (time.perf_counter() - started) * 1000
+            await run_in_threadpool(
+                ScanHistoryService.record_scan,
+                db,
+                result,
+                document_hash=pdf_data["sha256"],
+                org_name=org_name,
+                model=compliance_agent.llm_model,
+                prompt_version=compliance_agent.prompt_version,
+                context_hash=context_hash,
+                timings=timings,
+                minhash=signature,
+                org_profile_id=org_profile.id if org_profile is not None else None,
+                user_id=current_user.id if current_user is not None else None,
+                reused_from=prior.document_id,
+            )
+            log_response("/pdf_compliance_scan", 200, {
+                "document_id": result.document.id,
+                "reused_from": prior.document_id,
+                "similarity": round(similarity, 3)
+            })
+            if selected_fields:
+                return MeasuredORJSONResponse(select_report_fields(result.model_dump(), selected_fields))
+            return result
+
+        usage_account = TokenUsageService.usage_account(org_profile, current_user)
+        await run_in_threadpool(TokenUsageService.check_budget, db, usage_account, org_profile,
+                                lambda: compliance_agent.estimate_prompt_tokens(formatted_data))
         
-        # Generate the compliance scan
+        # Generate the compliance scan; the scan may wait for a model slot, so don't hold a connection
         log_info("Generating compliance scan")
+        db.close()
         try:
-            result = compliance_agent.generate_compliance_scan(formatted_data)
+            stage_started = time.perf_counter()
+            with memory.stage("scan"):
+                scan = await deadlines.guard(request, run_scan(formatted_data, usage_account, document_type="pdf",
+                                                             traffic_class=traffic_class(current_user)), "llm_call")
+            result = scan["result"]
+            timings["llm_ms"] = (time.perf_counter() - stage_started) * 1000
+            timings["total_ms"] = (time.perf_counter() - started) * 1000
+
+            if not scan["used_fallback"]:
+                stored = await run_in_threadpool(
+                    ScanHistoryService.record_scan,
+                    db,
+                    result,
+                    document_hash=pdf_data["sha256"],
+                    org_name=org_name,
+                    model=scan["model"],
+                    prompt_version=scan["prompt_version"],
+                    context_hash=context_hash,
+                    timings=timings,
+                    minhash=signature,
+                    org_profile_id=org_profile.id if org_profile is not None else None,
+                    user_id=current_user.id if current_user is not None else None,
+                )
+                NearDuplicateService.remember(stored, signature)
             
             # Log successful response
             log_response("/pdf_compliance_scan", 200, {
                 "document_id": result.document.id,
                 "compliance_status": result.document.complianceStatus,
-                "compliance_score": result.document.detailedReport.compliance_score
+                "compliance_score": result.document.detailedReport.compliance_score,
+                "coalesced": scan["shared"]
             })
             
+            if selected_fields:
+                return MeasuredORJSONResponse(select_report_fields(result.model_dump(), selected_fields))
             return result
+        except HTTPException:
+            raise
         except Exception as e:
             log_error(f"Error generating compliance scan: {str(e)}")
             # Create a fallback response if the compliance scan fails
@@ -166,6 +298,8 @@ async def run_pdf_compliance_scan(
             )
             
             log_info("Created fallback response due to compliance scan error")
+            if selected_fields:
+                return MeasuredORJSONResponse(select_report_fields(fallback_response.model_dump(), selected_fields))
             return fallback_response
             
     except HTTPException as he:
@@ -178,6 +312,10 @@ async def run_pdf_compliance_scan(
             status_code=500,
             detail=f"Error processing compliance scan: {str(e)}"
         )
+    finally:
+        if reserved_bytes:
+            memory.memory_budget.release(reserved_bytes)
+        memory.finish_request(f"/pdf_compliance_scan {pdf_file.filename}", estimated_bytes)
 
 
 def format_file_size(size_bytes):
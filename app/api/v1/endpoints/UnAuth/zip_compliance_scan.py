@@ -0,0 +1,237 @@
+from typing import Any, AsyncIterator, Dict, List, Optional
+from fastapi import APIRouter, Depends, HTTPException, File, UploadFile, Form, Query, Request
+from fastapi.responses import StreamingResponse
+from sqlalchemy.orm import Session
+from starlette.concurrency import run_in_threadpool
+import asyncio
+import io
+import json
+import posixpath
+import time
+import zipfile
+
+import orjson
+
+from app.api.v1.endpoints.UnAuth.pdf_compliance_scan import run_pdf_compliance_scan
+from app.core import memory, metrics
+from app.core.config import get
+from app.db.database import SessionLocal, get_db
+from app.models.user import User
+from app.services.org_profiles import OrgProfileService
+from app.services.uploads import ZipArchiveService
+from app.utils.auth import get_optional_user
+from app.utils.report_fields import parse_report_fields, select_report_fields
+from app.core.logging import log_info, log_request, log_warning
+
+router = APIRouter()
+
+
+@router.post("/zip_compliance_scan")
+async def run_zip_compliance_scan(
+    *,
+    request: Request,
+    db: Session = Depends(get_db),
+    current_user: Optional[User] = Depends(get_optional_user),
+    zip_file: UploadFile = File(...),
+    org_context: Optional[str] = Form(None),
+    org_profile_id: Optional[int] = Form(None),
+    fields: Optional[str] = Query(None, description="Comma-separated detailed report fields to return, e.g. compliance_score,section_scores")
+) -> Any:
+    """
+    Run a compliance scan on every PDF in a ZIP archive, such as a station's
+    online public file export.
+
+    The PDFs are read from the archive one at a time, without extracting it,
+    and scanned ZIP_SCAN_CONCURRENCY at a time through the same pipeline as
+    /pdf_compliance_scan (near-duplicate reuse, token budgets, memory budget,
+    scan history). Each PDF gets its own scan deadline.
+
+    The response is NDJSON, one line per entry as its scan finishes (not in
+    archive order):
+
+        {"type": "entry", "index": 3, "name": "...", "status": "scanned", "result": {...}, "elapsed_ms": ...}
+
+    with status "skipped" (not a PDF) and a reason, or "failed" with the
+    status_code and error the PDF endpoint would have returned, e.g. 413 for an
+    entry that breaks the zip bomb limits. A last line of type "summary" counts
+    the entries by status. Problems with the archive as a whole (not a ZIP, too
+    many entries, too large) are rejected before the stream starts. Anonymous
+    callers may send at most ZIP_MAX_PDFS_ANONYMOUS PDFs per archive.
+
+    Args:
+        zip_file: The ZIP archive of PDFs to analyze
+        org_context: JSON string containing organization context
+        org_profile_id: Id of a registered organization profile, used instead of org_context
+        fields: Optional comma-separated list of detailed report fields to return
+    """
+    log_request("/zip_compliance_scan", "POST", {"filename": zip_file.filename})
+    selected_fields = parse_report_fields(fields)
+
+    # Check the organization context once, rather than failing every entry
+    if org_profile_id is not None:
+        OrgProfileService.resolve_for_user(db, org_profile_id, current_user)
+    elif org_context is not None:
+        try:
+            json.loads(org_context)
+        except json.JSONDecodeError:
+            raise HTTPException(
+                status_code=400,
+                detail="Invalid organization context JSON format"
+            )
+    else:
+        raise HTTPException(
+            status_code=400,
+            detail="Either org_context or org_profile_id is required"
+        )
+    # Every entry scans with its own session
+    db.close()
+
+    if zip_file.size is not None and zip_file.size > get("UPLOAD_MAX_BYTES"):
+        raise HTTPException(status_code=413, detail=f"Archives may be at most {get('UPLOAD_MAX_BYTES')} bytes")
+    archive = await run_in_threadpool(ZipArchiveService.open_archive, zip_file.file)
+    entries = ZipArchiveService.entries(archive)
+    log_info(f"ZIP archive {zip_file.filename}: {len(entries)} files")
+    # Every PDF is a model call; without an account, keep an archive to a few of them
+    if current_user is None:
+        pdfs = sum(1 for info in entries if ZipArchiveService.skip_reason(info) is None)
+        if pdfs > get("ZIP_MAX_PDFS_ANONYMOUS"):
+            archive.close()
+            raise HTTPException(
+                status_code=413,
+                detail=f"The archive has {pdfs} PDFs; sign in to scan more than {get('ZIP_MAX_PDFS_ANONYMOUS')} at once"
+            )
+
+    scan = _ArchiveScan(request, current_user, archive, entries, org_context, org_profile_id, selected_fields)
+    return StreamingResponse(
+        scan.stream(zip_file.filename),
+        media_type="application/x-ndjson",
+        # The compression middleware would hold lines back until it has a block to compress
+        headers={"Content-Encoding": "identity"},
+    )
+
+
+class _ArchiveScan:
+    """Reads the entries of one archive in order and scans them with bounded concurrency."""
+
+    def __init__(self, request, current_user, archive, entries, org_context, org_profile_id, selected_fields):
+        self.request = request
+        self.current_user = current_user
+        self.archive = archive
+        self.entries = entries
+        self.org_context = org_context
+        self.org_profile_id = org_profile_id
+        self.selected_fields = selected_fields
+        self.total_left = get("ZIP_MAX_TOTAL_BYTES")
+        self.results: asyncio.Queue = asyncio.Queue()
+        self.tasks: List[asyncio.Task] = []
+        # Memory reserved for entries read but not yet handed to their scan, by entry index
+        self.reserved: Dict[int, int] = {}
+        self.counts = {"scanned": 0, "skipped": 0, "failed": 0}
+
+    def _finish(self, index: int, info: zipfile.ZipInfo, started: float, status: str, **fields: Any) -> None:
+        self.counts[status] += 1
+        metrics.increment("zip_entries", status=status)
+        self.results.put_nowait({
+            "type": "entry",
+            "index": index,
+            "name": info.filename,
+            "status": status,
+            **fields,
+            "elapsed_ms": round((time.perf_counter() - started) * 1000, 1),
+        })
+
+    async def _scan(self, index: int, info: zipfile.ZipInfo, data: io.BytesIO, size: int, started: float) -> None:
+        # The PDF scan takes over the memory reserved for reading the entry
+        memory.hand_over(self.reserved.pop(index))
+        db = SessionLocal()
+        try:
+            pdf_file = UploadFile(data, filename=posixpath.basename(info.filename), size=size)
+            result = await run_pdf_compliance_scan(
+                request=self.request,
+                db=db,
+                current_user=self.current_user,
+                pdf_file=pdf_file,
+                org_context=self.org_context,
+                org_profile_id=self.org_profile_id,
+                fields=None,
+            )
+            response = result.model_dump()
+            if self.selected_fields:
+                response = select_report_fields(response, self.selected_fields)
+            self._finish(index, info, started, "scanned", result=response)
+        except HTTPException as he:
+            self._finish(index, info, started, "failed", status_code=he.status_code, error=he.detail)
+        finally:
+            memory.release_unclaimed()
+            db.close()
+
+    async def _produce(self, slots: asyncio.Semaphore) -> None:
+        try:
+            for index, info in enumerate(self.entries):
+                started = time.perf_counter()
+                reason = ZipArchiveService.skip_reason(info)
+                if reason is not None:
+                    self._finish(index, info, started, "skipped", reason=reason)
+                    continue
+
+                # Read the next PDF only when a scan slot is free, so at most that many are held in
+                # memory, and only once the memory to scan it is reserved
+                await slots.acquire()
+                try:
+                    reserved = await memory.reserve_for_upload(info.file_size)
+                except HTTPException as he:
+                    slots.release()
+                    self._finish(index, info, started, "failed", status_code=he.status_code, error=he.detail)
+                    continue
+                try:
+                    data = await run_in_threadpool(ZipArchiveService.read_entry, self.archive, info, self.total_left)
+                except BaseException as e:
+                    memory.memory_budget.release(reserved)
+                    slots.release()
+                    if not isinstance(e, HTTPException):
+                        raise
+                    self._finish(index, info, started, "failed", status_code=e.status_code, error=e.detail)
+                    continue
+                size = data.getbuffer().nbytes
+                self.total_left -= size
+                self.reserved[index] = reserved
+
+                task = asyncio.create_task(self._scan(index, info, data, size, started))
+                task.add_done_callback(lambda _: slots.release())
+                self.tasks.append(task)
+            await asyncio.gather(*self.tasks)
+        finally:
+            self.results.put_nowait(None)
+
+    async def stream(self, archive_name: str) -> AsyncIterator[bytes]:
+        started = time.perf_counter()
+        producer = asyncio.create_task(self._produce(asyncio.Semaphore(get("ZIP_SCAN_CONCURRENCY"))))
+        try:
+            while True:
+                line = await self.results.get()
+                if line is None:
+                    break
+                yield orjson.dumps(line) + b"\n"
+            await producer
+            summary: Dict[str, Any] = {
+                "type": "summary",
+                "archive": archive_name,
+                "entries": len(self.entries),
+                **self.counts,
+                "elapsed_ms": round((time.perf_counter() - started) * 1000, 1),
+            }
+            metrics.observe("zip_archive_ms", summary["elapsed_ms"])
+            log_info(f"ZIP archive {archive_name} done: {self.counts} in {summary['elapsed_ms']:.0f} ms")
+            yield orjson.dumps(summary) + b"\n"
+        finally:
+            if not producer.done():
+                # The client went away: stop reading entries and cancel the scans in flight
+                log_warning(f"ZIP archive {archive_name} abandoned with {len(self.entries) - sum(self.counts.values())} entries left")
+                producer.cancel()
+                for task in self.tasks:
+                    task.cancel()
+                # Scans cancelled before they started never took over their memory
+                for reserved in self.reserved.values():
+                    memory.memory_budget.release(reserved)
+                self.reserved.clear()
+            self.archive.close()
@@ -0,0 +1,117 @@
+"""
+Per-request deadlines and cancellation of abandoned work.
+
+A scan request gets a deadline of SCAN_DEADLINE_SECONDS, which a client can
+shorten or extend (up to SCAN_DEADLINE_MAX_SECONDS) with the
+``X-Request-Deadline`` header, in seconds. The deadline lives in a contextvar,
+so code below the endpoint (page extraction, for example) can check it.
+
+The expensive stages of a scan run through ``guard``, which cancels the stage
+when the deadline passes or the client disconnects. Cancelling the model call
+cancels the pending HTTP request to OpenAI; a page already being extracted in
+the threadpool finishes, but no further pages are read.
+"""
+import asyncio
+import time
+from contextvars import ContextVar
+from typing import Awaitable, Optional, TypeVar
+
+from fastapi import HTTPException, Request
+
+from app.core import metrics
+from app.core.config import get
+from app.core.logging import log_warning
+
+DEADLINE_HEADER = "X-Request-Deadline"
+
+# Status nginx uses for requests the client closed; the client never sees it
+CLIENT_CLOSED_REQUEST = 499
+
+# time.monotonic() value by which the current request must finish
+deadline_var: ContextVar[Optional[float]] = ContextVar("deadline", default=None)
+
+T = TypeVar("T")
+
+
+def start(request: Request) -> float:
+    """
+    Set the current request's deadline from the header or SCAN_DEADLINE_SECONDS.
+
+    Returns:
+        The deadline, as a time.monotonic() value
+
+    Raises:
+        HTTPException: If the header is not a positive number of seconds
+    """
+    seconds = float(get("SCAN_DEADLINE_SECONDS"))
+    header = request.headers.get(DEADLINE_HEADER)
+    if header is not None:
+        try:
+            seconds = float(header)
+        except ValueError:
+            seconds = 0.0
+        if not seconds > 0:
+            raise HTTPException(
+                status_code=400,
+                detail=f"{DEADLINE_HEADER} must be a positive number of seconds"
+            )
+        seconds = min(seconds, float(get("SCAN_DEADLINE_MAX_SECONDS")))
+    deadline = time.monotonic() + seconds
+    deadline_var.set(deadline)
+    return deadline
+
+
+def remaining() -> Optional[float]:
+    """Seconds left before the current request's deadline, or None if it has none."""
+    deadline = deadline_var.get()
+    if deadline is None:
+        return None
+    return deadline - time.monotonic()
+
+
+def check(stage: str) -> None:
+    """Raise a 504 if the current request's deadline has passed."""
+    left = remaining()
+    if left is not None and left <= 0:
+        metrics.increment("scan_cancelled", stage=stage, reason="deadline")
+        raise HTTPException(status_code=504, detail=f"Scan deadline exceeded during {stage}")
+
+
+async def _wait_for_disconnect(request: Request) -> None:
+    # The body has been read by now, so the next message is the disconnect
+    while True:
+        message = await request.receive()
+        if message["type"] == "http.disconnect":
+            return
+
+
+async def guard(request: Request, work: Awaitable[T], stage: str) -> T:
+    """
+    Run one stage of a request, cancelling it if the deadline passes or the client goes away.
+
+    Raises:
+        HTTPException: 504 when the deadline passes, 499 when the client disconnected
+    """
+    check(stage)
+    task = asyncio.ensure_future(work)
+    watcher = asyncio.ensure_future(_wait_for_disconnect(request))
+    started = time.perf_counter()
+    try:
+        done, _ = await asyncio.wait({task, watcher}, timeout=remaining(), return_when=asyncio.FIRST_COMPLETED)
+    except asyncio.CancelledError:
+        task.cancel()
+        raise
+    finally:
+        watcher.cancel()
+    if task in done:
+        return task.result()
+
+    task.cancel()
+    reason = "disconnect" if watcher in done else "deadline"
+    elapsed = time.perf_counter() - started
+    metrics.increment("scan_cancelled", stage=stage, reason=reason)
+    metrics.increment("cancelled_work_seconds", elapsed, stage=stage)
+    log_warning(f"Cancelled {stage} after {elapsed:.1f}s: {'client disconnected' if reason == 'disconnect' else 'deadline exceeded'}")
+    if reason == "disconnect":
+        raise HTTPException(status_code=CLIENT_CLOSED_REQUEST, detail="Client closed the request")
+    raise HTTPException(status_code=504, detail=f"Scan deadline exceeded during {stage}")
@@ -0,0 +1,219 @@
+"""
+Liveness and readiness of a worker.
+
+Liveness (``/health``) only says the process answers HTTP; its response is
+built once at import. Readiness (``/health/ready``) says whether the worker
+should get traffic. It is never computed in the probe request: a background
+task on each worker's event loop checks every HEALTH_CHECK_INTERVAL_SECONDS
+
+* the database: a ``SELECT 1`` through the connection pool, within
+  HEALTH_DB_TIMEOUT_SECONDS, and the pool's size, checked-out connections
+  and overflow,
+* the event loop: the largest delay of a 100 ms timer since the last check, so
+  a scan blocking the loop shows up even if it ended before the check ran,
+* queue depth: scans waiting for a model slot (see scheduler) and for memory
+  (see memory), and
+* model calls: the LLM circuit, open after LLM_CIRCUIT_FAILURE_THRESHOLD
+  consecutive failed calls,
+
+and caches the serialized result, so probes cost one dictionary lookup however
+often the orchestrator polls. The worker is not ready while the database check
+fails, the loop lags more than HEALTH_MAX_LOOP_LAG_MS, more than
+HEALTH_MAX_QUEUED_SCANS scans wait for a model slot, or the last check is
+older than three intervals (the checker itself is stuck). An open LLM circuit
+is reported but does not make the worker unready: every worker shares the same
+provider, and scans already fall back when their call fails.
+"""
+import asyncio
+import time
+from datetime import datetime
+from typing import Any, Dict, List, Optional, Tuple
+
+import orjson
+
+from app.core import metrics
+from app.core.config import get
+from app.core.logging import log_info, log_warning
+
+LOOP_LAG_TICK_SECONDS = 0.1
+
+
+class LLMCircuit:
+    """Consecutive model call failures: closed, open after too many, half open once they are old."""
+
+    def __init__(self) -> None:
+        self.consecutive_failures = 0
+        self.last_failure_at: Optional[float] = None
+        self.last_error: Optional[str] = None
+
+    def success(self) -> None:
+        if self.consecutive_failures >= get("LLM_CIRCUIT_FAILURE_THRESHOLD"):
+            log_info("LLM circuit closed: model call succeeded")
+        self.consecutive_failures = 0
+        self.last_error = None
+
+    def failure(self, error: BaseException) -> None:
+        self.consecutive_failures += 1
+        self.last_failure_at = time.monotonic()
+        self.last_error = f"{type(error).__name__}: {error}"[:200]
+        metrics.increment("llm_call_failures")
+        if self.consecutive_failures == get("LLM_CIRCUIT_FAILURE_THRESHOLD"):
+            log_warning(f"LLM circuit open after {self.consecutive_failures} failed model calls: {self.last_error}")
+
+    @property
+    def state(self) -> str:
+        if self.consecutive_failures < get("LLM_CIRCUIT_FAILURE_THRESHOLD"):
+            return "closed"
+        if time.monotonic() - self.last_failure_at >= get("LLM_CIRCUIT_RESET_SECONDS"):
+            # No recent calls either way; the next one decides
+            return "half_open"
+        return "open"
+
+    def report(self) -> Dict[str, Any]:
+        state = self.state
+        return {
+            "ok": state != "open",
+            "circuit": state,
+            "consecutive_failures": self.consecutive_failures,
+            "last_error": self.last_error,
+        }
+
+
+llm_circuit = LLMCircuit()
+
+
+def _ping_db() -> float:
+    from sqlalchemy import text
+
+    from app.db.database import engine
+
+    started = time.perf_counter()
+    with engine.connect() as conn:
+        conn.execute(text("SELECT 1"))
+    return (time.perf_counter() - started) * 1000
+
+
+def _pool_stats() -> Dict[str, Any]:
+    from app.db.database import engine
+
+    pool = engine.pool
+    return {
+        name: getattr(pool, method)()
+        for name, method in (("size", "size"), ("checked_out", "checkedout"), ("overflow", "overflow"))
+        if hasattr(pool, method)
+    }
+
+
+class ReadinessChecker:
+    """Checks the worker's dependencies in the background and keeps the last probe response."""
+
+    def __init__(self) -> None:
+        self._tasks: List[asyncio.Task] = []
+        self._db_ping: Optional[asyncio.Future] = None
+        self._max_lag_ms = 0.0
+        self._checked_at: Optional[float] = None
+        self._status_code = 503
+        self._body = orjson.dumps({"status": "starting", "isOk": False, "reasons": ["no readiness check yet"]})
+
+    def start(self) -> None:
+        """Start checking on the running event loop (once per worker, at startup)."""
+        if not self._tasks:
+            self._tasks = [asyncio.create_task(self._watch_loop()), asyncio.create_task(self._run())]
+
+    async def stop(self) -> None:
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+    def response(self) -> Tuple[int, bytes]:
+        """The last readiness result, as (status code, JSON body)."""
+        if self._checked_at is not None and time.monotonic() - self._checked_at > 3 * get("HEALTH_CHECK_INTERVAL_SECONDS"):
+            age = time.monotonic() - self._checked_at
+            return 503, orjson.dumps({"status": "not_ready", "isOk": False,
+                                      "reasons": [f"last readiness check was {age:.0f} s ago"]})
+        return self._status_code, self._body
+
+    async def _watch_loop(self) -> None:
+        # A timer that fires late means something held the event loop
+        while True:
+            expected = time.perf_counter() + LOOP_LAG_TICK_SECONDS
+            await asyncio.sleep(LOOP_LAG_TICK_SECONDS)
+            self._max_lag_ms = max(self._max_lag_ms, (time.perf_counter() - expected) * 1000)
+
+    async def _run(self) -> None:
+        while True:
+            try:
+                await self.check()
+            except Exception as e:
+                log_warning(f"Readiness check failed: {str(e)}")
+            await asyncio.sleep(get("HEALTH_CHECK_INTERVAL_SECONDS"))
+
+    async def _check_db(self) -> Dict[str, Any]:
+        result: Dict[str, Any] = {"ok": False}
+        if self._db_ping is None or self._db_ping.done():
+            # A plain executor future, so a hung ping can be abandoned without waiting for its thread
+            self._db_ping = asyncio.get_running_loop().run_in_executor(None, _ping_db)
+        try:
+            result["ping_ms"] = round(
+                await asyncio.wait_for(asyncio.shield(self._db_ping), get("HEALTH_DB_TIMEOUT_SECONDS")), 1
+            )
+            result["ok"] = True
+            metrics.observe("health_db_ping_ms", result["ping_ms"])
+        except asyncio.TimeoutError:
+            result["error"] = f"no answer within {get('HEALTH_DB_TIMEOUT_SECONDS')} s"
+        except Exception as e:
+            result["error"] = f"{type(e).__name__}: {e}"[:200]
+        result["pool"] = _pool_stats()
+        return result
+
+    def _check_loop(self) -> Dict[str, Any]:
+        lag_ms, self._max_lag_ms = self._max_lag_ms, 0.0
+        metrics.observe("event_loop_lag_ms", lag_ms)
+        return {"ok": lag_ms <= get("HEALTH_MAX_LOOP_LAG_MS"), "max_lag_ms": round(lag_ms, 1)}
+
+    @staticmethod
+    def _check_queues() -> Dict[str, Any]:
+        from app.core.memory import MB, memory_budget
+        from app.services.compliance_scan.scheduler import llm_scheduler
+
+        scheduler = llm_scheduler.stats()
+        llm_queued = sum(scheduler["queued"].values())
+        return {
+            "ok": llm_queued <= get("HEALTH_MAX_QUEUED_SCANS"),
+            "llm_running": scheduler["running"],
+            "llm_queued": scheduler["queued"],
+            "memory_queued": memory_budget.queued(),
+            "memory_reserved_mb": round(memory_budget.reserved / MB, 1),
+        }
+
+    async def check(self) -> Dict[str, Any]:
+        """Run every check now and update the cached probe response."""
+        checks = {
+            "database": await self._check_db(),
+            "event_loop": self._check_loop(),
+            "queues": self._check_queues(),
+            "llm": llm_circuit.report(),
+        }
+        reasons = [name for name in ("database", "event_loop", "queues") if not checks[name]["ok"]]
+        ready = not reasons
+        result = {
+            "status": "ready" if ready else "not_ready",
+            "isOk": ready,
+            "reasons": reasons,
+            "checked_at": datetime.now().isoformat(),
+            "checks": checks,
+        }
+        if ready != (self._status_code == 200) and self._checked_at is not None:
+            if ready:
+                log_info("Worker is ready again")
+            else:
+                log_warning(f"Worker is not ready: {', '.join(reasons)} check failed")
+        if not ready:
+            metrics.increment("readiness_failures")
+        self._status_code, self._body = (200 if ready else 503), orjson.dumps(result)
+        self._checked_at = time.monotonic()
+        return result
+
+
+readiness = ReadinessChecker()
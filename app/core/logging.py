@@ -3,15 +3,26 @@ import sys
 import json
 from typing import Any, Dict, List, Optional, Union
 
+from app.core.tracing import current_request_id
+
+
+class RequestIdFilter(logging.Filter):
+    """Stamp each record with the correlation id of the request that logged it."""
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        record.request_id = current_request_id()
+        return True
+
 # Create a logger
 logger = logging.getLogger("fcc_compliance_api")
 logger.setLevel(logging.INFO)
+logger.addFilter(RequestIdFilter())
 
 # Create console handler if not already added
 if not logger.handlers:
     console_handler = logging.StreamHandler(sys.stdout)
     console_handler.setLevel(logging.INFO)
-    formatter = logging.Formatter('%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+    formatter = logging.Formatter('%(asctime)s - %(name)s - %(levelname)s - [%(request_id)s] - %(message)s')
     console_handler.setFormatter(formatter)
     logger.addHandler(console_handler)
 
@@ -2,31 +2,37 @@ import logging
 import os
 from logging.handlers import RotatingFileHandler
 
-# Create logs directory if it doesn't exist
-os.makedirs("logs", exist_ok=True)
+from app.core.logging import RequestIdFilter
+
+LOG_FILE = os.path.join("app", "app.log")
 
 # Configure logger
 logger = logging.getLogger("communicate_backend")
 logger.setLevel(logging.INFO)
+logger.addFilter(RequestIdFilter())
 
-# Console handler
-console_handler = logging.StreamHandler()
-console_handler.setLevel(logging.INFO)
-console_format = logging.Formatter(
-    "%(asctime)s - %(name)s - %(levelname)s - %(message)s"
-)
-console_handler.setFormatter(console_format)
+# With gunicorn --preload this module is imported once in the master; guard
+# against stacking duplicate handlers if it is ever re-imported.
+if not logger.handlers:
+    # Console handler
+    console_handler = logging.StreamHandler()
+    console_handler.setLevel(logging.INFO)
+    console_format = logging.Formatter(
+        "%(asctime)s - %(name)s - %(levelname)s - [%(request_id)s] - %(message)s"
+    )
+    console_handler.setFormatter(console_format)
 
-# File handler
-file_handler = RotatingFileHandler(
-    "app/app.log", maxBytes=10485760, backupCount=5
-)  # 10MB per file, max 5 files
-file_handler.setLevel(logging.INFO)
-file_format = logging.Formatter(
-    "%(asctime)s - %(name)s - %(levelname)s - %(message)s"
-)
-file_handler.setFormatter(file_format)
+    # File handler. delay=True defers opening the file until the first record.
+    os.makedirs(os.path.dirname(LOG_FILE), exist_ok=True)
+    file_handler = RotatingFileHandler(
+        LOG_FILE, maxBytes=10485760, backupCount=5, delay=True
+    )  # 10MB per file, max 5 files
+    file_handler.setLevel(logging.INFO)
+    file_format = logging.Formatter(
+        "%(asctime)s - %(name)s - %(levelname)s - [%(request_id)s] - %(message)s"
+    )
+    file_handler.setFormatter(file_format)
 
-# Add handlers to logger
-logger.addHandler(console_handler)
-logger.addHandler(file_handler) 
\ No newline at end of file
+    # Add handlers to logger
+    logger.addHandler(console_handler)
+    logger.addHandler(file_handler)
@@ -0,0 +1,316 @@
+"""
+Per-request memory accounting and budgets.
+
+Stages of a scan run inside ``stage(name)``, which records how far the
+process's resident set grew above its size at the start of the stage. A shared
+sampler thread reads the RSS every MEMORY_SAMPLE_INTERVAL_MS while any stage
+is running, so short peaks are caught. Requests overlap within a worker, so a
+stage's growth can include other requests' allocations; the numbers are meant
+for spotting the stages and uploads that need memory, not for exact
+attribution.
+
+Before a PDF scan starts, its memory need is estimated from the upload size.
+An estimate above MEMORY_REQUEST_BUDGET_MB is rejected with 413. Otherwise the
+estimate is reserved from the worker's MEMORY_GLOBAL_BUDGET_MB; requests that
+do not fit wait in line (FIFO) for up to MEMORY_QUEUE_TIMEOUT_SECONDS, then
+get 503. Once the text is extracted the reservation shrinks to what the text
+needs, so a scan waiting on the model holds little of the budget. Budgets are
+per worker process.
+"""
+import asyncio
+import os
+import resource
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Any, Deque, Dict, Iterator, Optional, Set, Tuple
+
+from fastapi import HTTPException
+
+from app.core import deadlines, metrics
+from app.core.config import get
+from app.core.logging import log_info
+
+MB = 1024 * 1024
+
+_PAGE_SIZE = os.sysconf("SC_PAGE_SIZE") if hasattr(os, "sysconf") else 4096
+
+# The current request's memory report: start RSS, peak RSS and per-stage growth
+_request_report: ContextVar[Optional[Dict[str, Any]]] = ContextVar("memory_report", default=None)
+# Bytes reserved for the current request's upload before it was read, not yet taken over by reserve_for_upload
+_handed_over: ContextVar[int] = ContextVar("memory_handed_over", default=0)
+
+
+def rss_bytes() -> int:
+    """The process's current resident set size (its peak, where the current size is unavailable)."""
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * _PAGE_SIZE
+    except OSError:
+        # ru_maxrss is in kilobytes on Linux and bytes on macOS
+        maxrss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return maxrss if os.uname().sysname == "Darwin" else maxrss * 1024
+
+
+class _Stage:
+    def __init__(self, name: str) -> None:
+        self.name = name
+        self.start = rss_bytes()
+        self.peak = self.start
+
+
+class _Sampler:
+    """One thread per process that samples the RSS while any stage is running."""
+
+    def __init__(self) -> None:
+        self._active: Set[_Stage] = set()
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def add(self, stage: _Stage) -> None:
+        with self._lock:
+            self._active.add(stage)
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="memory-sampler", daemon=True)
+                self._thread.start()
+        self._wake.set()
+
+    def remove(self, stage: _Stage) -> None:
+        with self._lock:
+            self._active.discard(stage)
+
+    def _run(self) -> None:
+        while True:
+            self._wake.wait()
+            with self._lock:
+                stages = list(self._active)
+                if not stages:
+                    self._wake.clear()
+                    continue
+            rss = rss_bytes()
+            for stage in stages:
+                if rss > stage.peak:
+                    stage.peak = rss
+            time.sleep(get("MEMORY_SAMPLE_INTERVAL_MS") / 1000)
+
+
+_sampler = _Sampler()
+
+
+def start_request() -> None:
+    """Start the current request's memory report."""
+    if get("MEMORY_ACCOUNTING_ENABLED"):
+        rss = rss_bytes()
+        _request_report.set({"start": rss, "peak": rss, "stages": {}})
+
+
+@contextmanager
+def stage(name: str) -> Iterator[None]:
+    """Record the RSS growth of a block as stage ``name`` of the current request."""
+    if not get("MEMORY_ACCOUNTING_ENABLED"):
+        yield
+        return
+    current = _Stage(name)
+    _sampler.add(current)
+    try:
+        yield
+    finally:
+        _sampler.remove(current)
+        current.peak = max(current.peak, rss_bytes())
+        growth_mb = (current.peak - current.start) / MB
+        metrics.observe("memory_stage_peak_mb", growth_mb, stage=name)
+        report = _request_report.get()
+        if report is not None:
+            report["stages"][name] = max(report["stages"].get(name, 0.0), growth_mb)
+            report["peak"] = max(report["peak"], current.peak)
+
+
+def request_report() -> Optional[Dict[str, Any]]:
+    """The current request's memory report (RSS in bytes, stage growth in MB), or None if not started."""
+    return _request_report.get()
+
+
+def finish_request(label: str, estimated_bytes: int = 0) -> Optional[Dict[str, Any]]:
+    """
+    Log and record the current request's peak memory growth, by stage.
+
+    Returns:
+        The request's memory report, or None if accounting is disabled
+    """
+    report = _request_report.get()
+    if report is None:
+        return None
+    peak_mb = (report["peak"] - report["start"]) / MB
+    metrics.observe("memory_request_peak_mb", peak_mb)
+    metrics.observe("memory_process_rss_mb", report["peak"] / MB)
+    if estimated_bytes:
+        # Near or above 1 means the estimate (MEMORY_BYTES_PER_UPLOAD_BYTE) is too low
+        metrics.observe("memory_estimate_ratio", peak_mb * MB / estimated_bytes)
+    stages = ", ".join(f"{name} +{mb:.1f} MB" for name, mb in report["stages"].items())
+    log_info(f"Memory for {label}: peak +{peak_mb:.1f} MB, RSS {report['peak'] / MB:.0f} MB "
+             f"(estimated {estimated_bytes / MB:.1f} MB; {stages or 'no stages'})")
+    return report
+
+
+def estimate_upload_bytes(upload_bytes: int) -> int:
+    """Estimated peak memory of scanning an upload: parsed object graph, page texts and prompt."""
+    return int(upload_bytes * get("MEMORY_BYTES_PER_UPLOAD_BYTE")) + get("MEMORY_REQUEST_BASE_MB") * MB
+
+
+def estimate_text_bytes(text_chars: int) -> int:
+    """Estimated memory of scanning extracted text: its copies in the prompt, request and response."""
+    return int(text_chars * get("MEMORY_BYTES_PER_TEXT_CHAR")) + get("MEMORY_REQUEST_BASE_MB") * MB
+
+
+def max_upload_bytes() -> int:
+    """The largest upload whose estimate fits in MEMORY_REQUEST_BUDGET_MB."""
+    return max(int((get("MEMORY_REQUEST_BUDGET_MB") - get("MEMORY_REQUEST_BASE_MB")) * MB
+                   / get("MEMORY_BYTES_PER_UPLOAD_BYTE")), 0)
+
+
+def check_upload_size(upload_bytes: int) -> int:
+    """
+    Check that scanning an upload of ``upload_bytes`` fits the per-request budget.
+
+    Returns:
+        The estimated memory of the scan
+
+    Raises:
+        HTTPException: 413 if the estimate exceeds MEMORY_REQUEST_BUDGET_MB
+    """
+    estimated = estimate_upload_bytes(upload_bytes)
+    if estimated > get("MEMORY_REQUEST_BUDGET_MB") * MB:
+        metrics.increment("memory_budget_rejected", reason="request_budget")
+        raise HTTPException(
+            status_code=413,
+            detail=f"Scanning this file needs about {estimated / MB:.0f} MB, over the "
+                   f"{get('MEMORY_REQUEST_BUDGET_MB')} MB per-request limit"
+        )
+    return estimated
+
+
+class MemoryBudget:
+    """A worker's memory budget for in-flight requests, granted first come, first served."""
+
+    def __init__(self) -> None:
+        self.reserved = 0
+        self._queue: Deque[Tuple[int, asyncio.Future]] = deque()
+
+    def _fits(self, nbytes: int) -> bool:
+        # A request always runs when nothing else holds memory, so an oversized one can't wait forever
+        return self.reserved == 0 or self.reserved + nbytes <= get("MEMORY_GLOBAL_BUDGET_MB") * MB
+
+    def _grant(self) -> None:
+        while self._queue:
+            nbytes, waiter = self._queue[0]
+            if waiter.done():
+                self._queue.popleft()
+                continue
+            if not self._fits(nbytes):
+                return
+            self._queue.popleft()
+            self.reserved += nbytes
+            waiter.set_result(None)
+
+    def queued(self) -> int:
+        return sum(1 for _, waiter in self._queue if not waiter.done())
+
+    async def acquire(self, nbytes: int) -> None:
+        """
+        Reserve ``nbytes``, waiting in line if the budget is in use.
+
+        Raises:
+            HTTPException: 503 if the reservation is not granted within
+                MEMORY_QUEUE_TIMEOUT_SECONDS (or the request's deadline)
+        """
+        if not self._queue and self._fits(nbytes):
+            self.reserved += nbytes
+            return
+
+        metrics.increment("memory_budget_queued")
+        timeout = get("MEMORY_QUEUE_TIMEOUT_SECONDS")
+        remaining = deadlines.remaining()
+        if remaining is not None:
+            timeout = max(0.0, min(timeout, remaining))
+        waiter = asyncio.get_running_loop().create_future()
+        self._queue.append((nbytes, waiter))
+        started = time.perf_counter()
+        try:
+            await asyncio.wait_for(waiter, timeout)
+        except (asyncio.TimeoutError, asyncio.CancelledError) as e:
+            if waiter.done() and not waiter.cancelled():
+                # Granted just as the wait ended: hand the memory back
+                self.release(nbytes)
+            else:
+                self._grant()
+            if isinstance(e, asyncio.CancelledError):
+                raise
+            metrics.increment("memory_budget_rejected", reason="busy")
+            raise HTTPException(
+                status_code=503,
+                detail="The server is busy with other large documents, please retry shortly",
+                headers={"Retry-After": str(max(1, int(get("MEMORY_QUEUE_TIMEOUT_SECONDS"))))},
+            )
+        finally:
+            metrics.observe("memory_budget_wait_ms", (time.perf_counter() - started) * 1000)
+
+    def release(self, nbytes: int) -> None:
+        self.reserved -= nbytes
+        self._grant()
+
+    def shrink(self, held: int, nbytes: int) -> int:
+        """Hand back all but ``nbytes`` of a ``held`` reservation; returns the bytes now held."""
+        if nbytes >= held:
+            return held
+        self.release(held - nbytes)
+        return nbytes
+
+
+memory_budget = MemoryBudget()
+
+
+async def reserve_for_upload(upload_bytes: int) -> int:
+    """
+    Reserve the estimated memory for scanning an upload of ``upload_bytes``,
+    taking over bytes handed over to the request (see hand_over).
+
+    Returns:
+        The reserved bytes, to hand back with ``memory_budget.release``
+
+    Raises:
+        HTTPException: 413 if the estimate exceeds the per-request budget, 503
+            if the worker's budget does not free up in time
+    """
+    held = _handed_over.get()
+    _handed_over.set(0)
+    try:
+        estimated = check_upload_size(upload_bytes)
+        if estimated > held:
+            await memory_budget.acquire(estimated - held)
+    except BaseException:
+        if held:
+            memory_budget.release(held)
+        raise
+    if held > estimated:
+        memory_budget.release(held - estimated)
+    return estimated
+
+
+def hand_over(nbytes: int) -> None:
+    """
+    Give the current request ``nbytes`` already reserved for its upload, e.g.
+    by a ZIP scan before it decompressed the entry. The next
+    ``reserve_for_upload`` takes them over instead of reserving again.
+    """
+    _handed_over.set(nbytes)
+
+
+def release_unclaimed() -> None:
+    """Release bytes handed over to the current request that no reservation took over."""
+    held = _handed_over.get()
+    _handed_over.set(0)
+    if held:
+        memory_budget.release(held)
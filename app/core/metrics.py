@@ -0,0 +1,52 @@
+"""
+Minimal in-process metrics registry.
+
+Counters and summaries (count/sum/max) live in the worker process, so each
+gunicorn worker reports its own numbers. Labels are folded into the metric key,
+e.g. ``response_bytes{path=/health}``.
+"""
+import threading
+from typing import Any, Dict
+
+_lock = threading.Lock()
+_counters: Dict[str, float] = {}
+_summaries: Dict[str, Dict[str, float]] = {}
+
+
+def _key(name: str, labels: Dict[str, Any]) -> str:
+    if not labels:
+        return name
+    label_str = ",".join(f"{k}={v}" for k, v in sorted(labels.items()))
+    return f"{name}{{{label_str}}}"
+
+
+def increment(name: str, value: float = 1, **labels: Any) -> None:
+    """Add ``value`` to a counter."""
+    key = _key(name, labels)
+    with _lock:
+        _counters[key] = _counters.get(key, 0) + value
+
+
+def observe(name: str, value: float, **labels: Any) -> None:
+    """Record one observation (a duration, a size, ...) in a summary."""
+    key = _key(name, labels)
+    with _lock:
+        summary = _summaries.get(key)
+        if summary is None:
+            _summaries[key] = {"count": 1, "sum": value, "max": value}
+        else:
+            summary["count"] += 1
+            summary["sum"] += value
+            if value > summary["max"]:
+                summary["max"] = value
+
+
+def snapshot() -> Dict[str, Any]:
+    """Return a copy of all counters and summaries, with averages filled in."""
+    with _lock:
+        counters = dict(_counters)
+        summaries = {
+            key: {**summary, "avg": summary["sum"] / summary["count"]}
+            for key, summary in _summaries.items()
+        }
+    return {"counters": counters, "summaries": summaries}
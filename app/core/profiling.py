@@ -0,0 +1,150 @@
+"""
+On-demand profiling for a running worker.
+
+``SamplingProfiler`` is a wall-clock sampler: a background thread reads every
+thread's stack with ``sys._current_frames()`` at a fixed interval and counts
+identical stacks. Nothing is installed in the profiled threads, so the only
+cost is the sampling thread holding the GIL while it walks the stacks; that
+time is measured and reported as the overhead.
+
+Output is in the collapsed ("folded") stack format, one ``frame;frame;... count``
+line per unique stack, which flamegraph.pl, speedscope and inferno read directly.
+
+Each gunicorn worker is a separate process, so a profile only covers the
+worker that served the profiling request (its pid is returned with the result).
+"""
+import os
+import sys
+import sysconfig
+import threading
+import time
+from collections import Counter
+from typing import Any, Dict, Optional
+
+from app.core import metrics
+
+# Only one sampler per worker, so overlapping requests don't double the overhead
+_sampler_lock = threading.Lock()
+
+_PATH_PREFIXES = sorted(
+    {
+        path + os.sep
+        for path in (sysconfig.get_paths().get("purelib"), sysconfig.get_paths().get("stdlib"), os.getcwd())
+        if path
+    },
+    key=len,
+    reverse=True,
+)
+
+
+# Leaf frames of threads that are parked rather than working
+IDLE_FRAMES = {
+    ("threading.py", "wait"),
+    ("threading.py", "_wait_for_tstate_lock"),
+    ("selectors.py", "select"),
+    ("queue.py", "get"),
+    ("thread.py", "_worker"),
+}
+
+
+def _short_path(filename: str) -> str:
+    for prefix in _PATH_PREFIXES:
+        if filename.startswith(prefix):
+            return filename[len(prefix):]
+    return filename
+
+
+class SamplingProfiler:
+    """Sample the stacks of every thread in this process for a fixed duration."""
+
+    def __init__(self, interval: float = 0.01, include_idle: bool = False):
+        self.interval = interval
+        self.include_idle = include_idle
+        self.stacks: Counter = Counter()
+        self.samples = 0
+        self.sampling_seconds = 0.0
+        self.started = 0.0
+        self.stopped = 0.0
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._labels: Dict[Any, str] = {}
+
+    def _frame_label(self, frame) -> str:
+        code = frame.f_code
+        label = self._labels.get(code)
+        if label is None:
+            label = self._labels[code] = f"{code.co_name} ({_short_path(code.co_filename)}:{code.co_firstlineno})"
+        return label
+
+    def _sample(self) -> None:
+        own_id = threading.get_ident()
+        names = {thread.ident: thread.name for thread in threading.enumerate()}
+        for thread_id, frame in sys._current_frames().items():
+            if thread_id == own_id:
+                continue
+            if not self.include_idle and (os.path.basename(frame.f_code.co_filename), frame.f_code.co_name) in IDLE_FRAMES:
+                continue
+            frames = []
+            while frame is not None:
+                frames.append(self._frame_label(frame))
+                frame = frame.f_back
+            frames.append(names.get(thread_id, str(thread_id)))
+            self.stacks[";".join(reversed(frames))] += 1
+        self.samples += 1
+
+    def _run(self) -> None:
+        next_sample = time.perf_counter()
+        while not self._stop.is_set():
+            sample_started = time.perf_counter()
+            self._sample()
+            self.sampling_seconds += time.perf_counter() - sample_started
+            next_sample += self.interval
+            self._stop.wait(max(0.0, next_sample - time.perf_counter()))
+
+    def start(self) -> None:
+        self.started = time.perf_counter()
+        self._thread = threading.Thread(target=self._run, name="sampling-profiler", daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+        self.stopped = time.perf_counter()
+
+    def collapsed(self) -> str:
+        """The samples in collapsed stack format, most frequent stack first."""
+        return "".join(f"{stack} {count}\n" for stack, count in self.stacks.most_common())
+
+    def summary(self) -> Dict[str, Any]:
+        """Duration, sample count and sampling overhead of the run."""
+        wall_seconds = max(self.stopped - self.started, 1e-9)
+        overhead_pct = 100 * self.sampling_seconds / wall_seconds
+        return {
+            "pid": os.getpid(),
+            "duration_seconds": round(wall_seconds, 3),
+            "interval_ms": self.interval * 1000,
+            "samples": self.samples,
+            "include_idle": self.include_idle,
+            "unique_stacks": len(self.stacks),
+            "sampling_ms_per_sample": round(1000 * self.sampling_seconds / self.samples, 3) if self.samples else 0.0,
+            # Share of wall time the sampler held the GIL, i.e. time taken from the worker
+            "overhead_pct": round(overhead_pct, 3),
+        }
+
+
+def try_acquire() -> bool:
+    """Reserve this worker's sampler; False if a profile is already running."""
+    return _sampler_lock.acquire(blocking=False)
+
+
+def release() -> None:
+    """Free this worker's sampler."""
+    _sampler_lock.release()
+
+
+def record_overhead(profiler: SamplingProfiler) -> None:
+    """Record a finished run's sampling overhead in the metrics."""
+    summary = profiler.summary()
+    metrics.observe("profiler_overhead_pct", summary["overhead_pct"])
+    metrics.observe("profiler_sample_ms", summary["sampling_ms_per_sample"])
@@ -0,0 +1,28 @@
+import time
+from typing import Any
+
+from fastapi.responses import ORJSONResponse
+
+from app.core import metrics
+
+
+class MeasuredORJSONResponse(ORJSONResponse):
+    """
+    ORJSONResponse that records how long serialization took.
+
+    Used as the app's default response class. The duration is added to the
+    ``response_serialize_ms`` metric and sent to the client in a Server-Timing
+    header.
+    """
+
+    def __init__(self, content: Any, *args: Any, **kwargs: Any) -> None:
+        self.serialize_ms = 0.0
+        super().__init__(content, *args, **kwargs)
+        self.headers.append("Server-Timing", f"serialize;dur={self.serialize_ms:.2f}")
+
+    def render(self, content: Any) -> bytes:
+        started = time.perf_counter()
+        body = super().render(content)
+        self.serialize_ms = (time.perf_counter() - started) * 1000
+        metrics.observe("response_serialize_ms", self.serialize_ms)
+        return body
@@ -0,0 +1,174 @@
+"""
+Cold-start bookkeeping and the worker warm-up hook.
+
+Import this module before anything heavy so ``PROCESS_STARTED`` marks the
+beginning of the import phase. ``preload_modules`` is called in the gunicorn
+master before it forks, so the heavy client libraries are shared by every
+worker. ``warm_up`` is called from each worker's FastAPI startup event and
+builds the prompt templates, the regulation index, the LLM client, the DB pool
+and the near-duplicate index before the worker reports ready.
+
+Run ``python -m app.core.startup`` to print an import-time report for
+``app.main`` (based on ``python -X importtime``).
+"""
+import os
+import subprocess
+import sys
+import time
+from typing import Any, Dict, List, Tuple
+
+PROCESS_STARTED = time.perf_counter()
+
+_timings: Dict[str, float] = {}
+
+
+def mark(stage: str) -> float:
+    """Record the elapsed milliseconds since process start for a stage."""
+    elapsed_ms = (time.perf_counter() - PROCESS_STARTED) * 1000
+    _timings[stage] = round(elapsed_ms, 1)
+    return elapsed_ms
+
+
+def report() -> Dict[str, float]:
+    """Return a copy of the cold-start timings recorded so far."""
+    return dict(_timings)
+
+
+def _timed(name: str, func) -> None:
+    """Run a warm-up step, recording its duration and swallowing failures."""
+    from app.core.logging import log_warning
+
+    started = time.perf_counter()
+    try:
+        func()
+    except Exception as e:
+        log_warning(f"Warm-up step '{name}' failed: {str(e)}")
+    _timings[f"warm_up_{name}_ms"] = round((time.perf_counter() - started) * 1000, 1)
+
+
+def _warm_prompts() -> None:
+    from app.services.compliance_scan.llm_models import ComplianceScanAgentPrompts
+
+    # Render once so template parsing and validation happen before the first request
+    ComplianceScanAgentPrompts.compliance_scan_agent.format_messages(
+        compliance_data="", user_context="", questions=[], regulations=""
+    )
+    ComplianceScanAgentPrompts.compliance_scan_agent_cached.format_messages(
+        org_profile="", questions=[], regulations="", document_context="", compliance_data=""
+    )
+
+
+def _warm_regulations() -> None:
+    from app.core.config import get
+    from app.services.compliance_scan.regulations import get_regulation_index
+    from app.utils.tokens import count_tokens
+
+    get_regulation_index()
+    # Loads (and if needed downloads) the tokenizer used to measure prompt overhead
+    count_tokens("warm up", get("OPENAI_LLM_MODEL"))
+
+
+def _warm_llm() -> None:
+    from app.services.compliance_scan.compliance_scanner import ComplianceScanAgent, get_compliance_scan_chain
+
+    agent = ComplianceScanAgent()
+    get_compliance_scan_chain(str(agent.open_ai_key), str(agent.llm_model), agent.prompt_layout)
+
+
+def _warm_db() -> None:
+    from app.db.database import create_tables, warm_up_pool
+
+    warm_up_pool()
+    create_tables()
+
+
+def _warm_near_duplicates() -> None:
+    from app.db.database import SessionLocal
+    from app.services.near_duplicates import NearDuplicateService
+
+    db = SessionLocal()
+    try:
+        NearDuplicateService.refresh(db, force=True)
+    finally:
+        db.close()
+
+
+# Imported on first use by the app, so a plain ``import app.main`` stays fast
+PRELOAD_MODULES = ("langchain_openai", "openai", "httpx", "tiktoken")
+
+
+def preload_modules() -> None:
+    """
+    Import the model client libraries in the gunicorn master (``when_ready``),
+    before ``gc.freeze`` and the fork, so workers share them copy-on-write
+    instead of each importing them during warm-up.
+    """
+    import importlib
+
+    from app.core.logging import log_warning
+
+    started = time.perf_counter()
+    for module in PRELOAD_MODULES:
+        try:
+            importlib.import_module(module)
+        except ImportError as e:
+            log_warning(f"Preloading {module} failed: {str(e)}")
+    _timings["preload_modules_ms"] = round((time.perf_counter() - started) * 1000, 1)
+
+
+def warm_up() -> Dict[str, float]:
+    """Build expensive per-worker objects before the worker serves traffic."""
+    from app.core.logging import log_info
+
+    warm_started = time.perf_counter()
+    _timed("prompts", _warm_prompts)
+    _timed("regulations", _warm_regulations)
+    _timed("llm", _warm_llm)
+    _timed("db", _warm_db)
+    _timed("near_duplicates", _warm_near_duplicates)
+    _timings["warm_up_ms"] = round((time.perf_counter() - warm_started) * 1000, 1)
+    mark("ready")
+
+    log_info(f"Cold start report (pid {os.getpid()}): {report()}")
+    return report()
+
+
+def import_time_report(module: str = "app.main", top: int = 25) -> Tuple[float, List[Tuple[float, float, str]]]:
+    """
+    Import a module in a fresh interpreter with ``-X importtime``.
+
+    Returns:
+        The total cumulative import time in ms and the ``top`` slowest modules as
+        (cumulative ms, self ms, module name) tuples.
+    """
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        capture_output=True,
+        text=True,
+    )
+    rows: List[Tuple[float, float, str]] = []
+    total_ms = 0.0
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        try:
+            self_us, cumulative_us, name = line[len("import time:"):].split("|", 2)
+        except ValueError:
+            continue
+        cumulative_ms = int(cumulative_us) / 1000
+        name = name[1:].rstrip()
+        if not name.startswith(" "):
+            # Top-level imports are not indented; their cumulative times add up to the total
+            total_ms += cumulative_ms
+        rows.append((cumulative_ms, int(self_us) / 1000, name.strip()))
+
+    rows.sort(reverse=True)
+    return total_ms, rows[:top]
+
+
+if __name__ == "__main__":
+    total, slowest = import_time_report()
+    print(f"Cold import of app.main: {total:.1f} ms")
+    print(f"{'cumulative ms':>14} {'self ms':>10}  module")
+    for cumulative_ms, self_ms, name in slowest:
+        print(f"{cumulative_ms:>14.1f} {self_ms:>10.1f}  {name}")
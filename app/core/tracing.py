@@ -0,0 +1,200 @@
+"""
+Request-scoped correlation ids and lightweight, OpenTelemetry-compatible spans.
+
+``RequestContextMiddleware`` sets the request id and opens the root span for
+each request; code then wraps its stages in ``span(...)``. Both live in
+contextvars, so they follow the request into ``run_in_threadpool`` calls and
+never leak between concurrent requests.
+
+When a root span ends, the whole trace is written as one JSON object per span
+in the OpenTelemetry SDK ``ConsoleSpanExporter`` format, to stdout
+(``TRACE_EXPORTER=console``), a rotating file (``file``, the default) or
+nowhere (``none``). Stage durations are always recorded in the metrics.
+"""
+import json
+import logging
+import os
+import secrets
+import sys
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from datetime import datetime, timezone
+from logging.handlers import RotatingFileHandler
+from typing import Any, Dict, Iterator, List, Optional
+
+from app.core import metrics
+from app.core.config import get
+
+request_id_var: ContextVar[str] = ContextVar("request_id", default="-")
+_current_span: ContextVar[Optional["Span"]] = ContextVar("current_span", default=None)
+
+_exporter: Optional[logging.Logger] = None
+_exporter_lock = threading.Lock()
+
+
+def current_request_id() -> str:
+    """The correlation id of the request being handled, or "-" outside a request."""
+    return request_id_var.get()
+
+
+def new_request_id() -> str:
+    """A fresh correlation id for a request that did not send a usable one."""
+    return secrets.token_hex(8)
+
+
+class _Trace:
+    """The spans of one trace, collected until its root span ends."""
+
+    def __init__(self) -> None:
+        self.trace_id = secrets.token_hex(16)
+        self.spans: List["Span"] = []
+        self.lock = threading.Lock()
+
+
+class Span:
+    """A timed operation within a trace."""
+
+    def __init__(self, name: str, trace: _Trace, parent: Optional["Span"], attributes: Dict[str, Any]) -> None:
+        self.name = name
+        self.trace = trace
+        self.parent = parent
+        self.span_id = secrets.token_hex(8)
+        self.attributes = dict(attributes)
+        self.status = "UNSET"
+        self.status_description: Optional[str] = None
+        self.start_ns = time.time_ns()
+        self.end_ns: Optional[int] = None
+
+    @property
+    def duration_ms(self) -> float:
+        end_ns = self.end_ns if self.end_ns is not None else time.time_ns()
+        return (end_ns - self.start_ns) / 1e6
+
+    def set_attribute(self, key: str, value: Any) -> None:
+        self.attributes[key] = value
+
+    def set_error(self, error: BaseException) -> None:
+        self.status = "ERROR"
+        self.status_description = f"{type(error).__name__}: {error}"
+
+    def end(self, end_ns: Optional[int] = None) -> None:
+        """Finish the span; ending the root span exports the trace."""
+        if self.end_ns is not None:
+            return
+        self.end_ns = end_ns if end_ns is not None else time.time_ns()
+        metrics.observe("span_ms", self.duration_ms, span=self.name)
+        with self.trace.lock:
+            self.trace.spans.append(self)
+        if self.parent is None:
+            _export(self)
+
+    def to_otel(self) -> Dict[str, Any]:
+        """This span in the OpenTelemetry SDK console exporter JSON format."""
+        status = {"status_code": self.status}
+        if self.status_description:
+            status["description"] = self.status_description
+        return {
+            "name": self.name,
+            "context": {
+                "trace_id": f"0x{self.trace.trace_id}",
+                "span_id": f"0x{self.span_id}",
+                "trace_state": "[]",
+            },
+            "kind": "SpanKind.SERVER" if self.parent is None else "SpanKind.INTERNAL",
+            "parent_id": f"0x{self.parent.span_id}" if self.parent is not None else None,
+            "start_time": _iso(self.start_ns),
+            "end_time": _iso(self.end_ns),
+            "status": status,
+            "attributes": self.attributes,
+            "events": [],
+            "links": [],
+            "resource": {
+                "attributes": {"service.name": get("PROJECT_NAME"), "service.version": get("PROJECT_VERSION")},
+                "schema_url": "",
+            },
+        }
+
+
+def _iso(ns: Optional[int]) -> Optional[str]:
+    if ns is None:
+        return None
+    return datetime.fromtimestamp(ns / 1e9, tz=timezone.utc).isoformat().replace("+00:00", "Z")
+
+
+def start_span(name: str, **attributes: Any) -> Span:
+    """
+    Start a span as a child of the current span (or as a new trace's root).
+
+    The span does not become current; call ``end()`` on it. Prefer ``span``.
+    """
+    parent = _current_span.get()
+    trace = parent.trace if parent is not None else _Trace()
+    attributes.setdefault("request.id", current_request_id())
+    return Span(name, trace, parent, attributes)
+
+
+@contextmanager
+def span(name: str, **attributes: Any) -> Iterator[Span]:
+    """Run a block in a new span that is current for its duration."""
+    current = start_span(name, **attributes)
+    token = _current_span.set(current)
+    try:
+        yield current
+    except BaseException as e:
+        current.set_error(e)
+        raise
+    finally:
+        _current_span.reset(token)
+        current.end()
+
+
+def record_span(name: str, start_ns: int, end_ns: int, **attributes: Any) -> Optional[Span]:
+    """Record an already finished stage (e.g. a body upload) under the current span."""
+    if _current_span.get() is None:
+        return None
+    finished = start_span(name, **attributes)
+    finished.start_ns = start_ns
+    finished.end(end_ns)
+    return finished
+
+
+def _get_exporter() -> Optional[logging.Logger]:
+    """Build the trace exporter on first use from TRACE_EXPORTER."""
+    global _exporter
+    if _exporter is not None or get("TRACE_EXPORTER") == "none":
+        return _exporter
+    with _exporter_lock:
+        if _exporter is None:
+            exporter = logging.getLogger("fcc_compliance_traces")
+            exporter.setLevel(logging.INFO)
+            exporter.propagate = False
+            if not exporter.handlers:
+                if get("TRACE_EXPORTER") == "console":
+                    handler: logging.Handler = logging.StreamHandler(sys.stdout)
+                else:
+                    trace_file = get("TRACE_FILE")
+                    os.makedirs(os.path.dirname(trace_file) or ".", exist_ok=True)
+                    handler = RotatingFileHandler(trace_file, maxBytes=10485760, backupCount=5, delay=True)
+                handler.setFormatter(logging.Formatter("%(message)s"))
+                exporter.addHandler(handler)
+            _exporter = exporter
+    return _exporter
+
+
+def _export(root: Span) -> None:
+    """Export a finished trace, and log a stage breakdown if the request was slow."""
+    with root.trace.lock:
+        spans = sorted(root.trace.spans, key=lambda s: s.start_ns)
+
+    exporter = _get_exporter()
+    if exporter is not None:
+        for finished in spans:
+            exporter.info(json.dumps(finished.to_otel(), default=str))
+
+    if root.duration_ms >= get("TRACE_SLOW_REQUEST_MS"):
+        from app.core.logging import log_warning
+
+        stages = ", ".join(f"{s.name}={s.duration_ms:.0f}ms" for s in spans if s is not root)
+        log_warning(f"Slow request: {root.name} took {root.duration_ms:.0f} ms ({stages or 'no stages'})")
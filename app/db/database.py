@@ -1,11 +1,17 @@
-from sqlalchemy import create_engine
+from sqlalchemy import create_engine, text
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker
 
 from app.core.config import get  # Changed from 'import settings'
 
-# Create SQLAlchemy engine
-engine = create_engine(get("DATABASE_URL"))  # Changed from settings.DATABASE_URL
+# Create SQLAlchemy engine. No connection is opened here; warm_up_pool() does that per worker.
+engine = create_engine(
+    get("DATABASE_URL"),  # Changed from settings.DATABASE_URL
+    pool_size=get("DB_POOL_SIZE"),
+    max_overflow=get("DB_MAX_OVERFLOW"),
+    pool_recycle=get("DB_POOL_RECYCLE_SECONDS"),
+    pool_pre_ping=True,
+)
 
 # Create SessionLocal class
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
@@ -14,6 +20,29 @@ SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 Base = declarative_base()
 
 
+def warm_up_pool(connections: int = None) -> None:
+    """Open pooled connections up front so the first requests skip the connect cost."""
+    connections = connections or get("DB_POOL_WARM_CONNECTIONS")
+    opened = []
+    try:
+        for _ in range(connections):
+            conn = engine.connect()
+            conn.execute(text("SELECT 1"))
+            opened.append(conn)
+    finally:
+        # Returning the connections to the pool keeps them open for reuse
+        for conn in opened:
+            conn.close()
+
+
+def create_tables() -> None:
+    """Create any missing tables for the registered models."""
+    # Importing the models registers them on Base.metadata
+    from app.models import batch_scan, org_profile, scan_result, token_usage, user  # noqa
+
+    Base.metadata.create_all(bind=engine)
+
+
 # Dependency to get DB session
 def get_db():
     db = SessionLocal()
@@ -1,13 +1,34 @@
-from fastapi import FastAPI, Request
-from fastapi.responses import JSONResponse
+# Imported first so cold-start timings include every import below
+from app.core import startup
+
+import orjson
+from fastapi import Depends, FastAPI
+from fastapi.responses import Response
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.middleware.gzip import GZipMiddleware
 from app.api.v1.endpoints.UnAuth import auth
 from app.api.v1.endpoints.UnAuth import pdf_compliance_scan
+from app.api.v1.endpoints.UnAuth import chunked_upload
+from app.api.v1.endpoints.UnAuth import zip_compliance_scan
 from app.api.v1.endpoints.Auth import user
 from app.api.v1.endpoints.Auth import compliance_scan
+from app.api.v1.endpoints.Auth import scan_history
+from app.api.v1.endpoints.Auth import org_profile
+from app.api.v1.endpoints.Auth import profiling
+from app.api.v1.endpoints.Auth import token_usage
+from app.api.v1.endpoints.Auth import batch_scan
 
 # Import configuration
 from app.core.config import get  # Changed from 'import config'
+from app.core import metrics
+from app.core.health import llm_circuit, readiness
+from app.core.responses import MeasuredORJSONResponse
+from app.middleware.request_context import RequestContextMiddleware
+from app.middleware.request_profile import RequestProfileMiddleware
+from app.middleware.response_size import ResponseSizeMiddleware
+from app.utils.auth import get_metrics_access
+from app.services.batch_scan.poller import batch_poller
+from app.services.compliance_scan.scheduler import llm_scheduler
 
 # Import logging configuration
 from app.core.logging_config import logger
@@ -24,6 +45,7 @@ app = FastAPI(
     title="FCC Compliance Communicate API",
     description="API for FCC compliance monitoring and communication",
     version=get("PROJECT_VERSION", "1.0.0"),  # Changed from config.get("PROJECT_VERSION", "1.0.0")
+    default_response_class=MeasuredORJSONResponse,
 )
 
 MODEL_NAME = 'Communicate backend'
@@ -32,14 +54,62 @@ MODEL_VERSION = 'v25.03.01'
 # Log application startup
 logger.info(f"Starting {MODEL_NAME} {MODEL_VERSION}")
 
+
+@app.on_event("startup")
+def warm_up_worker():
+    # Runs in each worker after the fork, before it accepts traffic
+    startup.warm_up()
+
+
+@app.on_event("startup")
+async def start_readiness_checks():
+    readiness.start()
+
+
+@app.on_event("shutdown")
+async def stop_readiness_checks():
+    await readiness.stop()
+
+
+@app.on_event("startup")
+async def start_batch_poller():
+    batch_poller.start()
+
+
+@app.on_event("shutdown")
+async def stop_batch_poller():
+    await batch_poller.stop()
+
+
 app.add_middleware(
     CORSMiddleware,
     allow_origins=["*"],  # FILL IN THE ORIGINS LATER
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-Request-ID"],
 )
 
+# Compress large responses (reports, history lists). Brotli is used when the
+# optional brotli-asgi package is installed, with gzip as the fallback.
+try:
+    from brotli_asgi import BrotliMiddleware
+
+    app.add_middleware(
+        BrotliMiddleware,
+        minimum_size=get("COMPRESSION_MINIMUM_SIZE"),
+        gzip_fallback=True,
+    )
+except ImportError:
+    app.add_middleware(GZipMiddleware, minimum_size=get("COMPRESSION_MINIMUM_SIZE"))
+
+# Added last so it wraps compression and counts the bytes actually sent
+app.add_middleware(ResponseSizeMiddleware)
+# Opt-in per-request cProfile (inside the request context so files are named by request id)
+app.add_middleware(RequestProfileMiddleware)
+# Outermost, so the request id and root span cover everything else
+app.add_middleware(RequestContextMiddleware)
+
 
 @app.get("/docs", include_in_schema=False)
 async def custom_swagger_ui_html():
@@ -66,56 +136,37 @@ async def redoc_html():
     )
 
 
-@app.get('/health')
-def route_health(request: Request):
-    res = dict()
-    res['Communicate_backend'] = MODEL_VERSION
-    res['apiVersion'] = MODEL_NAME + ':' + MODEL_VERSION
-    res['statusCode'] = 200
-    res['status'] = 'ok'
-    res['error'] = None,
-    res['message'] = "Communicate System is up and running",
-    res['isOk'] = True
-    return JSONResponse(content=res, status_code=200)
-
-
-@app.get('/')
-def root_route_health(request: Request):
-    res = dict()
-    res['Communicate_backend'] = MODEL_VERSION
-    res['apiVersion'] = MODEL_NAME + ':' + MODEL_VERSION
-    res['statusCode'] = 200
-    res['status'] = 'ok'
-    res['error'] = None,
-    res['message'] = "Communicate System is up and running",
-    res['isOk'] = True
-    return JSONResponse(content=res, status_code=200)
-
-
-@app.head('/health')
-def route_health_head(request: Request):
-    res = dict()
-    res['Communicate_backend'] = MODEL_VERSION
-    res['apiVersion'] = MODEL_NAME + ':' + MODEL_VERSION
-    res['statusCode'] = 200
-    res['status'] = 'ok'
-    res['error'] = None,
-    res['message'] = "Communicate System is up and running",
-    res['isOk'] = True
-    return JSONResponse(content=res, status_code=200)
-
-
-@app.head('/')
-def root_route_health_head(request: Request):
-    res = dict()
-    res['Communicate_backend'] = MODEL_VERSION
-    res['apiVersion'] = MODEL_NAME + ':' + MODEL_VERSION
-    res['statusCode'] = 200
-    res['status'] = 'ok'
-    res['error'] = None,
-    res['message'] = "Communicate System is up and running",
-    res['isOk'] = True
-    return JSONResponse(content=res, status_code=200)
+# Liveness: built once, the same bytes for every probe
+LIVENESS_BODY = orjson.dumps({
+    "Communicate_backend": MODEL_VERSION,
+    "apiVersion": MODEL_NAME + ':' + MODEL_VERSION,
+    "statusCode": 200,
+    "status": "ok",
+    "error": None,
+    "message": "Communicate System is up and running",
+    "isOk": True,
+})
+
+
+@app.api_route('/', methods=["GET", "HEAD"])
+@app.api_route('/health', methods=["GET", "HEAD"])
+@app.api_route('/health/live', methods=["GET", "HEAD"])
+async def route_health():
+    # async so the probe never waits for a threadpool thread
+    return Response(content=LIVENESS_BODY, media_type="application/json")
+
+
+@app.api_route('/health/ready', methods=["GET", "HEAD"])
+async def route_ready():
+    # Cached result of the background readiness checker (see app.core.health)
+    status_code, body = readiness.response()
+    return Response(content=body, status_code=status_code, media_type="application/json")
+
+
+@app.get('/metrics', include_in_schema=False, dependencies=[Depends(get_metrics_access)])
+def route_metrics():
+    # Per-worker counters and summaries (response bytes, serialization time, ...); for superusers and scrapers
+    return {**metrics.snapshot(), "llm_scheduler": llm_scheduler.stats(), "llm_circuit": llm_circuit.report()}
 
 
 # ___________________________________________ API ROUTES ___________________________________________
@@ -123,7 +174,16 @@ def root_route_health_head(request: Request):
 
 app.include_router(auth.router, prefix="/api/v1/unauth")
 app.include_router(pdf_compliance_scan.router, prefix="/api/v1/unauth")
+app.include_router(chunked_upload.router, prefix="/api/v1/unauth")
+app.include_router(zip_compliance_scan.router, prefix="/api/v1/unauth")
 app.include_router(user.router, prefix="/api/v1/auth")
 app.include_router(compliance_scan.router, prefix="/api/v1/unauth")
+app.include_router(scan_history.router, prefix="/api/v1/auth")
+app.include_router(org_profile.router, prefix="/api/v1/auth")
+app.include_router(profiling.router, prefix="/api/v1/auth")
+app.include_router(token_usage.router, prefix="/api/v1/auth")
+app.include_router(batch_scan.router, prefix="/api/v1/auth")
 
 # ___________________________________________ API ROUTES ___________________________________________
+
+startup.mark("imports")
@@ -0,0 +1,74 @@
+import re
+import time
+
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from app.core import tracing
+
+# Client-supplied ids are only reused if they are short and log-safe
+REQUEST_ID_PATTERN = re.compile(r"^[A-Za-z0-9._-]{1,64}$")
+
+
+class RequestContextMiddleware:
+    """
+    Give every request a correlation id and a root trace span.
+
+    The id comes from the X-Request-ID header when it is log-safe, otherwise a
+    new one is generated; it is echoed in the response's X-Request-ID header and
+    stamped on every log record. Reading the request body is recorded as the
+    "upload" span. Add it outermost so the root span covers every other
+    middleware.
+    """
+
+    def __init__(self, app: ASGIApp) -> None:
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        request_id = None
+        for name, value in scope.get("headers", []):
+            if name == b"x-request-id":
+                request_id = value.decode("latin-1")
+                break
+        if request_id is None or not REQUEST_ID_PATTERN.match(request_id):
+            request_id = tracing.new_request_id()
+        token = tracing.request_id_var.set(request_id)
+
+        upload_started = None
+        upload_bytes = 0
+
+        async def receive_wrapper() -> Message:
+            nonlocal upload_started, upload_bytes
+            message = await receive()
+            if message["type"] == "http.request":
+                if upload_started is None:
+                    upload_started = time.time_ns()
+                upload_bytes += len(message.get("body", b""))
+                if not message.get("more_body", False) and upload_bytes:
+                    tracing.record_span("upload", upload_started, time.time_ns(), **{"http.request.body.size": upload_bytes})
+            return message
+
+        async def send_wrapper(message: Message) -> None:
+            if message["type"] == "http.response.start":
+                root.set_attribute("http.response.status_code", message["status"])
+                message.setdefault("headers", [])
+                message["headers"] = list(message["headers"]) + [(b"x-request-id", request_id.encode("latin-1"))]
+            await send(message)
+
+        try:
+            # Named by method alone until a route matches, as OpenTelemetry's HTTP conventions suggest
+            with tracing.span(scope["method"], **{
+                "http.request.method": scope["method"],
+                "url.path": scope["path"],
+            }) as root:
+                await self.app(scope, receive_wrapper, send_wrapper)
+                route = scope.get("route")
+                if route is not None:
+                    # Name by route template so spans group across ids in the path
+                    root.name = f"{scope['method']} {route.path}"
+                    root.set_attribute("http.route", route.path)
+        finally:
+            tracing.request_id_var.reset(token)
@@ -0,0 +1,77 @@
+import cProfile
+import os
+import secrets
+import threading
+
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from app.core import tracing
+from app.core.config import get
+from app.core.logging import log_info, log_warning
+
+# cProfile can only have one active profiler per process
+_profile_lock = threading.Lock()
+
+
+class RequestProfileMiddleware:
+    """
+    Capture a cProfile of a single request on demand.
+
+    Enabled only when PROFILING_REQUEST_TOKEN is set; a request that sends the
+    token in the X-Profile-Request header is profiled and the stats are written
+    to PROFILING_DIR/<request id>.prof (open with pstats or snakeviz). The file
+    name is returned in the X-Profile-File header. One request is profiled at a
+    time per worker; others get X-Profile-File: busy and run unprofiled.
+
+    On Python 3.12+ cProfile sees every thread, so threadpool work (PDF
+    extraction, sync endpoints) is included, along with anything other requests
+    run concurrently in this worker. On older Pythons only the event loop
+    thread is profiled.
+    """
+
+    def __init__(self, app: ASGIApp) -> None:
+        self.app = app
+
+    def _requested(self, scope: Scope) -> bool:
+        token = get("PROFILING_REQUEST_TOKEN")
+        if not token:
+            return False
+        for name, value in scope.get("headers", []):
+            if name == b"x-profile-request":
+                return secrets.compare_digest(value, token.encode())
+        return False
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http" or not self._requested(scope):
+            await self.app(scope, receive, send)
+            return
+
+        if not _profile_lock.acquire(blocking=False):
+            log_warning("Request profiling skipped: another request is being profiled")
+            await self.app(scope, receive, self._with_header(send, "busy"))
+            return
+
+        profile_dir = get("PROFILING_DIR")
+        filename = f"{tracing.current_request_id()}.prof"
+        profile = cProfile.Profile()
+        try:
+            profile.enable()
+            try:
+                await self.app(scope, receive, self._with_header(send, filename))
+            finally:
+                profile.disable()
+        finally:
+            _profile_lock.release()
+
+        os.makedirs(profile_dir, exist_ok=True)
+        profile.dump_stats(os.path.join(profile_dir, filename))
+        log_info(f"Request profile written to {os.path.join(profile_dir, filename)}")
+
+    @staticmethod
+    def _with_header(send: Send, value: str) -> Send:
+        async def send_wrapper(message: Message) -> None:
+            if message["type"] == "http.response.start":
+                message["headers"] = list(message.get("headers", [])) + [(b"x-profile-file", value.encode("latin-1"))]
+            await send(message)
+
+        return send_wrapper
@@ -0,0 +1,39 @@
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from app.core import metrics
+
+
+class ResponseSizeMiddleware:
+    """
+    Count the body bytes actually sent for each route.
+
+    Add it outermost (after the compression middleware) so the numbers are the
+    compressed bytes on the wire.
+    """
+
+    def __init__(self, app: ASGIApp) -> None:
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        sent = 0
+        encoding = "identity"
+
+        async def send_wrapper(message: Message) -> None:
+            nonlocal sent, encoding
+            if message["type"] == "http.response.start":
+                for name, value in message.get("headers", []):
+                    if name == b"content-encoding":
+                        encoding = value.decode("latin-1")
+            elif message["type"] == "http.response.body":
+                sent += len(message.get("body", b""))
+                if not message.get("more_body", False):
+                    route = scope.get("route")
+                    path = getattr(route, "path", scope["path"])
+                    metrics.observe("response_bytes", sent, path=path, encoding=encoding)
+            await send(message)
+
+        await self.app(scope, receive, send_wrapper)
@@ -0,0 +1,40 @@
+from sqlalchemy import Column, Integer, String, DateTime, Float, JSON, Text, Index
+from sqlalchemy.sql import func
+
+from app.db.database import Base
+
+
+class BatchScanItem(Base):
+    """A compliance scan deferred to a batch submission, and its outcome."""
+    __tablename__ = "batch_scan_items"
+
+    id = Column(Integer, primary_key=True, index=True)
+    item_id = Column(String(64), unique=True, index=True, nullable=False)  # custom_id in the batch file
+    status = Column(String(20), nullable=False, default="pending")  # pending, submitting, submitted, completed or failed
+    org_name = Column(String(255), nullable=True)
+    usage_account = Column(String(255), nullable=False)  # Token usage account (see TokenUsageService.usage_account)
+    org_profile_id = Column(Integer, nullable=True)  # Copied to the stored scan, which it scopes
+    user_id = Column(Integer, nullable=True)
+    document_hash = Column(String(64), nullable=False)
+    model = Column(String(100), nullable=False)
+    prompt_version = Column(String(50), nullable=False)
+    compliance_data = Column(JSON, nullable=False)  # The scan input, for the document info of the stored result
+    request = Column(JSON, nullable=False)  # Chat completions request body, as a live scan would send it
+    estimated_tokens = Column(Integer, nullable=False, default=0)  # Counted against the account's budget until written back
+    backend = Column(String(20), nullable=True)
+    # Claims the item for one submission before the backend is called; the batch is tagged with it
+    submission_id = Column(String(32), nullable=True, index=True)
+    submit_attempts = Column(Integer, nullable=False, default=0)
+    batch_id = Column(String(100), nullable=True, index=True)
+    document_id = Column(String(64), nullable=True)  # scan_results.document_id once written back
+    usage = Column(JSON, nullable=True)
+    cost_usd = Column(Float, nullable=True)
+    error = Column(Text, nullable=True)
+    created_at = Column(DateTime(timezone=True), server_default=func.now(), nullable=False)
+    submitted_at = Column(DateTime(timezone=True), nullable=True)
+    completed_at = Column(DateTime(timezone=True), nullable=True)
+
+    __table_args__ = (
+        # "Oldest pending items" for the next submission
+        Index("ix_batch_scan_items_status_created", "status", "created_at"),
+    )
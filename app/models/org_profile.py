@@ -0,0 +1,21 @@
+from sqlalchemy import Column, Integer, String, DateTime, JSON, Text
+from sqlalchemy.sql import func
+
+from app.db.database import Base
+
+
+class OrgProfile(Base):
+    __tablename__ = "org_profiles"
+
+    id = Column(Integer, primary_key=True, index=True)
+    name = Column(String(255), unique=True, index=True, nullable=False)
+    profile = Column(JSON, nullable=False)
+    # Byte-stable serialization sent to the model, so the prompt prefix never changes between scans
+    canonical_json = Column(Text, nullable=False)
+    profile_hash = Column(String(64), nullable=False)
+    # Optional daily LLM token budget; None falls back to ORG_DAILY_TOKEN_BUDGET
+    daily_token_budget = Column(Integer, nullable=True)
+    # users.id of the user who registered the profile; only they (and superusers) may use it
+    owner_id = Column(Integer, nullable=True, index=True)
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+    updated_at = Column(DateTime(timezone=True), onupdate=func.now())
@@ -0,0 +1,33 @@
+from sqlalchemy import Column, Integer, String, DateTime, JSON, Index, LargeBinary
+from sqlalchemy.sql import func
+
+from app.db.database import Base
+
+
+class ScanResult(Base):
+    __tablename__ = "scan_results"
+
+    id = Column(Integer, primary_key=True, index=True)
+    document_id = Column(String(64), unique=True, index=True, nullable=False)
+    document_name = Column(String(255), nullable=True)
+    document_hash = Column(String(64), nullable=False)
+    org_name = Column(String(255), nullable=True)
+    context_hash = Column(String(64), nullable=True)  # SHA-256 of the questions and organization context
+    # Who may read the scan: the owner of the registered profile it used, and the user who ran it
+    org_profile_id = Column(Integer, nullable=True, index=True)
+    user_id = Column(Integer, nullable=True, index=True)
+    model = Column(String(100), nullable=True)
+    prompt_version = Column(String(50), nullable=True)
+    compliance_score = Column(Integer, nullable=True)
+    compliance_status = Column(String(50), nullable=True)
+    response = Column(JSON, nullable=False)  # ComplianceScanResponse as returned to the client
+    timings = Column(JSON, nullable=True)  # Stage timings in milliseconds
+    minhash = Column(LargeBinary, nullable=True)  # MinHash signature of the document text (uint32 array)
+    reused_from = Column(String(64), nullable=True)  # document_id of the near-duplicate scan whose result was reused
+    created_at = Column(DateTime(timezone=True), server_default=func.now(), nullable=False)
+
+    __table_args__ = (
+        # "Scans for this org, newest first" and "has this exact file been scanned before"
+        Index("ix_scan_results_org_created", "org_name", "created_at"),
+        Index("ix_scan_results_hash_created", "document_hash", "created_at"),
+    )
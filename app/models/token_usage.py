@@ -0,0 +1,27 @@
+from sqlalchemy import Column, Integer, BigInteger, String, Date, DateTime, Float, UniqueConstraint
+from sqlalchemy.sql import func
+
+from app.db.database import Base
+
+
+class TokenUsageDaily(Base):
+    """LLM token usage rolled up per organization, model and UTC day."""
+    __tablename__ = "token_usage_daily"
+
+    id = Column(Integer, primary_key=True, index=True)
+    org_name = Column(String(255), nullable=False)
+    day = Column(Date, nullable=False)
+    model = Column(String(100), nullable=False)
+    calls = Column(Integer, nullable=False, default=0)
+    prompt_tokens = Column(BigInteger, nullable=False, default=0)
+    completion_tokens = Column(BigInteger, nullable=False, default=0)
+    cached_tokens = Column(BigInteger, nullable=False, default=0)
+    total_tokens = Column(BigInteger, nullable=False, default=0)
+    cost_usd = Column(Float, nullable=False, default=0.0)
+    llm_ms = Column(Float, nullable=False, default=0.0)  # Summed model latency
+    updated_at = Column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now())
+
+    __table_args__ = (
+        # One row per org, day and model; also serves "usage for this org today"
+        UniqueConstraint("org_name", "day", "model", name="uq_token_usage_daily_org_day_model"),
+    )
@@ -0,0 +1,20 @@
+from pydantic import BaseModel
+from typing import Optional
+from datetime import datetime
+
+
+class BatchScanItem(BaseModel):
+    """Schema for a deferred batch scan and where it stands."""
+    item_id: str
+    status: str
+    org_name: Optional[str] = None
+    batch_id: Optional[str] = None
+    document_id: Optional[str] = None  # The stored scan result, once completed
+    cost_usd: Optional[float] = None
+    error: Optional[str] = None
+    created_at: datetime
+    submitted_at: Optional[datetime] = None
+    completed_at: Optional[datetime] = None
+
+    class Config:
+        orm_mode = True
@@ -0,0 +1,23 @@
+from pydantic import BaseModel, Field
+from typing import Any, Dict, Optional
+
+
+class ChunkedUploadCreate(BaseModel):
+    """Schema for starting a chunked upload."""
+    filename: str
+    total_size: int = Field(..., gt=0)
+    sha256: Optional[str] = None  # SHA-256 of the whole file, checked on completion
+    org_context: Optional[Dict[str, Any]] = None
+    org_profile_id: Optional[int] = None
+
+
+class ChunkedUploadStatus(BaseModel):
+    """Schema for the state of a chunked upload; ``received`` is the offset of the next chunk."""
+    upload_id: str
+    filename: str
+    total_size: int
+    received: int
+    complete: bool
+    chunk_count: int
+    min_chunk_size: int  # Every chunk but the last
+    max_chunk_size: int
@@ -15,6 +15,7 @@ class ComplianceScanRequest(BaseModel):
     compliance_data: List[ComplianceDataItem]
     questions: List[str]
     user_context: Optional[Dict[str, Any]] = None  # Raw JSON context from frontend
+    org_profile_id: Optional[int] = None  # Registered organization profile, used as user_context["organization"]
 
 
 class DetailedComplianceReport(BaseModel):
@@ -0,0 +1,25 @@
+from pydantic import BaseModel
+from typing import Any, Dict, Optional
+from datetime import datetime
+
+
+class OrgProfileCreate(BaseModel):
+    """Schema for registering (or replacing) an organization profile."""
+    name: str
+    profile: Dict[str, Any]
+    daily_token_budget: Optional[int] = None  # LLM tokens per UTC day; None uses the default
+
+
+class OrgProfile(BaseModel):
+    """Schema for a registered organization profile."""
+    id: int
+    name: str
+    profile: Dict[str, Any]
+    profile_hash: str
+    daily_token_budget: Optional[int] = None
+    owner_id: Optional[int] = None
+    created_at: datetime
+    updated_at: Optional[datetime] = None
+
+    class Config:
+        orm_mode = True
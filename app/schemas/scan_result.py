@@ -0,0 +1,32 @@
+from pydantic import BaseModel
+from typing import Dict, Optional
+from datetime import datetime
+
+from app.schemas.compliance_scan import ComplianceScanResponse
+
+
+class ScanResultBase(BaseModel):
+    """Schema for a stored compliance scan, without the full report."""
+    document_id: str
+    document_name: Optional[str] = None
+    document_hash: str
+    org_name: Optional[str] = None
+    model: Optional[str] = None
+    prompt_version: Optional[str] = None
+    compliance_score: Optional[int] = None
+    compliance_status: Optional[str] = None
+    timings: Optional[Dict[str, float]] = None
+    reused_from: Optional[str] = None
+    created_at: datetime
+
+    class Config:
+        orm_mode = True
+
+
+class ScanResultSummary(ScanResultBase):
+    pass
+
+
+class ScanResult(ScanResultBase):
+    """Schema for a stored compliance scan including the full response."""
+    response: ComplianceScanResponse
@@ -0,0 +1,19 @@
+from pydantic import BaseModel
+from datetime import date
+
+
+class TokenUsageDaily(BaseModel):
+    """Schema for one organization's LLM token usage on one day and model."""
+    org_name: str
+    day: date
+    model: str
+    calls: int
+    prompt_tokens: int
+    completion_tokens: int
+    cached_tokens: int
+    total_tokens: int
+    cost_usd: float
+    llm_ms: float
+
+    class Config:
+        orm_mode = True
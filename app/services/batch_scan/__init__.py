@@ -0,0 +1 @@
+from .batch_scan_service import BatchScanService  # noqa
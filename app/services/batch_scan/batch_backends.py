@@ -0,0 +1,216 @@
+"""
+Batch submission backends.
+
+A backend takes a batch file in the OpenAI Batch API format (JSONL, one
+``{"custom_id", "method", "url", "body"}`` request per line) and later returns
+its results, one ``{"custom_id", "response": {"status_code", "body"}, "error"}``
+line per request. ``submit`` returns the backend's batch id and tags the batch
+with the caller's submission id; ``find`` returns the id of the batch tagged
+with a submission id, or None if the backend never accepted it, so a submission
+interrupted by a crash or an error can be settled without paying twice.
+``poll`` returns ``{"status": "in_progress"}`` until the batch has finished,
+then ``{"status": "completed" or "failed", "results": [...], "error": ...}``,
+where a failed batch (expired, cancelled) may still carry results for some
+requests. ``forget`` drops whatever the backend keeps locally for a batch whose
+results were written back. Backends do blocking I/O; call them from the
+threadpool.
+"""
+import hashlib
+import json
+import os
+import shutil
+import time
+from typing import Any, Dict, List, Optional
+
+from app.core.config import get
+from app.services.compliance_scan.repair import SECTION_NAMES
+from app.utils.tokens import count_tokens
+
+# OpenAI batch statuses that have not finished yet
+OPENAI_PENDING_STATUSES = ("validating", "in_progress", "finalizing", "cancelling")
+
+
+class OpenAIBatchBackend:
+    """The OpenAI Batch API: half-price chat completions, finished within 24 hours."""
+
+    name = "openai"
+
+    @staticmethod
+    def _client():
+        # httpx comes with the OpenAI client; import it on first use
+        import httpx
+
+        return httpx.Client(
+            base_url=get("BATCH_OPENAI_BASE_URL"),
+            headers={"Authorization": f"Bearer {get('OPENAI_KEY')}"},
+            timeout=120,
+        )
+
+    def submit(self, path: str, submission_id: str) -> str:
+        with self._client() as client, open(path, "rb") as f:
+            uploaded = client.post(
+                "/files",
+                data={"purpose": "batch"},
+                files={"file": (os.path.basename(path), f, "application/jsonl")},
+            )
+            uploaded.raise_for_status()
+            batch = client.post("/batches", json={
+                "input_file_id": uploaded.json()["id"],
+                "endpoint": "/v1/chat/completions",
+                "completion_window": "24h",
+                "metadata": {"submission_id": submission_id},
+            })
+            batch.raise_for_status()
+            return batch.json()["id"]
+
+    def find(self, submission_id: str) -> Optional[str]:
+        with self._client() as client:
+            params: Dict[str, Any] = {"limit": 100}
+            while True:
+                response = client.get("/batches", params=params)
+                response.raise_for_status()
+                page = response.json()
+                for batch in page["data"]:
+                    if (batch.get("metadata") or {}).get("submission_id") == submission_id:
+                        return batch["id"]
+                if not page.get("has_more") or not page["data"]:
+                    return None
+                params["after"] = page["data"][-1]["id"]
+
+    def poll(self, batch_id: str) -> Dict[str, Any]:
+        with self._client() as client:
+            response = client.get(f"/batches/{batch_id}")
+            response.raise_for_status()
+            batch = response.json()
+            if batch["status"] in OPENAI_PENDING_STATUSES:
+                return {"status": "in_progress"}
+
+            results: List[Dict[str, Any]] = []
+            # Successful requests are in the output file, failed ones in the error file
+            for key in ("output_file_id", "error_file_id"):
+                if batch.get(key):
+                    content = client.get(f"/files/{batch[key]}/content")
+                    content.raise_for_status()
+                    results.extend(json.loads(line) for line in content.text.splitlines() if line.strip())
+
+        if batch["status"] == "completed":
+            return {"status": "completed", "results": results, "error": None}
+        errors = [error.get("message", "") for error in (batch.get("errors") or {}).get("data") or []]
+        error = f"Batch {batch['status']}" + (f": {'; '.join(errors)}" if errors else "")
+        return {"status": "failed", "results": results, "error": error}
+
+    def forget(self, batch_id: str) -> None:
+        # Nothing is kept locally; the API keeps its files for its own retention period
+        pass
+
+
+class LocalBatchBackend:
+    """
+    Offline stand-in for testing: a batch finishes BATCH_LOCAL_DELAY_SECONDS
+    after submission, with a synthetic assessment for every request. The
+    assessment is derived from a hash of the request, so reruns are
+    deterministic, and token usage is counted from the messages as the API
+    would report it.
+    """
+
+    name = "local"
+
+    @staticmethod
+    def _path(batch_id: str) -> str:
+        return os.path.join(get("BATCH_DIR"), "local", f"{batch_id}.jsonl")
+
+    def submit(self, path: str, submission_id: str) -> str:
+        batch_id = f"local_batch_{submission_id}"
+        os.makedirs(os.path.dirname(self._path(batch_id)), exist_ok=True)
+        shutil.copyfile(path, self._path(batch_id))
+        return batch_id
+
+    def find(self, submission_id: str) -> Optional[str]:
+        batch_id = f"local_batch_{submission_id}"
+        return batch_id if os.path.exists(self._path(batch_id)) else None
+
+    def forget(self, batch_id: str) -> None:
+        try:
+            os.remove(self._path(batch_id))
+        except FileNotFoundError:
+            pass
+
+    def poll(self, batch_id: str) -> Dict[str, Any]:
+        path = self._path(batch_id)
+        if not os.path.exists(path):
+            return {"status": "failed", "results": [], "error": f"Unknown batch {batch_id}"}
+        if time.time() - os.path.getmtime(path) < get("BATCH_LOCAL_DELAY_SECONDS"):
+            return {"status": "in_progress"}
+        with open(path, encoding="utf-8") as f:
+            requests = [json.loads(line) for line in f if line.strip()]
+        return {
+            "status": "completed",
+            "results": [
+                {
+                    "id": f"batch_req_{i}",
+                    "custom_id": request["custom_id"],
+                    "response": {"status_code": 200, "body": self._completion(request["body"])},
+                    "error": None,
+                }
+                for i, request in enumerate(requests)
+            ],
+            "error": None,
+        }
+
+    @staticmethod
+    def _completion(body: Dict[str, Any]) -> Dict[str, Any]:
+        prompt = "\n".join(str(message.get("content") or "") for message in body["messages"])
+        seed = int(hashlib.sha256(prompt.encode("utf-8")).hexdigest(), 16)
+        score = 60 + seed % 41
+        status = "compliant" if score >= 85 else "review" if score >= 70 else "issues"
+        arguments = json.dumps({
+            "compliance_score": score,
+            "compliance_status": status,
+            "compliance_message": f"Local batch assessment: {status}.",
+            "summary_of_findings": "Synthetic assessment from the local batch backend.",
+            "section_breakdown": "Each section was scored by the local batch backend.",
+            "specific_issues": "None identified by the local batch backend.",
+            "recommendations": "Run this scan against the OpenAI backend for a real assessment.",
+            "section_scores": {name: 60 + (seed >> (8 * i)) % 41 for i, name in enumerate(SECTION_NAMES)},
+        })
+        prompt_tokens = count_tokens(prompt, body["model"])
+        completion_tokens = count_tokens(arguments, body["model"])
+        return {
+            "id": f"chatcmpl-local-{seed % 10 ** 12}",
+            "object": "chat.completion",
+            "created": int(time.time()),
+            "model": body["model"],
+            "choices": [{
+                "index": 0,
+                "message": {
+                    "role": "assistant",
+                    "content": None,
+                    "tool_calls": [{
+                        "id": f"call_{seed % 10 ** 8}",
+                        "type": "function",
+                        "function": {"name": body["tool_choice"]["function"]["name"], "arguments": arguments},
+                    }],
+                },
+                "finish_reason": "stop",
+            }],
+            "usage": {
+                "prompt_tokens": prompt_tokens,
+                "completion_tokens": completion_tokens,
+                "total_tokens": prompt_tokens + completion_tokens,
+            },
+        }
+
+
+BATCH_BACKENDS = {backend.name: backend for backend in (OpenAIBatchBackend, LocalBatchBackend)}
+
+
+def get_backend(name: str):
+    """
+    The batch backend called ``name``.
+
+    Raises:
+        ValueError: If no backend has that name
+    """
+    if name not in BATCH_BACKENDS:
+        raise ValueError(f"Unknown batch backend: {name}")
+    return BATCH_BACKENDS[name]()
@@ -0,0 +1,436 @@
+import json
+import os
+import uuid
+from datetime import datetime, timedelta, timezone
+from typing import Any, Dict, List, Optional
+
+from sqlalchemy import func
+from sqlalchemy.orm import Session
+
+from app.core import metrics
+from app.core.config import get
+from app.core.logging import log_info, log_warning, log_exception
+from app.db.database import SessionLocal
+from app.models.batch_scan import BatchScanItem
+from app.models.token_usage import TokenUsageDaily
+from app.services.batch_scan.batch_backends import get_backend
+from app.services.compliance_scan.compliance_scanner import ComplianceScanAgent
+from app.services.compliance_scan.usage import estimate_cost
+from app.services.near_duplicates import NearDuplicateService
+from app.services.scan_history import ScanHistoryService
+from app.services.token_usage import TokenUsageService
+
+# Token usage and accounting label of batch scans
+BATCH_DOCUMENT_TYPE = "batch"
+
+
+class BatchScanService:
+    """
+    Deferred compliance scans, submitted in batches instead of one live call each.
+
+    A scan is enqueued with the exact chat completions request a live scan
+    would send. Pending items are written to a batch file in the OpenAI Batch
+    API format and submitted through a backend (see batch_backends); submitted
+    batches are polled, and each result is parsed, stored in the scan history
+    and accounted for at the batch price, as a live scan would be. Batch work
+    never takes a slot in the LLM scheduler. These methods do blocking I/O;
+    call them from the threadpool.
+    """
+
+    @staticmethod
+    def enqueue(
+        db: Session,
+        formatted_data: Dict[str, Any],
+        org_name: Optional[str],
+        usage_account: str,
+        org_profile_id: Optional[int],
+        user_id: Optional[int],
+        estimated_tokens: int = 0,
+    ) -> BatchScanItem:
+        """
+        Queue a scan of formatted scan input for the next batch, charged to a
+        usage account. Its estimated tokens count against the account's budget
+        until the result is written back (see queued_tokens).
+        """
+        agent = ComplianceScanAgent()
+        item = BatchScanItem(
+            item_id=f"batch_{uuid.uuid4().hex}",
+            status="pending",
+            org_name=org_name,
+            usage_account=usage_account,
+            org_profile_id=org_profile_id,
+            user_id=user_id,
+            document_hash=ScanHistoryService.hash_document(formatted_data["compliance_data"].encode("utf-8")),
+            model=str(agent.llm_model),
+            prompt_version=agent.prompt_version,
+            compliance_data=formatted_data,
+            request=agent.batch_request(formatted_data),
+            estimated_tokens=estimated_tokens,
+        )
+        db.add(item)
+        db.commit()
+        db.refresh(item)
+        metrics.increment("batch_items", status="pending")
+        return item
+
+    @staticmethod
+    def queued_tokens(db: Session, usage_account: str) -> int:
+        """Estimated tokens of an account's batch scans that are queued or in a batch, not yet recorded."""
+        return int(
+            db.query(func.coalesce(func.sum(BatchScanItem.estimated_tokens), 0))
+            .filter(
+                BatchScanItem.usage_account == usage_account,
+                BatchScanItem.status.in_(("pending", "submitting", "submitted")),
+            )
+            .scalar()
+        )
+
+    @staticmethod
+    def get_item(db: Session, item_id: str) -> Optional[BatchScanItem]:
+        return db.query(BatchScanItem).filter(BatchScanItem.item_id == item_id).first()
+
+    @staticmethod
+    def batch_file_path(submission_id: str) -> str:
+        return os.path.join(get("BATCH_DIR"), f"{submission_id}.jsonl")
+
+    @staticmethod
+    def write_batch_file(items: List[BatchScanItem], submission_id: str) -> str:
+        """Write items as a submission's batch file, one request per line; returns its path."""
+        os.makedirs(get("BATCH_DIR"), exist_ok=True)
+        path = BatchScanService.batch_file_path(submission_id)
+        with open(path, "w", encoding="utf-8") as f:
+            for item in items:
+                f.write(json.dumps({
+                    "custom_id": item.item_id,
+                    "method": "POST",
+                    "url": "/v1/chat/completions",
+                    "body": item.request,
+                }) + "\n")
+        return path
+
+    @staticmethod
+    def submit_pending(db: Session, backend) -> int:
+        """
+        Submit the oldest pending items, at most BATCH_MAX_ITEMS, as one batch; returns how many.
+
+        The items are first claimed as "submitting" under a new submission id,
+        in one conditional update, so no other poller (on any host) submits
+        them too. If the backend call fails, or the process dies before the
+        batch id is stored, the submission is settled with the backend (see
+        _settle) rather than sent again.
+        """
+        ids = [
+            item_id for (item_id,) in db.query(BatchScanItem.id)
+            .filter(BatchScanItem.status == "pending")
+            .order_by(BatchScanItem.created_at, BatchScanItem.id)
+            .limit(get("BATCH_MAX_ITEMS"))
+            .all()
+        ]
+        if not ids:
+            return 0
+        submission_id = uuid.uuid4().hex
+        claimed = (
+            db.query(BatchScanItem)
+            .filter(BatchScanItem.id.in_(ids), BatchScanItem.status == "pending")
+            .update({
+                BatchScanItem.status: "submitting",
+                BatchScanItem.backend: backend.name,
+                BatchScanItem.submission_id: submission_id,
+                BatchScanItem.submit_attempts: BatchScanItem.submit_attempts + 1,
+                BatchScanItem.submitted_at: datetime.now(timezone.utc),
+            }, synchronize_session=False)
+        )
+        db.commit()
+        if not claimed:
+            return 0
+
+        items = (
+            db.query(BatchScanItem)
+            .filter(BatchScanItem.submission_id == submission_id)
+            .order_by(BatchScanItem.created_at, BatchScanItem.id)
+            .all()
+        )
+        path = BatchScanService.write_batch_file(items, submission_id)
+        try:
+            batch_id = backend.submit(path, submission_id)
+        except Exception as e:
+            log_exception(e, f"BatchScanService.submit_pending({submission_id})")
+            try:
+                # The backend may have accepted the batch before the call failed
+                BatchScanService._settle(db, backend, submission_id, f"Submission failed: {str(e)}")
+            except Exception as settle_error:
+                # Left as submitting; reconcile_stale settles it later
+                log_exception(settle_error, f"BatchScanService._settle({submission_id})")
+            return 0
+        finally:
+            _remove(path)
+        return BatchScanService._mark_submitted(db, backend, submission_id, batch_id)
+
+    @staticmethod
+    def _mark_submitted(db: Session, backend, submission_id: str, batch_id: str) -> int:
+        items = (
+            db.query(BatchScanItem)
+            .filter(BatchScanItem.submission_id == submission_id, BatchScanItem.status == "submitting")
+            .all()
+        )
+        submitted_at = datetime.now(timezone.utc)
+        for item in items:
+            item.status = "submitted"
+            item.batch_id = batch_id
+            item.submitted_at = submitted_at
+            item.error = None
+        db.commit()
+        metrics.increment("batch_items", len(items), status="submitted")
+        log_info(f"Submitted batch {batch_id} with {len(items)} scans to the {backend.name} backend")
+        return len(items)
+
+    @staticmethod
+    def _settle(db: Session, backend, submission_id: str, error: str) -> None:
+        """
+        Settle a submission that may or may not have reached the backend: its
+        items become submitted if the backend has the batch, and otherwise go
+        back to pending, or fail once they have used BATCH_MAX_SUBMIT_ATTEMPTS.
+        """
+        batch_id = backend.find(submission_id)
+        if batch_id is not None:
+            BatchScanService._mark_submitted(db, backend, submission_id, batch_id)
+            return
+        items = (
+            db.query(BatchScanItem)
+            .filter(BatchScanItem.submission_id == submission_id, BatchScanItem.status == "submitting")
+            .all()
+        )
+        failed = 0
+        for item in items:
+            item.error = error[:1000]
+            item.submission_id = None
+            if item.submit_attempts >= get("BATCH_MAX_SUBMIT_ATTEMPTS"):
+                item.status = "failed"
+                item.completed_at = datetime.now(timezone.utc)
+                failed += 1
+            else:
+                item.status = "pending"
+        db.commit()
+        if failed:
+            metrics.increment("batch_items", failed, status="failed")
+        log_warning(f"Submission {submission_id} not found on the {backend.name} backend: "
+                    f"{len(items) - failed} scans back to pending, {failed} failed")
+
+    @staticmethod
+    def reconcile_stale(db: Session, backend) -> int:
+        """
+        Settle this backend's submissions left unsettled for BATCH_SUBMIT_STALE_SECONDS,
+        e.g. by a crash between the backend call and the commit; returns how many.
+        """
+        cutoff = datetime.now(timezone.utc) - timedelta(seconds=get("BATCH_SUBMIT_STALE_SECONDS"))
+        submission_ids = [
+            submission_id for (submission_id,) in db.query(BatchScanItem.submission_id)
+            .filter(
+                BatchScanItem.status == "submitting",
+                BatchScanItem.backend == backend.name,
+                BatchScanItem.submitted_at < cutoff,
+            )
+            .distinct()
+            .all()
+        ]
+        settled = 0
+        for submission_id in submission_ids:
+            try:
+                BatchScanService._settle(db, backend, submission_id, "Submission interrupted")
+            except Exception as e:
+                # Try again next cycle
+                log_exception(e, f"BatchScanService.reconcile_stale({submission_id})")
+                continue
+            _remove(BatchScanService.batch_file_path(submission_id))
+            settled += 1
+        return settled
+
+    @staticmethod
+    def collect(db: Session, backend) -> Dict[str, int]:
+        """Poll this backend's submitted batches and write back the finished ones."""
+        counts = {"completed": 0, "failed": 0}
+        batch_ids = [
+            batch_id for (batch_id,) in db.query(BatchScanItem.batch_id)
+            .filter(BatchScanItem.status == "submitted", BatchScanItem.backend == backend.name)
+            .distinct()
+            .all()
+        ]
+        for batch_id in batch_ids:
+            try:
+                batch = backend.poll(batch_id)
+            except Exception as e:
+                # Try again next cycle
+                log_exception(e, f"BatchScanService.collect({batch_id})")
+                continue
+            if batch["status"] == "in_progress":
+                continue
+            for status, count in BatchScanService._write_back(db, batch_id, batch).items():
+                counts[status] += count
+            backend.forget(batch_id)
+        return counts
+
+    @staticmethod
+    def _write_back(db: Session, batch_id: str, batch: Dict[str, Any]) -> Dict[str, int]:
+        counts = {"completed": 0, "failed": 0}
+        results = {result["custom_id"]: result for result in batch["results"]}
+        items = (
+            db.query(BatchScanItem)
+            .filter(BatchScanItem.batch_id == batch_id, BatchScanItem.status == "submitted")
+            .all()
+        )
+        for item in items:
+            result = results.get(item.item_id)
+            response = (result or {}).get("response") or {}
+            if result is None:
+                error = batch["error"] or "No result in the batch output"
+            elif response.get("status_code") != 200:
+                error = json.dumps((result.get("error") or response.get("body") or {}))[:1000]
+            else:
+                error = BatchScanService._complete(db, item, response["body"])
+            item.completed_at = datetime.now(timezone.utc)
+            if error is None:
+                item.status = "completed"
+            else:
+                item.status = "failed"
+                item.error = error
+            db.commit()
+            counts[item.status] += 1
+            metrics.increment("batch_items", status=item.status)
+        log_info(f"Batch {batch_id} written back: {counts}")
+        return counts
+
+    @staticmethod
+    def _complete(db: Session, item: BatchScanItem, completion: Dict[str, Any]) -> Optional[str]:
+        """Store one item's scan result; returns the error if the response cannot be used."""
+        agent = ComplianceScanAgent()
+        try:
+            result = agent.finish_batch_response(completion, item.compliance_data)
+        except Exception as e:
+            log_warning(f"Batch scan {item.item_id} failed: {str(e)}")
+            return str(e)
+
+        usage = agent.last_usage
+        cost = estimate_cost(usage) * get("BATCH_PRICE_FACTOR")
+        turnaround_ms = (datetime.now(timezone.utc) - _aware(item.submitted_at)).total_seconds() * 1000
+        signature = NearDuplicateService.signature(item.compliance_data["compliance_data"])
+        stored = ScanHistoryService.record_scan(
+            db,
+            result,
+            document_hash=item.document_hash,
+            org_name=item.org_name,
+            model=item.model,
+            prompt_version=item.prompt_version,
+            context_hash=NearDuplicateService.context_hash(item.compliance_data),
+            timings={"batch_turnaround_ms": turnaround_ms},
+            minhash=signature,
+            org_profile_id=item.org_profile_id,
+            user_id=item.user_id,
+        )
+        NearDuplicateService.remember(stored, signature)
+        # The batch took hours, not model latency; don't count it against the live latency totals
+        TokenUsageService.record_call(db, item.usage_account, BATCH_DOCUMENT_TYPE, item.model, usage, cost, latency_ms=0.0)
+        metrics.observe("batch_turnaround_s", turnaround_ms / 1000)
+        metrics.increment("batch_cost_usd", cost)
+
+        item.document_id = result.document.id
+        item.usage = usage
+        item.cost_usd = cost
+        return None
+
+    @staticmethod
+    def run_cycle(backend_name: str) -> Dict[str, int]:
+        """Settle interrupted submissions, collect finished batches, then submit pending items, with one backend."""
+        backend = get_backend(backend_name)
+        db = SessionLocal()
+        try:
+            reconciled = BatchScanService.reconcile_stale(db, backend)
+            counts = BatchScanService.collect(db, backend)
+            counts["reconciled"] = reconciled
+            counts["submitted"] = BatchScanService.submit_pending(db, backend)
+            return counts
+        finally:
+            db.close()
+
+    @staticmethod
+    def report(db: Session, since: datetime) -> Dict[str, Any]:
+        """
+        Batch against interactive scans since a time: items by status,
+        throughput per dollar, batch turnaround, and this worker's live model
+        latency and queue wait, with the batch cycles that ran beside them.
+        """
+        by_status = dict(
+            db.query(BatchScanItem.status, func.count(BatchScanItem.id))
+            .filter(BatchScanItem.created_at >= since)
+            .group_by(BatchScanItem.status)
+            .all()
+        )
+        completed = (
+            db.query(BatchScanItem)
+            .filter(BatchScanItem.status == "completed", BatchScanItem.completed_at >= since)
+            .all()
+        )
+        batch_cost = sum(item.cost_usd or 0.0 for item in completed)
+        batch_tokens = sum((item.usage or {}).get("total_tokens", 0) for item in completed)
+        turnarounds = [
+            (_aware(item.completed_at) - _aware(item.submitted_at)).total_seconds()
+            for item in completed if item.submitted_at and item.completed_at
+        ]
+
+        # Daily rollups include the batch calls; take them out for the interactive numbers
+        calls, tokens, cost, llm_ms = (
+            db.query(
+                func.coalesce(func.sum(TokenUsageDaily.calls), 0),
+                func.coalesce(func.sum(TokenUsageDaily.total_tokens), 0),
+                func.coalesce(func.sum(TokenUsageDaily.cost_usd), 0.0),
+                func.coalesce(func.sum(TokenUsageDaily.llm_ms), 0.0),
+            )
+            .filter(TokenUsageDaily.day >= since.date())
+            .one()
+        )
+        interactive_calls = max(int(calls) - len(completed), 0)
+        interactive_tokens = max(int(tokens) - batch_tokens, 0)
+        interactive_cost = max(float(cost) - batch_cost, 0.0)
+
+        snapshot = metrics.snapshot()
+        summaries, counters = snapshot["summaries"], snapshot["counters"]
+        return {
+            "since": since.isoformat(),
+            "items": {status: by_status.get(status, 0) for status in ("pending", "submitting", "submitted", "completed", "failed")},
+            "batch": {
+                **_throughput(len(completed), batch_tokens, batch_cost),
+                "avg_turnaround_s": round(sum(turnarounds) / len(turnarounds), 1) if turnarounds else None,
+                "max_turnaround_s": round(max(turnarounds), 1) if turnarounds else None,
+            },
+            "interactive": {
+                **_throughput(interactive_calls, interactive_tokens, interactive_cost),
+                "avg_llm_ms": round(float(llm_ms) / interactive_calls, 1) if interactive_calls else None,
+            },
+            "worker": {
+                "llm_latency_ms": {k: v for k, v in summaries.items() if k.startswith("llm_latency_ms")},
+                "llm_queue_wait_ms": {k: v for k, v in summaries.items() if k.startswith("llm_queue_wait_ms")},
+                "batch_cycle_ms": summaries.get("batch_cycle_ms"),
+                "batch_cycles_deferred": counters.get("batch_cycles_deferred", 0),
+            },
+        }
+
+
+def _remove(path: str) -> None:
+    try:
+        os.remove(path)
+    except FileNotFoundError:
+        pass
+
+
+def _aware(value: datetime) -> datetime:
+    # SQLite hands timezone-aware columns back naive
+    return value if value.tzinfo is not None else value.replace(tzinfo=timezone.utc)
+
+
+def _throughput(scans: int, tokens: int, cost: float) -> Dict[str, Any]:
+    return {
+        "scans": scans,
+        "total_tokens": tokens,
+        "cost_usd": round(cost, 6),
+        "scans_per_usd": round(scans / cost, 2) if cost else None,
+        "tokens_per_usd": round(tokens / cost) if cost else None,
+    }
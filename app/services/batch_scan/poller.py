@@ -0,0 +1,99 @@
+"""
+Background submission and collection of batch scans.
+
+Every BATCH_POLL_INTERVAL_SECONDS one worker, the one holding a file lock in
+BATCH_DIR, runs a batch cycle: collect finished batches, then submit pending
+scans. Cycles only run in the BATCH_OFF_PEAK_HOURS window (local hours, e.g.
+"1-6" or "22-5"; empty for any time), and are deferred while live scans wait
+for a model slot, so batch writes never compete with interactive traffic.
+"""
+import asyncio
+import fcntl
+import os
+import time
+from datetime import datetime
+from typing import Any, Dict, Optional
+
+from starlette.concurrency import run_in_threadpool
+
+from app.core import metrics
+from app.core.config import get
+from app.core.logging import log_info, log_warning
+from app.services.batch_scan.batch_scan_service import BatchScanService
+
+
+def in_off_peak(now: Optional[datetime] = None) -> bool:
+    """Whether the current local hour is in the BATCH_OFF_PEAK_HOURS window."""
+    window = get("BATCH_OFF_PEAK_HOURS").strip()
+    if not window:
+        return True
+    start, end = (int(hour) for hour in window.split("-"))
+    hour = (now or datetime.now()).hour
+    if start <= end:
+        return start <= hour < end
+    # The window wraps around midnight
+    return hour >= start or hour < end
+
+
+class BatchPoller:
+    """Runs batch cycles on one worker's event loop."""
+
+    def __init__(self) -> None:
+        self._task: Optional[asyncio.Task] = None
+        self._lock_file = None
+
+    def _acquire_leadership(self) -> bool:
+        # Only one worker per host polls; the lock is released when the process exits
+        os.makedirs(get("BATCH_DIR"), exist_ok=True)
+        lock_file = open(os.path.join(get("BATCH_DIR"), "poller.lock"), "w")
+        try:
+            fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            lock_file.close()
+            return False
+        self._lock_file = lock_file
+        return True
+
+    def start(self) -> None:
+        """Start polling on the running event loop, if enabled and no other worker polls."""
+        if self._task is not None or not get("BATCH_POLLER_ENABLED"):
+            return
+        if not self._acquire_leadership():
+            return
+        log_info(f"Batch poller started with the {get('BATCH_BACKEND')} backend")
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+        if self._lock_file is not None:
+            self._lock_file.close()
+            self._lock_file = None
+
+    async def _run(self) -> None:
+        from app.services.compliance_scan.scheduler import llm_scheduler
+
+        while True:
+            await asyncio.sleep(get("BATCH_POLL_INTERVAL_SECONDS"))
+            if not in_off_peak():
+                continue
+            if sum(llm_scheduler.stats()["queued"].values()):
+                metrics.increment("batch_cycles_deferred")
+                continue
+            try:
+                await self.run_cycle()
+            except Exception as e:
+                log_warning(f"Batch cycle failed: {str(e)}")
+
+    @staticmethod
+    async def run_cycle() -> Dict[str, Any]:
+        """Run one batch cycle now, whatever the time."""
+        started = time.perf_counter()
+        counts = await run_in_threadpool(BatchScanService.run_cycle, get("BATCH_BACKEND"))
+        metrics.observe("batch_cycle_ms", (time.perf_counter() - started) * 1000)
+        return counts
+
+
+batch_poller = BatchPoller()
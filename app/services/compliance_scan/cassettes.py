@@ -0,0 +1,164 @@
+"""
+Record and replay of model calls.
+
+With LLM_CASSETTE_MODE=record every chat completion request made by the
+compliance scanner (scans and repair follow-ups) is written with its response
+and latency to a cassette in LLM_CASSETTE_DIR. With LLM_CASSETTE_MODE=replay
+the same requests are answered from the cassettes without the OpenAI API,
+after the recorded latency if LLM_CASSETTE_REPLAY_LATENCY is set, so the whole
+pipeline can be profiled and benchmarked deterministically on an offline
+machine.
+
+A cassette is keyed by the SHA-256 of the exact request body (model,
+parameters, messages and the structured-output tool schema), so any change to
+the prompt, document or model is a different cassette. Each one is a small
+gzipped JSON file holding the request, the response message with its token
+usage and the latency. A request with no cassette fails in replay mode, which
+the scanner handles like any other failed model call.
+"""
+import asyncio
+import gzip
+import hashlib
+import json
+import os
+import tempfile
+import time
+from datetime import datetime
+from typing import Any, Dict, List, Optional, Tuple
+
+from langchain_core.messages import BaseMessage, message_to_dict, messages_from_dict
+from langchain_core.outputs import ChatGeneration, ChatResult
+from langchain_openai import ChatOpenAI
+from starlette.concurrency import run_in_threadpool
+
+from app.core import metrics
+from app.core.logging import log_info
+
+CASSETTE_MODES = ("off", "record", "replay")
+
+
+class CassetteMissError(LookupError):
+    """Replay mode found no cassette for a request."""
+
+
+def cassette_path(cassette_dir: str, key: str) -> str:
+    # Two-character fan-out keeps directories small for large recordings
+    return os.path.join(cassette_dir, key[:2], f"{key}.json.gz")
+
+
+def load_cassette(cassette_dir: str, key: str) -> Optional[Dict[str, Any]]:
+    try:
+        with gzip.open(cassette_path(cassette_dir, key), "rt", encoding="utf-8") as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return None
+
+
+def save_cassette(cassette_dir: str, key: str, cassette: Dict[str, Any]) -> None:
+    """Write a cassette atomically, so a concurrent replay never reads half a file."""
+    path = cassette_path(cassette_dir, key)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix=".tmp")
+    try:
+        with os.fdopen(fd, "wb") as raw, gzip.open(raw, "wt", encoding="utf-8") as f:
+            json.dump(cassette, f, ensure_ascii=False, separators=(",", ":"))
+        os.replace(tmp_path, path)
+    except BaseException:
+        os.unlink(tmp_path)
+        raise
+
+
+def _to_cassette(body: Dict[str, Any], result: ChatResult, latency_ms: float) -> Dict[str, Any]:
+    return {
+        "recorded_at": datetime.now().isoformat(),
+        "latency_ms": round(latency_ms, 1),
+        "request": body,
+        "generations": [
+            {"message": message_to_dict(generation.message), "generation_info": generation.generation_info}
+            for generation in result.generations
+        ],
+        "llm_output": result.llm_output,
+    }
+
+
+def _from_cassette(cassette: Dict[str, Any]) -> ChatResult:
+    messages = messages_from_dict([generation["message"] for generation in cassette["generations"]])
+    return ChatResult(
+        generations=[
+            ChatGeneration(message=message, generation_info=generation["generation_info"])
+            for message, generation in zip(messages, cassette["generations"])
+        ],
+        llm_output=cassette["llm_output"],
+    )
+
+
+class CassetteChatOpenAI(ChatOpenAI):
+    """ChatOpenAI that records its completions to, or replays them from, cassettes."""
+
+    cassette_mode: str = "record"
+    cassette_dir: str = "cassettes"
+    replay_latency: bool = False
+
+    def _request_body(
+        self, messages: List[BaseMessage], stop: Optional[List[str]], kwargs: Dict[str, Any]
+    ) -> Tuple[str, Dict[str, Any]]:
+        """The request body as sent to the API, and its cassette key."""
+        message_dicts, params = self._create_message_dicts(messages, stop)
+        body = {**params, **kwargs, "messages": message_dicts}
+        encoded = json.dumps(body, sort_keys=True, ensure_ascii=False, default=str)
+        return hashlib.sha256(encoded.encode("utf-8")).hexdigest(), json.loads(encoded)
+
+    def _replay(self, key: str, cassette: Optional[Dict[str, Any]]) -> ChatResult:
+        if cassette is None:
+            metrics.increment("llm_cassette_misses")
+            raise CassetteMissError(f"No cassette {key[:16]} in {self.cassette_dir}; record it first")
+        metrics.increment("llm_cassette_replays")
+        return _from_cassette(cassette)
+
+    def _generate(self, messages, stop=None, run_manager=None, **kwargs: Any) -> ChatResult:
+        key, body = self._request_body(messages, stop, kwargs)
+        if self.cassette_mode == "replay":
+            cassette = load_cassette(self.cassette_dir, key)
+            if cassette is not None and self.replay_latency:
+                time.sleep(cassette["latency_ms"] / 1000)
+            return self._replay(key, cassette)
+
+        started = time.perf_counter()
+        result = super()._generate(messages, stop=stop, run_manager=run_manager, **kwargs)
+        save_cassette(self.cassette_dir, key, _to_cassette(body, result, (time.perf_counter() - started) * 1000))
+        metrics.increment("llm_cassette_recordings")
+        return result
+
+    async def _agenerate(self, messages, stop=None, run_manager=None, **kwargs: Any) -> ChatResult:
+        key, body = self._request_body(messages, stop, kwargs)
+        if self.cassette_mode == "replay":
+            cassette = await run_in_threadpool(load_cassette, self.cassette_dir, key)
+            if cassette is not None and self.replay_latency:
+                await asyncio.sleep(cassette["latency_ms"] / 1000)
+            return self._replay(key, cassette)
+
+        started = time.perf_counter()
+        result = await super()._agenerate(messages, stop=stop, run_manager=run_manager, **kwargs)
+        cassette = _to_cassette(body, result, (time.perf_counter() - started) * 1000)
+        await run_in_threadpool(save_cassette, self.cassette_dir, key, cassette)
+        metrics.increment("llm_cassette_recordings")
+        return result
+
+
+def cassette_llm(api_key: str, model: str, mode: str, cassette_dir: str, replay_latency: bool) -> CassetteChatOpenAI:
+    """
+    The chat model client for record or replay mode.
+
+    Raises:
+        ValueError: If the mode is not "record" or "replay"
+    """
+    if mode not in CASSETTE_MODES[1:]:
+        raise ValueError(f"Unknown LLM cassette mode: {mode}")
+    log_info(f"LLM cassettes: {mode} mode, directory {cassette_dir}")
+    return CassetteChatOpenAI(
+        api_key=api_key,
+        model=model,
+        cassette_mode=mode,
+        cassette_dir=cassette_dir,
+        replay_latency=replay_latency,
+    )
@@ -1,9 +1,84 @@
-from langchain_openai import ChatOpenAI
+import asyncio
+from functools import lru_cache
+import hashlib
+import time
+from typing import Tuple
+from langchain_community.adapters.openai import convert_dict_to_message, convert_message_to_dict
+from langchain_core.output_parsers.openai_tools import PydanticToolsParser
+
 from app.core import config
 from app.services.compliance_scan.llm_models import (ComplianceScanAgentPrompts, compliance_scan as ComplianceScanSchema)
 import json
 from app.schemas.compliance_scan import ComplianceScanResponse, ScannedDocument, DetailedComplianceReport
-from app.core.logging import log_info, log_error
+from app.core.logging import log_info, log_error, log_warning
+from app.core import metrics, tracing
+from app.core.health import llm_circuit
+from app.services.compliance_scan.regulations import get_regulation_index
+from app.services.compliance_scan.repair import (can_reask, coerce_fields, merge_repair, record_repair,
+                                                 repair_inputs, repair_schema, salvage_fields)
+from app.services.compliance_scan.usage import extract_usage, record_cancelled_call, record_usage
+from app.services.org_profiles import OrgProfileService
+from app.utils.tokens import count_tokens
+
+
+@lru_cache(maxsize=4)
+def get_llm(api_key: str, model: str):
+    """
+    Build (once per worker) the chat model client for a key/model pair.
+
+    Every scan and repair call goes through this client, so with
+    LLM_CASSETTE_MODE=record or replay it records or replays all of them (see
+    cassettes).
+    """
+    cassette_mode = config.get("LLM_CASSETTE_MODE")
+    if cassette_mode != "off":
+        from app.services.compliance_scan.cassettes import cassette_llm
+
+        return cassette_llm(api_key, model, cassette_mode, config.get("LLM_CASSETTE_DIR"),
+                            config.get("LLM_CASSETTE_REPLAY_LATENCY"))
+
+    # langchain_openai pulls in openai, httpx and tiktoken; under gunicorn the master preloads them
+    # (startup.preload_modules), otherwise they are imported on first use
+    from langchain_openai import ChatOpenAI
+
+    return ChatOpenAI(api_key=api_key, model=model)  # experiment with temperature and top-p
+
+
+@lru_cache(maxsize=8)
+def get_compliance_scan_chain(api_key: str, model: str, layout: str = "prefix_cached"):
+    """
+    Build (once per worker) the prompt | structured-output chain used for scans.
+
+    The chain returns a dict with the raw model message (for token usage), the
+    parsed result and any parsing error.
+    """
+    llm = get_llm(api_key, model)
+    prompt = ComplianceScanAgentPrompts.for_layout(layout)
+    return prompt | llm.with_structured_output(schema=ComplianceScanSchema, include_raw=True)
+
+
+@lru_cache(maxsize=4)
+def get_scan_tool_kwargs(api_key: str, model: str):
+    """The structured-output tool parameters the scan chain adds to every request."""
+    return get_llm(api_key, model).bind_tools([ComplianceScanSchema], tool_choice=True).kwargs
+
+
+@lru_cache(maxsize=4)
+def get_batch_request_params(api_key: str, model: str):
+    """The request parameters a live scan sends besides its messages: the model's settings and the scan tool."""
+    llm = get_llm(api_key, model)
+    params = {"model": llm.model_name, "n": llm.n, "temperature": llm.temperature, **llm.model_kwargs}
+    if llm.max_tokens is not None:
+        params["max_tokens"] = llm.max_tokens
+    return {**params, **get_scan_tool_kwargs(api_key, model)}
+
+
+@lru_cache(maxsize=64)
+def get_repair_chain(api_key: str, model: str, fields: Tuple[str, ...]):
+    """Build (once per worker) the follow-up chain asking for some fields of a scan response again."""
+    llm = get_llm(api_key, model)
+    prompt = ComplianceScanAgentPrompts.compliance_scan_repair
+    return prompt | llm.with_structured_output(schema=repair_schema(fields), include_raw=True)
 
 
 class ComplianceScanAgent():
@@ -11,106 +86,380 @@ class ComplianceScanAgent():
         self.open_ai_key = config.get("OPENAI_KEY")
         self.llm_model = config.get("OPENAI_LLM_MODEL")
         self.llm_model_temperature = config.get("AGENT_TEMPERATURE")
+        self.prompt_layout = config.get("PROMPT_LAYOUT")
+        self.prompt_version = f"{ComplianceScanAgentPrompts.prompt_version}/{self.prompt_layout}"
+        # Set when the last scan returned the canned fallback instead of a model assessment
+        self.used_fallback = False
+        # Token usage, model latency and estimated cost of the last call
+        self.last_usage = None
+        self.last_llm_ms = None
+        self.last_cost = None
 
-    def generate_compliance_scan(self, compliance_data):
-        llm = ChatOpenAI(api_key=str(self.open_ai_key), model=str(self.llm_model))  # experiment with temperature and top-p
-        prompt = ComplianceScanAgentPrompts.compliance_scan_agent
-        compliance_scan_agent = prompt | llm.with_structured_output(schema=ComplianceScanSchema)
+    def estimate_prompt_tokens(self, compliance_data):
+        """Estimate the prompt tokens a scan will use, from its document text, before calling the model."""
+        return count_tokens(compliance_data.get("compliance_data") or "", str(self.llm_model))
 
-        # Format user context for the prompt
-        user_context_str = "No additional context provided."
-        if "user_context" in compliance_data and compliance_data["user_context"]:
-            try:
-                # If user_context is a string, try to parse it as JSON
-                if isinstance(compliance_data["user_context"], str):
-                    user_context_str = compliance_data["user_context"]
-                else:
-                    # If it's already a dict, convert to a formatted string
-                    user_context_str = json.dumps(compliance_data["user_context"], indent=2)
-            except Exception as e:
-                user_context_str = f"Error processing user context: {str(e)}"
-
-        # Use default FCC compliance questions if none provided
-        questions = compliance_data.get("questions", [])
-        if not questions:
-            questions = [
-                "Does this document comply with FCC public file requirements?",
-                "Are there any ownership disclosure issues in this document?",
-                "Does this document meet EEO compliance standards?",
-                "Are there any technical standards compliance issues?",
-                "Does this document address programming reports requirements?",
-                "Are there any community service compliance concerns?",
-                "Does this document comply with advertising practices regulations?",
-                "Are there any license renewal issues identified?",
-                "Does this document address emergency alerts compliance?",
-                "Are there any children's programming compliance issues?"
-            ]
+    def generate_compliance_scan(self, compliance_data):
+        """Run a compliance scan, returning a fallback assessment if the model call fails."""
+        compliance_scan_agent = self._start_scan()
+        prompt_inputs = self._build_prompt_inputs(compliance_data)
+        log_info("Invoking AI model for compliance assessment")
+        try:
+            with self._llm_span() as llm_span:
+                llm_started = time.perf_counter()
+                try:
+                    result = compliance_scan_agent.invoke(prompt_inputs)
+                except Exception as e:
+                    llm_circuit.failure(e)
+                    raise
+                llm_circuit.success()
+                self._record_call(result, llm_started, llm_span)
+            if result.get("parsing_error") is not None:
+                ai_response = self._repair(result, compliance_data)
+            else:
+                ai_response = self._parse_ai_response(result)
+        except Exception as e:
+            log_error(f"Error processing AI response: {str(e)}")
+            ai_response = self._fallback_ai_response()
+        return self._finish_scan(ai_response, compliance_data)
 
+    async def agenerate_compliance_scan(self, compliance_data):
+        """
+        Async generate_compliance_scan: the model call awaits the OpenAI client
+        instead of holding a thread, and cancelling the task cancels the request.
+        """
+        compliance_scan_agent = self._start_scan()
+        prompt_inputs = self._build_prompt_inputs(compliance_data)
         log_info("Invoking AI model for compliance assessment")
-        # Get the AI response
-        log_info(f"Compliance data length: {len(compliance_data['compliance_data'])} characters")
-        
         try:
-            ai_response = compliance_scan_agent.invoke({
-                "compliance_data": compliance_data["compliance_data"],
-                "questions": questions,
-                "user_context": user_context_str
-            })
-            log_info(f"AI response: {ai_response}")
-            # Check if ai_response is a dictionary (unstructured) or an object (structured)
-            if isinstance(ai_response, dict):
-                log_info("AI response is a dictionary, converting to structured object")
-                # Create a structured object from the dictionary
-                from app.services.compliance_scan.llm_models.agent_models import compliance_scan
-                
-                # Create structured response directly from the dictionary
-                structured_response = compliance_scan(
-                    compliance_score=ai_response["compliance_score"],
-                    compliance_status=ai_response["compliance_status"],
-                    compliance_message=ai_response["compliance_message"],
-                    summary_of_findings=ai_response["summary_of_findings"],
-                    section_breakdown=ai_response["section_breakdown"],
-                    specific_issues=ai_response["specific_issues"],
-                    recommendations=ai_response["recommendations"],
-                    section_scores=ai_response["section_scores"]
-                )
-                ai_response = structured_response
-                
-            log_info(f"AI model returned compliance score: {ai_response.compliance_score}, status: {ai_response.compliance_status}")
+            with self._llm_span() as llm_span:
+                llm_started = time.perf_counter()
+                try:
+                    result = await compliance_scan_agent.ainvoke(prompt_inputs)
+                except asyncio.CancelledError:
+                    record_cancelled_call(time.perf_counter() - llm_started, self.prompt_layout)
+                    raise
+                except Exception as e:
+                    llm_circuit.failure(e)
+                    raise
+                llm_circuit.success()
+                self._record_call(result, llm_started, llm_span)
+            if result.get("parsing_error") is not None:
+                ai_response = await self._arepair(result, compliance_data)
+            else:
+                ai_response = self._parse_ai_response(result)
         except Exception as e:
             log_error(f"Error processing AI response: {str(e)}")
-            # Create a fallback response
+            ai_response = self._fallback_ai_response()
+        return self._finish_scan(ai_response, compliance_data)
+
+    def batch_request(self, compliance_data):
+        """
+        The chat completions request body a live scan of this data would send,
+        for deferred submission in a batch file.
+        """
+        prompt_inputs = self._build_prompt_inputs(compliance_data)
+        messages = ComplianceScanAgentPrompts.for_layout(self.prompt_layout).format_messages(**prompt_inputs)
+        return {
+            **get_batch_request_params(str(self.open_ai_key), str(self.llm_model)),
+            "messages": [convert_message_to_dict(message) for message in messages],
+        }
+
+    def finish_batch_response(self, completion, compliance_data):
+        """
+        Turn a chat completion returned for a batch_request into the scan response.
+
+        A response that fails validation is salvaged and coerced as far as
+        possible, but not re-asked: that would be a live call.
+
+        Raises:
+            ValueError: If the response cannot be turned into an assessment
+        """
+        self._start_scan()
+        raw = convert_dict_to_message(completion["choices"][0]["message"])
+        raw.response_metadata = {"token_usage": completion.get("usage") or {}, "model_name": completion.get("model")}
+        self.last_usage = extract_usage(raw)
+        try:
+            ai_response = self._parse_ai_response(
+                {"parsed": PydanticToolsParser(tools=[ComplianceScanSchema], first_tool_only=True).invoke(raw)}
+            )
+        except Exception as e:
+            valid, problems = coerce_fields(salvage_fields(raw))
+            if problems:
+                record_repair("failed", problems, self.last_usage, None)
+                raise ValueError(f"Structured output failed validation: {str(e)}")
+            record_repair("coerced", problems, self.last_usage, None)
+            ai_response = merge_repair(valid, None)
+        return self._finish_scan(ai_response, compliance_data)
+
+    def scan_key(self, compliance_data):
+        """
+        Identify a scan by everything that determines its result: the document
+        text, the questions, the organization and document context, and the model
+        and prompt version. Identical in-flight scans share one model call.
+        """
+        h = hashlib.sha256()
+        for part in (
+            compliance_data.get("compliance_data") or "",
+            json.dumps(compliance_data.get("questions") or [], sort_keys=True, default=str),
+            compliance_data.get("org_profile_json") or "",
+            json.dumps(compliance_data.get("user_context"), sort_keys=True, default=str),
+            str(self.llm_model),
+            self.prompt_version,
+        ):
+            h.update(part.encode("utf-8"))
+            h.update(b"\x00")
+        return h.hexdigest()
+
+    def _start_scan(self):
+        """Reset the per-call state and return the chain for this agent's model and layout."""
+        self.used_fallback = False
+        self.last_usage = None
+        self.last_llm_ms = None
+        self.last_cost = None
+        return get_compliance_scan_chain(str(self.open_ai_key), str(self.llm_model), self.prompt_layout)
+
+    def _build_prompt_inputs(self, compliance_data):
+        """Build the prompt variables for the configured layout, with retrieved rule excerpts."""
+        with tracing.span("prompt_build", **{"llm.prompt_layout": self.prompt_layout}):
+            # Format user context for the prompt
+            user_context_str = "No additional context provided."
+            if "user_context" in compliance_data and compliance_data["user_context"]:
+                try:
+                    # If user_context is a string, try to parse it as JSON
+                    if isinstance(compliance_data["user_context"], str):
+                        user_context_str = compliance_data["user_context"]
+                    else:
+                        # If it's already a dict, convert to a formatted string
+                        user_context_str = json.dumps(compliance_data["user_context"], indent=2)
+                except Exception as e:
+                    user_context_str = f"Error processing user context: {str(e)}"
+
+            # Use default FCC compliance questions if none provided
+            questions = compliance_data.get("questions", [])
+            if not questions:
+                questions = [
+                    "Does this document comply with FCC public file requirements?",
+                    "Are there any ownership disclosure issues in this document?",
+                    "Does this document meet EEO compliance standards?",
+                    "Are there any technical standards compliance issues?",
+                    "Does this document address programming reports requirements?",
+                    "Are there any community service compliance concerns?",
+                    "Does this document comply with advertising practices regulations?",
+                    "Are there any license renewal issues identified?",
+                    "Does this document address emergency alerts compliance?",
+                    "Are there any children's programming compliance issues?"
+                ]
+
+            regulations_str = self._retrieve_regulations(compliance_data["compliance_data"])
+
+            log_info(f"Compliance data length: {len(compliance_data['compliance_data'])} characters")
+        
+            if self.prompt_layout == "legacy":
+                prompt_inputs = {
+                    "compliance_data": compliance_data["compliance_data"],
+                    "questions": questions,
+                    "user_context": user_context_str,
+                    "regulations": regulations_str
+                }
+            else:
+                org_profile_str, document_context_str = self._split_user_context(compliance_data)
+                prompt_inputs = {
+                    "org_profile": org_profile_str,
+                    "questions": questions,
+                    "regulations": regulations_str,
+                    "document_context": document_context_str,
+                    "compliance_data": compliance_data["compliance_data"]
+                }
+        return prompt_inputs
+
+    def _llm_span(self):
+        return tracing.span("llm_call", **{"llm.model": str(self.llm_model), "llm.prompt_layout": self.prompt_layout})
+
+    def _record_call(self, result, llm_started, llm_span):
+        """Capture latency, token usage and cost of a model call."""
+        self.last_llm_ms = (time.perf_counter() - llm_started) * 1000
+        self.last_usage = extract_usage(result["raw"])
+        for key, value in self.last_usage.items():
+            llm_span.set_attribute(f"llm.usage.{key}", value)
+        self.last_cost = record_usage(self.last_usage, self.last_llm_ms, self.prompt_layout)
+
+    def _repair(self, result, compliance_data):
+        """
+        Keep the valid fields of a response that failed validation and ask the
+        model again for the rest only, raising if it still cannot be completed
+        or too little of it was salvaged to complete.
+        """
+        document = compliance_data.get("compliance_data") or ""
+        scan_usage, repair_usage = self.last_usage, None
+        problems, follow_up = {}, None
+        try:
+            valid, problems = self._start_repair(result)
+            if problems:
+                with self._repair_span(problems) as repair_span:
+                    repair_started = time.perf_counter()
+                    follow_up = self._repair_chain(problems).invoke(repair_inputs(valid, problems, document))
+                    repair_usage = self._record_repair_call(follow_up, repair_started, repair_span)
+            ai_response = merge_repair(valid, follow_up)
+        except Exception:
+            record_repair("failed", problems, scan_usage, repair_usage)
+            raise
+        record_repair("reasked" if follow_up is not None else "coerced", problems, scan_usage, repair_usage)
+        return ai_response
+
+    async def _arepair(self, result, compliance_data):
+        """Async _repair."""
+        document = compliance_data.get("compliance_data") or ""
+        scan_usage, repair_usage = self.last_usage, None
+        problems, follow_up = {}, None
+        try:
+            valid, problems = self._start_repair(result)
+            if problems:
+                with self._repair_span(problems) as repair_span:
+                    repair_started = time.perf_counter()
+                    follow_up = await self._repair_chain(problems).ainvoke(repair_inputs(valid, problems, document))
+                    repair_usage = self._record_repair_call(follow_up, repair_started, repair_span)
+            ai_response = merge_repair(valid, follow_up)
+        except Exception:
+            record_repair("failed", problems, scan_usage, repair_usage)
+            raise
+        record_repair("reasked" if follow_up is not None else "coerced", problems, scan_usage, repair_usage)
+        return ai_response
+
+    def _start_repair(self, result):
+        log_warning(f"Structured output failed validation, repairing: {result['parsing_error']}")
+        valid, problems = coerce_fields(salvage_fields(result["raw"]))
+        if problems and not can_reask(valid):
+            raise ValueError(f"Too little of the response salvaged to repair: {sorted(valid)}")
+        if problems:
+            log_info(f"Re-asking for {len(problems)} field(s): {problems}")
+        return valid, problems
+
+    def _repair_chain(self, problems):
+        return get_repair_chain(str(self.open_ai_key), str(self.llm_model), tuple(problems))
+
+    def _repair_span(self, problems):
+        return tracing.span("llm_repair", **{"llm.model": str(self.llm_model), "repair.fields": ",".join(problems)})
+
+    def _record_repair_call(self, follow_up, repair_started, repair_span):
+        """Add a follow-up call's latency, tokens and cost to the scan's totals."""
+        repair_ms = (time.perf_counter() - repair_started) * 1000
+        repair_usage = extract_usage(follow_up["raw"])
+        for key, value in repair_usage.items():
+            repair_span.set_attribute(f"llm.usage.{key}", value)
+        repair_cost = record_usage(repair_usage, repair_ms, "repair")
+        self.last_usage = {key: self.last_usage.get(key, 0) + value for key, value in repair_usage.items()}
+        self.last_llm_ms += repair_ms
+        self.last_cost += repair_cost
+        return repair_usage
+
+    def _parse_ai_response(self, result):
+        """Turn the chain's output into the structured assessment."""
+        ai_response = result["parsed"]
+        log_info(f"AI response: {ai_response}")
+        # Check if ai_response is a dictionary (unstructured) or an object (structured)
+        if isinstance(ai_response, dict):
+            log_info("AI response is a dictionary, converting to structured object")
+            # Create a structured object from the dictionary
             from app.services.compliance_scan.llm_models.agent_models import compliance_scan
-            import random
-            
-            # Create default section scores with appropriate ranges
-            section_scores = {
-                "Public File Requirements": random.randint(70, 100),
-                "Technical Compliance": random.randint(80, 100),
-                "Ownership Disclosure": random.randint(60, 100),
-                "EAS Compliance": random.randint(75, 100),
-                "RF Exposure": random.randint(85, 100)
-            }
             
-            # Create a default structured response
-            ai_response = compliance_scan(
-                compliance_score=50,
-                compliance_status="review",
-                compliance_message="Assessment could not be completed due to a processing error.",
-                summary_of_findings="Unable to complete assessment due to processing error.",
-                section_breakdown="No section breakdown available due to processing error.",
-                specific_issues="Assessment could not be completed.",
-                recommendations="Please try again with a more detailed document.",
-                section_scores=section_scores
+            # Create structured response directly from the dictionary
+            structured_response = compliance_scan(
+                compliance_score=ai_response["compliance_score"],
+                compliance_status=ai_response["compliance_status"],
+                compliance_message=ai_response["compliance_message"],
+                summary_of_findings=ai_response["summary_of_findings"],
+                section_breakdown=ai_response["section_breakdown"],
+                specific_issues=ai_response["specific_issues"],
+                recommendations=ai_response["recommendations"],
+                section_scores=ai_response["section_scores"]
             )
-            log_info("Created fallback AI response due to processing error")
+            ai_response = structured_response
+            
+        log_info(f"AI model returned compliance score: {ai_response.compliance_score}, status: {ai_response.compliance_status}")
+        return ai_response
+
+    def _fallback_ai_response(self):
+        """The canned assessment returned when the model call or parsing fails."""
+        # Create a fallback response
+        from app.services.compliance_scan.llm_models.agent_models import compliance_scan
+        import random
         
-        # Get document info from context if available
-        document_info = self._extract_document_info(compliance_data)
+        # Create default section scores with appropriate ranges
+        section_scores = {
+            "Public File Requirements": random.randint(70, 100),
+            "Technical Compliance": random.randint(80, 100),
+            "Ownership Disclosure": random.randint(60, 100),
+            "EAS Compliance": random.randint(75, 100),
+            "RF Exposure": random.randint(85, 100)
+        }
         
-        # Convert AI response to the expected response format
-        return self._format_response(ai_response, document_info)
+        # Create a default structured response
+        ai_response = compliance_scan(
+            compliance_score=50,
+            compliance_status="review",
+            compliance_message="Assessment could not be completed due to a processing error.",
+            summary_of_findings="Unable to complete assessment due to processing error.",
+            section_breakdown="No section breakdown available due to processing error.",
+            specific_issues="Assessment could not be completed.",
+            recommendations="Please try again with a more detailed document.",
+            section_scores=section_scores
+        )
+        self.used_fallback = True
+        log_info("Created fallback AI response due to processing error")
+        return ai_response
+
+    def _finish_scan(self, ai_response, compliance_data):
+        with tracing.span("formatting"):
+            # Get document info from context if available
+            document_info = self._extract_document_info(compliance_data)
+            
+            # Convert AI response to the expected response format
+            return self._format_response(ai_response, document_info)
     
+    def _split_user_context(self, compliance_data):
+        """
+        Split the user context into the organization profile (prompt prefix) and
+        the per-document context (prompt suffix) for the prefix-cached layout.
+
+        Both are serialized canonically so identical content always yields
+        identical bytes. A profile resolved from the registry is used verbatim.
+        """
+        context = compliance_data.get("user_context")
+        if isinstance(context, str):
+            try:
+                context = json.loads(context)
+            except json.JSONDecodeError:
+                return context, "No document context provided."
+        if not isinstance(context, dict):
+            context = {}
+
+        org_profile_str = compliance_data.get("org_profile_json")
+        if not org_profile_str:
+            organization = context.get("organization")
+            if organization is None:
+                organization = {key: value for key, value in context.items() if key != "document"}
+            org_profile_str = OrgProfileService.canonicalize(organization) if organization else "No organization profile provided."
+
+        document = context.get("document")
+        document_context_str = OrgProfileService.canonicalize(document) if document else "No document context provided."
+        return org_profile_str, document_context_str
+
+    def _retrieve_regulations(self, document_text):
+        """Retrieve the rule excerpts relevant to a document for the prompt."""
+        if not config.get("REGULATION_RETRIEVAL_ENABLED"):
+            return "No rule excerpts provided."
+        try:
+            regulations_str = get_regulation_index().format_context(document_text, top_k=config.get("REGULATION_TOP_K"))
+        except Exception as e:
+            log_error(f"Error retrieving regulation excerpts: {str(e)}")
+            return "No rule excerpts provided."
+
+        regulation_tokens = count_tokens(regulations_str, str(self.llm_model))
+        metrics.observe("regulation_context_tokens", regulation_tokens)
+        log_info(f"Added {regulation_tokens} tokens of retrieved FCC rule excerpts to the prompt")
+        return regulations_str
+
     def _extract_document_info(self, compliance_data):
         """Extract document information from the compliance data."""
         document_info = {
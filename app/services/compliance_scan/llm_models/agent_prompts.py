@@ -1,12 +1,8 @@
 from langchain_core.prompts import ChatPromptTemplate
 
-
-class ComplianceScanAgentPrompts:
-    compliance_scan_agent = ChatPromptTemplate.from_messages(
-            [
-                (
-                    "system",
-                    """You are an FCC compliance expert with deep knowledge of telecommunications regulations, 
+# Static instructions shared by both prompt layouts. Keep this text byte-stable:
+# with the prefix-cached layout it is the start of the provider-cached prefix.
+COMPLIANCE_SCAN_SYSTEM_PROMPT = """You are an FCC compliance expert with deep knowledge of telecommunications regulations, 
                     technical standards, and compliance requirements. Your task is to analyze documents and 
                     provide detailed compliance assessments.
                     
@@ -14,6 +10,7 @@ class ComplianceScanAgentPrompts:
                     1. Compliance data (organization documents, FCC regulations, etc.)
                     2. User-provided context in JSON format
                     3. Specific questions to address (these may be empty or general)
+                    4. Excerpts of the FCC rules most relevant to the document, retrieved for you
                     
                     Your primary goal is to perform a COMPREHENSIVE FCC COMPLIANCE ASSESSMENT regardless of 
                     the specific questions provided. Use your expertise to evaluate all relevant aspects of 
@@ -45,7 +42,21 @@ class ComplianceScanAgentPrompts:
                     
                     Be thorough in your assessment and provide clear, actionable insights. Your assessment 
                     should be well-justified based on FCC regulations and the content of the document.
+                    When a retrieved rule excerpt applies, rely on it and cite its section number; the excerpts 
+                    are summaries and do not list every applicable rule.
                     """
+
+
+class ComplianceScanAgentPrompts:
+    # Bump whenever the prompt text changes; stored with every scan result
+    prompt_version = "2026.10.2"
+
+    # Legacy layout: instructions, then the document, then the organization context
+    compliance_scan_agent = ChatPromptTemplate.from_messages(
+            [
+                (
+                    "system",
+                    COMPLIANCE_SCAN_SYSTEM_PROMPT
                 ),
                 (
                     "user",
@@ -60,6 +71,9 @@ class ComplianceScanAgentPrompts:
                     QUESTIONS TO ADDRESS:
                     {questions}
                     
+                    RELEVANT FCC RULES (retrieved excerpts):
+                    {regulations}
+                    
                     Please provide a comprehensive FCC compliance assessment, even if the questions are minimal or general.
                     Focus on evaluating all relevant aspects of FCC compliance based on the document content.
                     
@@ -73,3 +87,80 @@ class ComplianceScanAgentPrompts:
                 )
             ]
         )
+
+    # Prefix-cached layout: everything that repeats between scans of the same
+    # organization (instructions, organization profile, questions) comes first and
+    # is byte-stable, so the provider can reuse its cached prefix. Per-document
+    # content comes last, with the document itself at the very end.
+    compliance_scan_agent_cached = ChatPromptTemplate.from_messages(
+            [
+                (
+                    "system",
+                    COMPLIANCE_SCAN_SYSTEM_PROMPT
+                ),
+                (
+                    "system",
+                    """ORGANIZATION PROFILE (JSON):
+{org_profile}
+
+QUESTIONS TO ADDRESS:
+{questions}
+
+Remember to use EXACTLY these section names in your section_scores:
+- "Public File Requirements"
+- "Technical Compliance"
+- "Ownership Disclosure"
+- "EAS Compliance"
+- "RF Exposure"
+"""
+                ),
+                (
+                    "user",
+                    """Please provide a comprehensive FCC compliance assessment of the document below, even if the questions are minimal or general.
+
+RELEVANT FCC RULES (retrieved excerpts):
+{regulations}
+
+DOCUMENT CONTEXT (JSON):
+{document_context}
+
+COMPLIANCE DATA:
+{compliance_data}
+"""
+                )
+            ]
+        )
+
+    # Follow-up for a structured response that failed validation: only the missing or
+    # invalid fields are asked for, from the valid part of the assessment and, for scores,
+    # an excerpt of the document rather than the whole of it
+    compliance_scan_repair = ChatPromptTemplate.from_messages(
+            [
+                (
+                    "system",
+                    """You are an FCC compliance expert completing a compliance assessment that was returned
+with some fields missing or invalid. Provide ONLY the requested fields, consistent with the
+assessment so far. Scores are integers from 0 to 100.
+"""
+                ),
+                (
+                    "user",
+                    """ASSESSMENT SO FAR (JSON):
+{assessment}
+
+FIELDS TO PROVIDE:
+{fields}
+
+DOCUMENT EXCERPT:
+{document_excerpt}
+"""
+                )
+            ]
+        )
+
+    @classmethod
+    def for_layout(cls, layout: str) -> ChatPromptTemplate:
+        """Return the prompt template for a PROMPT_LAYOUT setting ("prefix_cached" or "legacy")."""
+        if layout == "legacy":
+            return cls.compliance_scan_agent
+        return cls.compliance_scan_agent_cached
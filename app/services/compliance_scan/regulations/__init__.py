@@ -0,0 +1 @@
+from .regulation_index import RegulationIndex, get_regulation_index  # noqa
@@ -0,0 +1,119 @@
+import json
+import math
+import os
+import re
+import time
+from collections import Counter
+from functools import lru_cache
+from typing import Any, Dict, List, Tuple
+
+from app.core import metrics
+from app.core.config import get
+from app.core.logging import log_info
+
+CORPUS_PATH = os.path.join(os.path.dirname(__file__), "fcc_rules.json")
+
+TOKEN_PATTERN = re.compile(r"[a-z0-9]+")
+STOPWORDS = frozenset("""
+a an and any are as at be been by can for from has have if in into is it its may must no not of on or other our shall
+should such than that the their them then there these they this those to under was were which while will with within
+""".split())
+
+
+def tokenize(text: str) -> List[str]:
+    """Lowercase word tokens with stopwords and single characters removed."""
+    return [token for token in TOKEN_PATTERN.findall(text.lower()) if len(token) > 1 and token not in STOPWORDS]
+
+
+class RegulationIndex:
+    """
+    In-memory BM25 inverted index over the bundled FCC rule excerpts.
+
+    The corpus (fcc_rules.json) ships with the code, is read once per worker at
+    warm-up and needs no network access or external search service.
+    """
+
+    def __init__(self, passages: List[Dict[str, Any]], k1: float = 1.5, b: float = 0.75):
+        self.passages = passages
+        self.k1 = k1
+        self.b = b
+        self.postings: Dict[str, List[Tuple[int, int]]] = {}
+        self.doc_lengths: List[int] = []
+
+        for doc_id, passage in enumerate(passages):
+            tokens = tokenize(" ".join([passage["title"], passage.get("keywords", ""), passage["text"]]))
+            self.doc_lengths.append(len(tokens))
+            for term, frequency in Counter(tokens).items():
+                self.postings.setdefault(term, []).append((doc_id, frequency))
+
+        doc_count = len(passages)
+        self.avg_doc_length = sum(self.doc_lengths) / doc_count if doc_count else 0.0
+        self.idf = {
+            term: math.log(1 + (doc_count - len(postings) + 0.5) / (len(postings) + 0.5))
+            for term, postings in self.postings.items()
+        }
+
+    @classmethod
+    def load(cls, path: str = CORPUS_PATH) -> "RegulationIndex":
+        """Build the index from a corpus file."""
+        with open(path, encoding="utf-8") as f:
+            corpus = json.load(f)
+        return cls(corpus["passages"])
+
+    def score(self, query_tokens: List[str]) -> Dict[int, float]:
+        """BM25 scores of every passage matching at least one query term."""
+        scores: Dict[int, float] = {}
+        for term in set(query_tokens):
+            postings = self.postings.get(term)
+            if not postings:
+                continue
+            idf = self.idf[term]
+            for doc_id, frequency in postings:
+                length_norm = self.k1 * (1 - self.b + self.b * self.doc_lengths[doc_id] / self.avg_doc_length)
+                scores[doc_id] = scores.get(doc_id, 0.0) + idf * frequency * (self.k1 + 1) / (frequency + length_norm)
+        return scores
+
+    def search(self, text: str, top_k: int = 6, chunk_chars: int = 2000, max_chunks: int = 64) -> List[Dict[str, Any]]:
+        """
+        Find the rule passages most relevant to a document.
+
+        The document is split into chunks and each chunk is scored separately, so a
+        rule that matches one section strongly is not drowned out by the rest of a
+        long document. A passage's score is its best score over all chunks. Very
+        long documents are sampled down to ``max_chunks`` evenly spaced chunks.
+
+        Returns:
+            Up to ``top_k`` passages, best first, each with its ``score``
+        """
+        chunk_starts = list(range(0, len(text), chunk_chars))
+        if len(chunk_starts) > max_chunks:
+            step = len(chunk_starts) / max_chunks
+            chunk_starts = [chunk_starts[int(i * step)] for i in range(max_chunks)]
+
+        best: Dict[int, float] = {}
+        for start in chunk_starts:
+            for doc_id, score in self.score(tokenize(text[start:start + chunk_chars])).items():
+                if score > best.get(doc_id, 0.0):
+                    best[doc_id] = score
+
+        ranked = sorted(best.items(), key=lambda item: item[1], reverse=True)[:top_k]
+        return [{**self.passages[doc_id], "score": round(score, 3)} for doc_id, score in ranked]
+
+    def format_context(self, text: str, top_k: int = 6) -> str:
+        """Retrieve the top passages for a document and format them for the prompt."""
+        started = time.perf_counter()
+        passages = self.search(text, top_k=top_k)
+        metrics.observe("regulation_retrieval_ms", (time.perf_counter() - started) * 1000)
+        if not passages:
+            return "No specific rule excerpts matched this document."
+        return "\n\n".join(f"[{passage['section']}] {passage['title']}: {passage['text']}" for passage in passages)
+
+
+@lru_cache(maxsize=1)
+def get_regulation_index() -> RegulationIndex:
+    """Load (once per worker) the bundled regulation index."""
+    started = time.perf_counter()
+    index = RegulationIndex.load(get("REGULATION_CORPUS_PATH") or CORPUS_PATH)
+    log_info(f"Loaded regulation index: {len(index.passages)} passages, {len(index.postings)} terms "
+             f"in {(time.perf_counter() - started) * 1000:.1f} ms")
+    return index
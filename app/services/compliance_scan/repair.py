@@ -0,0 +1,237 @@
+"""
+Repair of structured scan output that failed validation.
+
+A scan response that is slightly off (a missing ``section_scores``, ``"85/100"``
+where an int is expected, a list where text is expected) used to be thrown away
+for a random fallback. Instead, the tool call arguments are salvaged from the
+raw message, fixable values are coerced, and only the fields that are still
+missing or invalid are asked for again with a short follow-up prompt that
+carries the valid part of the assessment instead of the document. That costs
+a fraction of the tokens of a full re-scan.
+
+A follow-up only makes sense when there is an assessment to complete: without
+at least the overall score and one other field, the model would be asked to
+invent a scan without seeing the document, so the repair fails instead.
+"""
+import json
+import re
+from functools import lru_cache
+from typing import Any, Dict, Optional, Tuple, Type
+
+from langchain_core.utils.json import parse_partial_json
+from pydantic import BaseModel, create_model
+
+from app.core import metrics
+from app.services.compliance_scan.llm_models import compliance_scan as ComplianceScanSchema
+
+# Fields whose values are judged from the document itself: re-asking for them
+# sends an excerpt of it along with the assessment so far
+SCORE_FIELDS = ("compliance_score", "section_scores")
+
+DOCUMENT_EXCERPT_CHARS = 4000
+
+SECTION_NAMES = (
+    "Public File Requirements",
+    "Technical Compliance",
+    "Ownership Disclosure",
+    "EAS Compliance",
+    "RF Exposure",
+)
+
+_NUMBER = re.compile(r"-?\d+(?:\.\d+)?")
+_KEY = re.compile(r'"((?:[^"\\]|\\.)*)"\s*:')
+
+
+def _last_value_complete(arguments: str, parsed: Dict[str, Any]) -> bool:
+    """Whether truncated arguments were cut after the last parsed field's value rather than inside it."""
+    keys = list(_KEY.finditer(arguments))
+    if not keys or keys[-1].group(1) != list(parsed)[-1]:
+        return False
+    rest = arguments[keys[-1].end():].lstrip()
+    try:
+        _, end = json.JSONDecoder().raw_decode(rest)
+    except json.JSONDecodeError:
+        return False
+    return rest[end:].lstrip().startswith(",")
+
+
+def _parse_arguments(arguments: str) -> Dict[str, Any]:
+    try:
+        parsed = json.loads(arguments)
+    except json.JSONDecodeError:
+        # Truncated output: keep the complete fields and drop the one cut off mid-value
+        parsed = parse_partial_json(arguments)
+        if isinstance(parsed, dict) and parsed and not _last_value_complete(arguments, parsed):
+            parsed.pop(list(parsed)[-1])
+    return parsed if isinstance(parsed, dict) else {}
+
+
+def salvage_fields(raw: Any) -> Dict[str, Any]:
+    """The arguments of the structured-output tool call in a raw model message, as far as they parse."""
+    additional_kwargs = getattr(raw, "additional_kwargs", None) or {}
+    for call in additional_kwargs.get("tool_calls") or []:
+        arguments = (call.get("function") or {}).get("arguments")
+        if arguments:
+            fields = _parse_arguments(arguments)
+            if fields:
+                return fields
+    # Some responses answer in the message text instead of calling the tool
+    content = getattr(raw, "content", None)
+    if isinstance(content, str) and "{" in content:
+        start, end = content.index("{"), content.rfind("}")
+        # No closing brace after the opening one: cut off, leave it to parse_partial_json
+        return _parse_arguments(content[start:end + 1] if end > start else content[start:])
+    return {}
+
+
+def _to_score(value: Any) -> Optional[int]:
+    if isinstance(value, bool):
+        return None
+    if isinstance(value, (int, float)):
+        number = value
+    elif isinstance(value, str):
+        match = _NUMBER.search(value)
+        if match is None:
+            return None
+        number = float(match.group())
+    else:
+        return None
+    return max(0, min(100, int(round(number))))
+
+
+def _to_text(value: Any) -> Optional[str]:
+    if isinstance(value, str):
+        return value if value.strip() else None
+    if isinstance(value, (int, float)) and not isinstance(value, bool):
+        return str(value)
+    if isinstance(value, list):
+        items = [_to_text(item) for item in value]
+        return "\n".join(f"- {item}" for item in items if item) or None
+    if isinstance(value, dict):
+        return "\n".join(f"{key}: {_to_text(item) or ''}" for key, item in value.items()) or None
+    return None
+
+
+def _to_section_scores(value: Any) -> Optional[Dict[str, int]]:
+    if isinstance(value, str):
+        value = _parse_arguments(value)
+    if isinstance(value, list):
+        # [{"section": "EAS Compliance", "score": 90}, ...]
+        value = {
+            str(entry.get("section") or entry.get("name")): entry.get("score")
+            for entry in value
+            if isinstance(entry, dict) and (entry.get("section") or entry.get("name"))
+        }
+    if not isinstance(value, dict):
+        return None
+    scores = {str(name): _to_score(score) for name, score in value.items()}
+    return {name: score for name, score in scores.items() if score is not None} or None
+
+
+def _coercer(annotation: Any):
+    if annotation is int:
+        return _to_score
+    if annotation is str:
+        return _to_text
+    return _to_section_scores
+
+
+def coerce_fields(fields: Dict[str, Any]) -> Tuple[Dict[str, Any], Dict[str, str]]:
+    """
+    Validate salvaged fields one by one against the scan schema, coercing what can be fixed.
+
+    Returns:
+        (valid fields, {field: problem} for fields that are missing or could not be fixed)
+    """
+    valid: Dict[str, Any] = {}
+    problems: Dict[str, str] = {}
+    for name, field in ComplianceScanSchema.model_fields.items():
+        value = fields.get(name)
+        if value is None:
+            problems[name] = "missing"
+            continue
+        coerced = _coercer(field.annotation)(value)
+        if coerced is None:
+            problems[name] = f"invalid value {json.dumps(value, default=str)[:80]}"
+            continue
+        if coerced != value:
+            metrics.increment("structured_output_coerced_fields", field=name)
+        valid[name] = coerced
+    return valid, problems
+
+
+def can_reask(valid: Dict[str, Any]) -> bool:
+    """Whether enough of the assessment was salvaged to ask for just the rest: the overall score and another field."""
+    return "compliance_score" in valid and len(valid) >= 2
+
+
+@lru_cache(maxsize=64)
+def repair_schema(fields: Tuple[str, ...]) -> Type[BaseModel]:
+    """A schema holding only the given fields of the scan schema, for the follow-up call."""
+    return create_model(
+        "compliance_scan_repair",
+        __doc__="The missing fields of a compliance scan response.",
+        **{name: (ComplianceScanSchema.model_fields[name].annotation, ComplianceScanSchema.model_fields[name])
+           for name in fields},
+    )
+
+
+def repair_inputs(valid: Dict[str, Any], problems: Dict[str, str], document: str = "") -> Dict[str, str]:
+    """
+    Prompt variables for the follow-up asking for the fields in ``problems``,
+    with the start of the document text if any of them are scores.
+    """
+    lines = []
+    for name, problem in problems.items():
+        description = ComplianceScanSchema.model_fields[name].description
+        if name == "section_scores":
+            description += ", using exactly these section names: " + ", ".join(SECTION_NAMES)
+        lines.append(f"- {name}: {description} (previously {problem})")
+    return {
+        "assessment": json.dumps(valid, indent=2, ensure_ascii=False),
+        "fields": "\n".join(lines),
+        "document_excerpt": (
+            document[:DOCUMENT_EXCERPT_CHARS] or "(not available)"
+            if any(name in SCORE_FIELDS for name in problems)
+            else "(not needed for these fields)"
+        ),
+    }
+
+
+def merge_repair(valid: Dict[str, Any], follow_up: Optional[Dict[str, Any]]) -> ComplianceScanSchema:
+    """
+    Combine the valid fields with the follow-up's answer into a complete response.
+
+    Raises:
+        ValueError: If fields are still missing or invalid
+    """
+    fields: Dict[str, Any] = {}
+    if follow_up is not None:
+        if follow_up.get("parsed") is not None:
+            fields = follow_up["parsed"].model_dump()
+        else:
+            fields = salvage_fields(follow_up["raw"])
+    repaired, problems = coerce_fields({**fields, **valid})
+    if problems:
+        raise ValueError(f"Structured output still invalid after repair: {problems}")
+    return ComplianceScanSchema(**repaired)
+
+
+def record_repair(
+    outcome: str,
+    reasked_fields: Dict[str, str],
+    scan_usage: Optional[Dict[str, int]],
+    repair_usage: Optional[Dict[str, int]] = None,
+) -> None:
+    """
+    Record a repair's outcome ("coerced", "reasked" or "failed") and, for a
+    successful one, the tokens saved compared with re-running the whole scan.
+    """
+    metrics.increment("structured_output_repairs", outcome=outcome)
+    for name in reasked_fields:
+        metrics.increment("structured_output_reasked_fields", field=name)
+    if repair_usage is not None:
+        metrics.observe("structured_output_repair_tokens", repair_usage["total_tokens"])
+    if outcome != "failed" and scan_usage is not None:
+        repair_tokens = repair_usage["total_tokens"] if repair_usage is not None else 0
+        metrics.increment("structured_output_repair_tokens_saved", scan_usage["total_tokens"] - repair_tokens)
@@ -0,0 +1,127 @@
+"""
+Weighted-fair scheduling of model calls between traffic classes.
+
+At most LLM_MAX_CONCURRENT_CALLS scans per worker call the model at a time.
+Scans beyond that wait in one FIFO queue per traffic class (superuser, user,
+anonymous) and free slots are handed out by stride scheduling: every class
+has a pass value that advances by 1 / weight each time one of its scans
+starts, and the waiting class with the lowest pass goes next. With the default
+weights 8:4:1, a burst of anonymous scans gets one slot in thirteen while
+authenticated scans are waiting. A class that was idle rejoins at the current
+pass rather than with credit saved up, and a scan that has waited
+SCHEDULER_MAX_WAIT_SECONDS goes next whatever its class, so anonymous traffic
+slows down under load but is never starved.
+
+Coalesced scans (see single_flight) run in the class of the request that
+started them. Queues are per worker process.
+"""
+import asyncio
+import time
+from collections import deque
+from contextlib import asynccontextmanager
+from typing import Any, AsyncIterator, Deque, Dict, Optional, Tuple
+
+from app.core import metrics
+from app.core.config import get
+
+TRAFFIC_CLASSES = ("superuser", "user", "anonymous")
+
+
+def traffic_class(user: Optional[Any]) -> str:
+    """The traffic class of a request's user (None for anonymous requests)."""
+    if user is None:
+        return "anonymous"
+    return "superuser" if user.is_superuser else "user"
+
+
+class FairScheduler:
+    """Limits concurrent work and admits waiting work by weighted traffic class."""
+
+    def __init__(self, name: str):
+        self.name = name
+        self.running = 0
+        self._queues: Dict[str, Deque[Tuple[float, asyncio.Future]]] = {cls: deque() for cls in TRAFFIC_CLASSES}
+        self._pass = {cls: 0.0 for cls in TRAFFIC_CLASSES}
+        self._virtual_time = 0.0
+
+    @staticmethod
+    def _weight(cls: str) -> float:
+        return max(get(f"SCHEDULER_WEIGHT_{cls.upper()}"), 0.001)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "running": self.running,
+            "capacity": get("LLM_MAX_CONCURRENT_CALLS"),
+            "queued": {cls: len(queue) for cls, queue in self._queues.items()},
+        }
+
+    def _next_class(self) -> Optional[str]:
+        waiting = [cls for cls in TRAFFIC_CLASSES if self._queues[cls]]
+        if not waiting:
+            return None
+        oldest = min(waiting, key=lambda cls: self._queues[cls][0][0])
+        if time.perf_counter() - self._queues[oldest][0][0] >= get("SCHEDULER_MAX_WAIT_SECONDS"):
+            metrics.increment("llm_scheduler_aged", traffic_class=oldest)
+            return oldest
+        return min(waiting, key=lambda cls: (self._pass[cls], TRAFFIC_CLASSES.index(cls)))
+
+    def _start(self, cls: str) -> None:
+        self.running += 1
+        # Admissions that skip the queue move the pass too, so a class that ran
+        # alone for a while does not come back with stale credit
+        self._pass[cls] = max(self._pass[cls], self._virtual_time)
+        self._virtual_time = self._pass[cls]
+        self._pass[cls] += 1 / self._weight(cls)
+
+    def _dispatch(self) -> None:
+        capacity = get("LLM_MAX_CONCURRENT_CALLS")
+        while capacity <= 0 or self.running < capacity:
+            cls = self._next_class()
+            if cls is None:
+                return
+            _, waiter = self._queues[cls].popleft()
+            self._start(cls)
+            waiter.set_result(None)
+
+    async def acquire(self, cls: str) -> None:
+        """Wait for a slot in traffic class ``cls``."""
+        started = time.perf_counter()
+        capacity = get("LLM_MAX_CONCURRENT_CALLS")
+        if capacity <= 0 or (self.running < capacity and not any(self._queues.values())):
+            self._start(cls)
+            metrics.observe("llm_queue_wait_ms", 0.0, traffic_class=cls)
+            return
+
+        queue = self._queues[cls]
+        if not queue:
+            # An idle class rejoins at the current pass instead of spending credit saved while idle
+            self._pass[cls] = max(self._pass[cls], self._virtual_time)
+        entry = (started, asyncio.get_running_loop().create_future())
+        queue.append(entry)
+        metrics.increment("llm_scheduler_queued", traffic_class=cls)
+        try:
+            await entry[1]
+        except asyncio.CancelledError:
+            if entry[1].done() and not entry[1].cancelled():
+                # Granted just as the wait was cancelled: pass the slot on
+                self.release()
+            else:
+                queue.remove(entry)
+            raise
+        finally:
+            metrics.observe("llm_queue_wait_ms", (time.perf_counter() - started) * 1000, traffic_class=cls)
+
+    def release(self) -> None:
+        self.running -= 1
+        self._dispatch()
+
+    @asynccontextmanager
+    async def slot(self, cls: str) -> AsyncIterator[None]:
+        await self.acquire(cls)
+        try:
+            yield
+        finally:
+            self.release()
+
+
+llm_scheduler = FairScheduler("llm")
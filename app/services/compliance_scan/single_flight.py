@@ -0,0 +1,153 @@
+"""
+Single-flight coalescing of identical in-flight scans.
+
+When several requests scan the same document with the same organization
+context, model and prompt version at the same time, only the first one (the
+leader) calls the model; the others wait on the leader's task and receive the
+same assessment. The shared work runs as its own task and every waiter awaits
+it through ``asyncio.shield``, so a client that disconnects only stops its own
+wait and never cancels the scan for the others. Once every waiter has gone,
+the scan is cancelled along with its pending model request.
+
+Flights are per worker process: identical scans on different gunicorn
+workers still make separate calls.
+"""
+import asyncio
+from datetime import datetime
+from typing import Any, Awaitable, Callable, Dict, Tuple
+import uuid
+
+from starlette.concurrency import run_in_threadpool
+
+from app.core import metrics
+from app.core.config import get
+from app.core.logging import log_info
+from app.db.database import SessionLocal
+from app.schemas.compliance_scan import ComplianceScanResponse
+from app.services.compliance_scan.compliance_scanner import ComplianceScanAgent
+from app.services.compliance_scan.scheduler import llm_scheduler
+from app.services.token_usage import TokenUsageService
+
+
+class SingleFlight:
+    """Run at most one task per key at a time; concurrent callers share its result."""
+
+    def __init__(self, name: str):
+        self.name = name
+        self._tasks: Dict[str, asyncio.Task] = {}
+        self._waiters: Dict[asyncio.Task, int] = {}
+
+    def in_flight(self) -> int:
+        return len(self._tasks)
+
+    async def run(self, key: str, factory: Callable[[], Awaitable[Any]]) -> Tuple[Any, bool]:
+        """
+        Await the task for ``key``, starting it with ``factory()`` if none is running.
+
+        A caller that is cancelled (its client disconnected or its deadline passed)
+        stops waiting without affecting the others; when the last waiter is gone
+        the task itself is cancelled, so no work is finished for nobody.
+
+        Returns:
+            (result, shared), where shared is True if another caller started the work
+        """
+        task = self._tasks.get(key)
+        shared = task is not None
+        if task is None:
+            task = asyncio.ensure_future(factory())
+            self._tasks[key] = task
+            task.add_done_callback(lambda done: self._forget(key, done))
+            metrics.increment("single_flight_leaders", flight=self.name)
+        else:
+            metrics.increment("single_flight_coalesced", flight=self.name)
+        self._waiters[task] = self._waiters.get(task, 0) + 1
+        try:
+            return await asyncio.shield(task), shared
+        finally:
+            self._waiters[task] -= 1
+            if not self._waiters[task]:
+                del self._waiters[task]
+                if not task.done():
+                    task.cancel()
+                    self._forget(key, task)
+                    metrics.increment("single_flight_abandoned", flight=self.name)
+
+    def _forget(self, key: str, task: asyncio.Task) -> None:
+        if self._tasks.get(key) is task:
+            del self._tasks[key]
+        # Mark the outcome as seen, in case every waiter went away before it finished
+        if task.done() and not task.cancelled():
+            task.exception()
+
+
+scan_flights = SingleFlight("compliance_scan")
+
+
+def _record_usage(account: str, document_type: str, agent: ComplianceScanAgent) -> None:
+    # The shared scan can outlive the request that started it, so it uses its own session
+    db = SessionLocal()
+    try:
+        TokenUsageService.record_call(
+            db,
+            account,
+            document_type=document_type,
+            model=agent.llm_model,
+            usage=agent.last_usage,
+            cost_usd=agent.last_cost,
+            latency_ms=agent.last_llm_ms,
+        )
+    finally:
+        db.close()
+
+
+async def run_scan(
+    compliance_data: Dict[str, Any],
+    usage_account: str,
+    document_type: str,
+    traffic_class: str = "anonymous",
+) -> Dict[str, Any]:
+    """
+    Generate a compliance scan, sharing the model call with identical scans in flight.
+
+    The model call waits for a slot from the LLM scheduler in ``traffic_class``
+    (see scheduler). Token usage is recorded once, by the shared work, against
+    ``usage_account`` (see TokenUsageService.usage_account).
+
+    Returns:
+        A dict with the scan ``result``, whether it ``used_fallback``, the ``model``,
+        ``prompt_version`` and ``llm_ms`` of the call, and whether it was ``shared``
+    """
+    agent = ComplianceScanAgent()
+
+    async def scan() -> Dict[str, Any]:
+        async with llm_scheduler.slot(traffic_class):
+            result = await agent.agenerate_compliance_scan(compliance_data)
+        if agent.last_usage is not None:
+            await run_in_threadpool(_record_usage, usage_account, document_type, agent)
+        return {
+            "result": result,
+            "used_fallback": agent.used_fallback,
+            "model": agent.llm_model,
+            "prompt_version": agent.prompt_version,
+            "llm_ms": agent.last_llm_ms,
+        }
+
+    if not get("SINGLE_FLIGHT_ENABLED"):
+        return {**await scan(), "shared": False}
+
+    key = f"{document_type}:{agent.scan_key(compliance_data)}"
+    outcome, shared = await scan_flights.run(key, scan)
+    if not shared:
+        return {**outcome, "shared": False}
+
+    log_info(f"Scan {key[:24]} coalesced with an identical scan in flight")
+    return {**outcome, "result": _copy_for_waiter(outcome["result"]), "shared": True}
+
+
+def _copy_for_waiter(result: ComplianceScanResponse) -> ComplianceScanResponse:
+    """A waiter's own copy of a shared result, as a separate document in the scan history."""
+    document = result.document.model_copy(
+        update={"id": f"doc_{uuid.uuid4().hex[:8]}", "uploadTime": datetime.now().isoformat()},
+        deep=True,
+    )
+    return result.model_copy(update={"document": document})
@@ -0,0 +1,59 @@
+from typing import Any, Dict
+
+from app.core import metrics
+from app.core.config import get
+
+
+def extract_usage(message: Any) -> Dict[str, int]:
+    """
+    Read token usage from a raw chat model message.
+
+    Returns:
+        Dict with prompt, completion, cached prompt and total token counts. Cached
+        tokens are only reported by the API for prompts long enough to be cached.
+    """
+    response_metadata = getattr(message, "response_metadata", None) or {}
+    token_usage = response_metadata.get("token_usage") or {}
+    prompt_details = token_usage.get("prompt_tokens_details") or {}
+    return {
+        "prompt_tokens": int(token_usage.get("prompt_tokens") or 0),
+        "completion_tokens": int(token_usage.get("completion_tokens") or 0),
+        "cached_tokens": int(prompt_details.get("cached_tokens") or 0),
+        "total_tokens": int(token_usage.get("total_tokens") or 0),
+    }
+
+
+def estimate_cost(usage: Dict[str, int]) -> float:
+    """Estimate the USD cost of a call from its token usage and the configured prices."""
+    uncached_prompt_tokens = usage["prompt_tokens"] - usage["cached_tokens"]
+    return (
+        uncached_prompt_tokens * get("OPENAI_PRICE_INPUT_PER_1M")
+        + usage["cached_tokens"] * get("OPENAI_PRICE_CACHED_INPUT_PER_1M")
+        + usage["completion_tokens"] * get("OPENAI_PRICE_OUTPUT_PER_1M")
+    ) / 1_000_000
+
+
+def record_usage(usage: Dict[str, int], latency_ms: float, layout: str) -> float:
+    """
+    Record a call's tokens, cache hit ratio, latency and estimated cost in the metrics.
+
+    Metrics are labelled by prompt layout so the layouts can be compared.
+
+    Returns:
+        The estimated cost in USD
+    """
+    cost = estimate_cost(usage)
+    metrics.observe("llm_latency_ms", latency_ms, layout=layout)
+    metrics.observe("llm_prompt_tokens", usage["prompt_tokens"], layout=layout)
+    metrics.observe("llm_completion_tokens", usage["completion_tokens"], layout=layout)
+    metrics.observe("llm_cached_tokens", usage["cached_tokens"], layout=layout)
+    if usage["prompt_tokens"]:
+        metrics.observe("llm_cached_ratio", usage["cached_tokens"] / usage["prompt_tokens"], layout=layout)
+    metrics.observe("llm_cost_usd", cost, layout=layout)
+    return cost
+
+
+def record_cancelled_call(seconds: float, layout: str) -> None:
+    """Record a call cancelled before it returned; its time (and prompt tokens) bought nothing."""
+    metrics.increment("llm_cancelled_calls", layout=layout)
+    metrics.increment("llm_wasted_seconds", seconds, layout=layout)
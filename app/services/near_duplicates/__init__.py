@@ -0,0 +1,2 @@
+from .minhash import MinHasher, MinHashLSH  # noqa
+from .near_duplicate_service import NearDuplicateService  # noqa
@@ -0,0 +1,133 @@
+import re
+import threading
+import zlib
+from collections import OrderedDict
+from typing import Any, Callable, Dict, List, Optional, Set, Tuple
+
+import numpy as np
+
+WORD_PATTERN = re.compile(r"\w+")
+
+_MERSENNE_PRIME = np.uint64((1 << 61) - 1)
+_MAX_HASH = np.uint64((1 << 32) - 1)
+
+
+class MinHasher:
+    """
+    MinHash signatures over word shingles.
+
+    The Jaccard similarity of two documents' shingle sets is estimated by the
+    fraction of signature positions that agree. Parameters are seeded, so
+    signatures are stable across workers and restarts.
+    """
+
+    def __init__(self, num_perm: int = 128, shingle_size: int = 5, seed: int = 1, chunk_size: int = 8192):
+        self.num_perm = num_perm
+        self.shingle_size = shingle_size
+        self.chunk_size = chunk_size
+        rng = np.random.RandomState(seed)
+        self._a = rng.randint(1, _MERSENNE_PRIME, size=num_perm, dtype=np.uint64)
+        self._b = rng.randint(0, _MERSENNE_PRIME, size=num_perm, dtype=np.uint64)
+
+    def shingle_hashes(self, text: str) -> np.ndarray:
+        """The distinct 32-bit hashes of a text's word shingles."""
+        words = WORD_PATTERN.findall(text.lower())
+        k = self.shingle_size
+        if len(words) <= k:
+            shingles = [" ".join(words)] if words else []
+        else:
+            shingles = [" ".join(words[i:i + k]) for i in range(len(words) - k + 1)]
+        return np.unique(np.fromiter((zlib.crc32(s.encode("utf-8")) for s in shingles), dtype=np.uint64, count=len(shingles)))
+
+    def signature(self, text: str) -> Optional[np.ndarray]:
+        """The MinHash signature (uint32[num_perm]) of a text, or None if it has no words."""
+        hashes = self.shingle_hashes(text)
+        if not len(hashes):
+            return None
+        signature = np.full(self.num_perm, _MAX_HASH, dtype=np.uint64)
+        # Hash in chunks so a large filing never needs a (shingles x num_perm) matrix at once
+        for start in range(0, len(hashes), self.chunk_size):
+            chunk = hashes[start:start + self.chunk_size, np.newaxis]
+            permuted = np.bitwise_and((chunk * self._a + self._b) % _MERSENNE_PRIME, _MAX_HASH)
+            np.minimum(signature, permuted.min(axis=0), out=signature)
+        return signature.astype(np.uint32)
+
+    @staticmethod
+    def similarity(first: np.ndarray, second: np.ndarray) -> float:
+        """Estimated Jaccard similarity of two signatures."""
+        return float(np.mean(first == second))
+
+
+class MinHashLSH:
+    """
+    Banded locality-sensitive hashing index over MinHash signatures.
+
+    Signatures are split into ``bands`` bands; documents sharing any band are
+    candidates and are then scored on their full signatures. Holds at most
+    ``max_entries`` signatures, evicting the oldest. Thread-safe.
+    """
+
+    def __init__(self, num_perm: int = 128, bands: int = 16, max_entries: int = 100000):
+        if num_perm % bands:
+            raise ValueError("num_perm must be a multiple of bands")
+        self.bands = bands
+        self.rows = num_perm // bands
+        self.max_entries = max_entries
+        self._buckets: List[Dict[bytes, Set[Any]]] = [{} for _ in range(bands)]
+        self._entries: "OrderedDict[Any, Tuple[np.ndarray, Dict[str, Any]]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def _band_keys(self, signature: np.ndarray) -> List[bytes]:
+        return [signature[i * self.rows:(i + 1) * self.rows].tobytes() for i in range(self.bands)]
+
+    def add(self, key: Any, signature: np.ndarray, meta: Dict[str, Any]) -> None:
+        """Index a signature under ``key`` with metadata returned by ``query``."""
+        with self._lock:
+            if key in self._entries:
+                self._remove(key)
+            self._entries[key] = (signature, meta)
+            for band, band_key in enumerate(self._band_keys(signature)):
+                self._buckets[band].setdefault(band_key, set()).add(key)
+            while len(self._entries) > self.max_entries:
+                self._remove(next(iter(self._entries)))
+
+    def _remove(self, key: Any) -> None:
+        signature, _ = self._entries.pop(key)
+        for band, band_key in enumerate(self._band_keys(signature)):
+            bucket = self._buckets[band].get(band_key)
+            if bucket is not None:
+                bucket.discard(key)
+                if not bucket:
+                    del self._buckets[band][band_key]
+
+    def query(
+        self,
+        signature: np.ndarray,
+        threshold: float,
+        accept: Optional[Callable[[Dict[str, Any]], bool]] = None,
+    ) -> Optional[Tuple[Any, Dict[str, Any], float]]:
+        """
+        Find the most similar indexed signature at or above ``threshold``.
+
+        Args:
+            accept: Optional filter on candidates' metadata
+
+        Returns:
+            (key, metadata, similarity) of the best match, or None
+        """
+        with self._lock:
+            candidates: Set[Any] = set()
+            for band, band_key in enumerate(self._band_keys(signature)):
+                candidates.update(self._buckets[band].get(band_key, ()))
+            best = None
+            for key in candidates:
+                candidate_signature, meta = self._entries[key]
+                if accept is not None and not accept(meta):
+                    continue
+                similarity = MinHasher.similarity(signature, candidate_signature)
+                if similarity >= threshold and (best is None or similarity > best[2]):
+                    best = (key, meta, similarity)
+            return best
@@ -0,0 +1,193 @@
+import hashlib
+import json
+import threading
+import time
+from functools import lru_cache
+from typing import Any, Dict, Optional, Tuple
+
+import numpy as np
+from sqlalchemy.orm import Session
+
+from app.core import metrics
+from app.core.config import get
+from app.core.logging import log_info, log_exception
+from app.models.scan_result import ScanResult
+from app.schemas.compliance_scan import ComplianceScanResponse, ScannedDocument
+from app.services.near_duplicates.minhash import MinHasher, MinHashLSH
+
+# Id of the newest scan loaded into this worker's index, and when the DB was last checked
+_loaded_up_to = 0
+_refreshed_at = 0.0
+_refresh_lock = threading.Lock()
+
+
+@lru_cache(maxsize=1)
+def get_min_hasher() -> MinHasher:
+    """The worker's MinHasher; the parameters must match the stored signatures."""
+    return MinHasher(num_perm=get("NEAR_DUPLICATE_NUM_PERM"), shingle_size=get("NEAR_DUPLICATE_SHINGLE_SIZE"))
+
+
+@lru_cache(maxsize=1)
+def get_near_duplicate_index() -> MinHashLSH:
+    """The worker's LSH index of prior scans."""
+    return MinHashLSH(
+        num_perm=get("NEAR_DUPLICATE_NUM_PERM"),
+        bands=get("NEAR_DUPLICATE_BANDS"),
+        max_entries=get("NEAR_DUPLICATE_INDEX_MAX_ENTRIES"),
+    )
+
+
+class NearDuplicateService:
+    """Service for finding prior scans of near-identical documents and reusing their results."""
+
+    @staticmethod
+    def signature(text: str) -> Optional[np.ndarray]:
+        """The MinHash signature of a document's text, or None if detection is disabled."""
+        if not get("NEAR_DUPLICATE_ENABLED"):
+            return None
+        started = time.perf_counter()
+        signature = get_min_hasher().signature(text)
+        metrics.observe("near_duplicate_signature_ms", (time.perf_counter() - started) * 1000)
+        return signature
+
+    @staticmethod
+    def context_hash(compliance_data: Dict[str, Any]) -> str:
+        """
+        Hash what decides an assessment besides the document text: the
+        questions and the organization context, including a registered
+        profile. Per-upload document details (filename, size) are left out.
+        """
+        user_context = {
+            key: value for key, value in (compliance_data.get("user_context") or {}).items() if key != "document"
+        }
+        h = hashlib.sha256()
+        for part in (
+            json.dumps(compliance_data.get("questions") or [], sort_keys=True, default=str),
+            compliance_data.get("org_profile_json") or "",
+            json.dumps(user_context, sort_keys=True, default=str),
+        ):
+            h.update(part.encode("utf-8"))
+            h.update(b"\x00")
+        return h.hexdigest()
+
+    @staticmethod
+    def refresh(db: Session, force: bool = False) -> int:
+        """
+        Load scans stored since the last refresh (by any worker) into the index.
+
+        Runs at most every NEAR_DUPLICATE_REFRESH_SECONDS unless forced.
+
+        Returns:
+            The number of signatures added
+        """
+        global _loaded_up_to, _refreshed_at
+        if not force and time.monotonic() - _refreshed_at < get("NEAR_DUPLICATE_REFRESH_SECONDS"):
+            return 0
+        if not _refresh_lock.acquire(blocking=force):
+            return 0
+        try:
+            _refreshed_at = time.monotonic()
+            rows = (
+                db.query(ScanResult.id, ScanResult.document_id, ScanResult.org_name, ScanResult.context_hash,
+                         ScanResult.model, ScanResult.prompt_version, ScanResult.minhash)
+                .filter(ScanResult.id > _loaded_up_to, ScanResult.minhash.isnot(None), ScanResult.reused_from.is_(None))
+                .order_by(ScanResult.id.desc())
+                .limit(get("NEAR_DUPLICATE_INDEX_MAX_ENTRIES"))
+                .all()
+            )
+            index = get_near_duplicate_index()
+            # Oldest first, so the index evicts the oldest scans when full
+            for row in reversed(rows):
+                index.add(row.id, np.frombuffer(row.minhash, dtype=np.uint32), {
+                    "document_id": row.document_id,
+                    "org_name": row.org_name,
+                    "context_hash": row.context_hash,
+                    "model": row.model,
+                    "prompt_version": row.prompt_version,
+                })
+            if rows:
+                _loaded_up_to = max(_loaded_up_to, rows[0].id)
+            return len(rows)
+        except Exception as e:
+            log_exception(e, "NearDuplicateService.refresh")
+            return 0
+        finally:
+            _refresh_lock.release()
+
+    @staticmethod
+    def remember(scan_result: Optional[ScanResult], signature: Optional[np.ndarray]) -> None:
+        """Add a freshly stored scan to this worker's index."""
+        if scan_result is None or signature is None:
+            return
+        get_near_duplicate_index().add(scan_result.id, signature, {
+            "document_id": scan_result.document_id,
+            "org_name": scan_result.org_name,
+            "context_hash": scan_result.context_hash,
+            "model": scan_result.model,
+            "prompt_version": scan_result.prompt_version,
+        })
+
+    @staticmethod
+    def find_match(
+        db: Session,
+        signature: Optional[np.ndarray],
+        org_name: Optional[str],
+        context_hash: str,
+        model: Optional[str],
+        prompt_version: Optional[str],
+    ) -> Optional[Tuple[ScanResult, float]]:
+        """
+        Find a prior scan of a near-identical document whose result can be reused.
+
+        Only scans for the same named organization, with the same questions and
+        context (see context_hash), model and prompt version qualify, since any
+        of those changes the assessment. Scans without an organization never
+        match. Queries the database; call it from the threadpool.
+
+        Returns:
+            (prior scan, estimated similarity) at or above NEAR_DUPLICATE_THRESHOLD, or None
+        """
+        if signature is None or org_name is None:
+            return None
+        NearDuplicateService.refresh(db)
+
+        started = time.perf_counter()
+        match = get_near_duplicate_index().query(
+            signature,
+            get("NEAR_DUPLICATE_THRESHOLD"),
+            accept=lambda meta: (
+                meta["org_name"] == org_name
+                and meta["context_hash"] == context_hash
+                and meta["model"] == model
+                and meta["prompt_version"] == prompt_version
+            ),
+        )
+        metrics.observe("near_duplicate_lookup_ms", (time.perf_counter() - started) * 1000)
+        if match is None:
+            metrics.increment("near_duplicate_misses")
+            return None
+
+        _, meta, similarity = match
+        prior = db.query(ScanResult).filter(ScanResult.document_id == meta["document_id"]).first()
+        if prior is None:
+            return None
+        metrics.increment("near_duplicate_hits")
+        metrics.observe("near_duplicate_similarity", similarity)
+        log_info(f"Near-duplicate of scan {prior.document_id} found (similarity {similarity:.3f})")
+        return prior, similarity
+
+    @staticmethod
+    def reuse_response(prior: ScanResult, document_name: str, document_size: str, similarity: float) -> ComplianceScanResponse:
+        """Build the response for a new upload from a prior scan's assessment."""
+        previous = ComplianceScanResponse.model_validate(prior.response)
+        document = ScannedDocument(
+            name=document_name,
+            size=document_size,
+            complianceStatus=previous.document.complianceStatus,
+            complianceMessage=previous.document.complianceMessage,
+            detailedReport=previous.document.detailedReport,
+        )
+        return ComplianceScanResponse(
+            document=document,
+            message=f"Reused the assessment of near-identical document {prior.document_id} (similarity {similarity:.2f})",
+        )
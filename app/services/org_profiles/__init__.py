@@ -0,0 +1 @@
+from .org_profile_service import OrgProfileService  # noqa
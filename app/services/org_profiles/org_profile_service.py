@@ -0,0 +1,184 @@
+import hashlib
+import json
+import threading
+import time
+from typing import Any, Dict, List, NamedTuple, Optional, Tuple
+
+from fastapi import HTTPException
+from sqlalchemy.orm import Session
+
+from app.core.config import get
+from app.core.logging import log_info
+from app.models.org_profile import OrgProfile
+from app.models.user import User
+
+
+class ResolvedProfile(NamedTuple):
+    """A registered profile as a scan uses it."""
+    id: int
+    name: str
+    owner_id: Optional[int]
+    daily_token_budget: Optional[int]
+    profile: Dict[str, Any]
+    canonical_json: str
+
+
+# Usage accounts that are not profiles (see TokenUsageService.usage_account)
+ANONYMOUS_ACCOUNT = "anonymous"
+USER_ACCOUNT_PREFIX = "user:"
+
+# Per-worker cache of id -> (loaded_at, resolved profile)
+_cache: Dict[int, Tuple[float, ResolvedProfile]] = {}
+_cache_lock = threading.Lock()
+
+
+class OrgProfileService:
+    """Service for registering organization profiles and resolving them for scans."""
+
+    @staticmethod
+    def canonicalize(profile: Dict[str, Any]) -> str:
+        """
+        Serialize a profile to a byte-stable string.
+
+        Sorted keys and fixed separators mean the same profile always produces the
+        same bytes, which keeps the prompt prefix identical between scans.
+        """
+        return json.dumps(profile, sort_keys=True, separators=(",", ":"), ensure_ascii=False)
+
+    @staticmethod
+    def can_use(owner_id: Optional[int], user: Optional[User]) -> bool:
+        """Whether a user may scan as, read or replace a profile: its owner, or any superuser."""
+        if user is None:
+            return False
+        return bool(user.is_superuser) or (owner_id is not None and owner_id == user.id)
+
+    @staticmethod
+    def register(
+        db: Session,
+        name: str,
+        profile: Dict[str, Any],
+        owner: User,
+        daily_token_budget: Optional[int] = None
+    ) -> OrgProfile:
+        """
+        Register a profile, replacing the stored profile if the name already exists.
+
+        The name is also the profile's token usage account, so it may not look
+        like another kind of account. Only superusers set budgets; when anyone
+        else replaces a profile, its budget is kept. Every profile is charged
+        against its own budget, so users other than superusers may only
+        register ORG_PROFILES_PER_USER of them.
+
+        Raises:
+            HTTPException: 400 for a reserved name, 403 if the name is registered
+                to another user or the user has registered their maximum
+        """
+        if name.lower() == ANONYMOUS_ACCOUNT or name.lower().startswith(USER_ACCOUNT_PREFIX):
+            raise HTTPException(
+                status_code=400,
+                detail=f"Organization profiles may not be named '{ANONYMOUS_ACCOUNT}' or start with '{USER_ACCOUNT_PREFIX}'"
+            )
+        canonical_json = OrgProfileService.canonicalize(profile)
+        profile_hash = hashlib.sha256(canonical_json.encode("utf-8")).hexdigest()
+
+        org_profile = db.query(OrgProfile).filter(OrgProfile.name == name).first()
+        if org_profile is None:
+            limit = get("ORG_PROFILES_PER_USER")
+            if not owner.is_superuser and limit > 0 and len(OrgProfileService.owned_ids(db, owner)) >= limit:
+                raise HTTPException(
+                    status_code=403,
+                    detail=f"Users may register at most {limit} organization profiles"
+                )
+            org_profile = OrgProfile(name=name, owner_id=owner.id)
+        elif not OrgProfileService.can_use(org_profile.owner_id, owner):
+            raise HTTPException(
+                status_code=403,
+                detail="An organization profile with this name is registered to another user"
+            )
+        org_profile.profile = profile
+        org_profile.canonical_json = canonical_json
+        org_profile.profile_hash = profile_hash
+        if owner.is_superuser:
+            org_profile.daily_token_budget = daily_token_budget
+
+        db.add(org_profile)
+        db.commit()
+        db.refresh(org_profile)
+        with _cache_lock:
+            _cache.pop(org_profile.id, None)
+        log_info(f"Registered org profile {org_profile.id} ({name}), hash {profile_hash[:12]}")
+        return org_profile
+
+    @staticmethod
+    def get(db: Session, profile_id: int) -> Optional[OrgProfile]:
+        """Get a registered profile by id."""
+        return db.query(OrgProfile).filter(OrgProfile.id == profile_id).first()
+
+    @staticmethod
+    def owned_ids(db: Session, user: User) -> List[int]:
+        """Ids of the profiles a user registered."""
+        return [profile_id for (profile_id,) in db.query(OrgProfile.id).filter(OrgProfile.owner_id == user.id).all()]
+
+    @staticmethod
+    def owned_names(db: Session, user: User) -> List[str]:
+        """Names, and so usage accounts, of the profiles a user registered."""
+        return [name for (name,) in db.query(OrgProfile.name).filter(OrgProfile.owner_id == user.id).all()]
+
+    @staticmethod
+    def resolve(db: Session, profile_id: int) -> Optional[ResolvedProfile]:
+        """
+        Resolve a profile id to what a scan needs: its profile dict, canonical
+        JSON, owner and budget.
+
+        Results are cached in the worker for ORG_PROFILE_CACHE_SECONDS, so repeated
+        uploads for the same organization skip the database and JSON parsing.
+
+        Returns:
+            The resolved profile, or None if the profile does not exist
+        """
+        now = time.monotonic()
+        with _cache_lock:
+            cached = _cache.get(profile_id)
+        if cached is not None and now - cached[0] < get("ORG_PROFILE_CACHE_SECONDS"):
+            return cached[1]
+
+        org_profile = OrgProfileService.get(db, profile_id)
+        if org_profile is None:
+            return None
+        resolved = ResolvedProfile(
+            id=org_profile.id,
+            name=org_profile.name,
+            owner_id=org_profile.owner_id,
+            daily_token_budget=org_profile.daily_token_budget,
+            profile=org_profile.profile,
+            canonical_json=org_profile.canonical_json,
+        )
+        with _cache_lock:
+            _cache[profile_id] = (now, resolved)
+        return resolved
+
+    @staticmethod
+    def resolve_for_user(db: Session, profile_id: int, user: Optional[User]) -> ResolvedProfile:
+        """
+        Resolve a profile a scan references, if the user may use it.
+
+        Profiles someone else registered are reported as missing, so ids cannot
+        be probed.
+
+        Raises:
+            HTTPException: 401 for anonymous requests, 404 if the profile does
+                not exist or the user may not use it
+        """
+        if user is None:
+            raise HTTPException(
+                status_code=401,
+                detail="Sign in to scan with a registered organization profile",
+                headers={"WWW-Authenticate": "Bearer"},
+            )
+        resolved = OrgProfileService.resolve(db, profile_id)
+        if resolved is None or not OrgProfileService.can_use(resolved.owner_id, user):
+            raise HTTPException(
+                status_code=404,
+                detail="The organization profile with this id does not exist"
+            )
+        return resolved
@@ -0,0 +1,208 @@
+"""
+Pluggable text extraction backends.
+
+pypdf is pure Python and always installed; pypdfium2 (PDFium) and pymupdf
+(MuPDF) are native and several times faster, and are used when installed and
+listed in PDF_EXTRACTION_BACKENDS, e.g. ``pypdfium2,pypdf``. A document is
+extracted with the first listed backend that is installed; if that backend
+cannot open the document or fails on a page, the document falls back to the
+next one from that page on, with pypdf always last.
+
+Only the text of a page comes from the backend. Page classification, the page
+cache fingerprint and metadata are still read with pypdf, which parses the
+document lazily and only touches page content streams and resources for
+those. The "tables" extraction mode relies on pypdf's layout mode and always
+uses pypdf.
+
+The native libraries are not thread-safe, so each one extracts one page at a
+time per worker process.
+"""
+import importlib
+import logging
+import threading
+from contextlib import nullcontext
+from typing import Any, List, Optional
+
+import pypdf
+
+from app.core import metrics
+from app.core.config import get
+
+logger = logging.getLogger(__name__)
+
+
+class PypdfBackend:
+    """pypdf: pure Python, reuses the reader the document was opened with."""
+
+    name = "pypdf"
+    lock = None
+
+    @staticmethod
+    def installed() -> bool:
+        return True
+
+    @staticmethod
+    def open(pdf_reader: pypdf.PdfReader) -> Any:
+        return pdf_reader
+
+    @staticmethod
+    def page_text(document: Any, page_num: int) -> str:
+        return document.pages[page_num].extract_text() or ""
+
+    @staticmethod
+    def close(document: Any) -> None:
+        pass
+
+
+class PdfiumBackend:
+    """pypdfium2: PDFium reading from the same file object as pypdf."""
+
+    name = "pypdfium2"
+    lock = threading.Lock()
+
+    @staticmethod
+    def installed() -> bool:
+        return _module("pypdfium2") is not None
+
+    @staticmethod
+    def open(pdf_reader: pypdf.PdfReader) -> Any:
+        # PDFium reads the file object on demand, seeking before every read
+        return _module("pypdfium2").PdfDocument(pdf_reader.stream)
+
+    @staticmethod
+    def page_text(document: Any, page_num: int) -> str:
+        page = document[page_num]
+        try:
+            textpage = page.get_textpage()
+            try:
+                return textpage.get_text_range().replace("\r\n", "\n")
+            finally:
+                textpage.close()
+        finally:
+            page.close()
+
+    @staticmethod
+    def close(document: Any) -> None:
+        document.close()
+
+
+class PymupdfBackend:
+    """pymupdf: MuPDF, opened from a copy of the file contents."""
+
+    name = "pymupdf"
+    lock = threading.Lock()
+
+    @staticmethod
+    def installed() -> bool:
+        return _module("pymupdf") is not None or _module("fitz") is not None
+
+    @staticmethod
+    def open(pdf_reader: pypdf.PdfReader) -> Any:
+        stream = pdf_reader.stream
+        stream.seek(0)
+        return (_module("pymupdf") or _module("fitz")).open(stream=stream.read(), filetype="pdf")
+
+    @staticmethod
+    def page_text(document: Any, page_num: int) -> str:
+        return document[page_num].get_text()
+
+    @staticmethod
+    def close(document: Any) -> None:
+        document.close()
+
+
+BACKENDS = {backend.name: backend for backend in (PypdfBackend, PdfiumBackend, PymupdfBackend)}
+
+_modules = {}
+
+
+def _module(name: str) -> Any:
+    """The imported module, or None if it is not installed."""
+    if name not in _modules:
+        try:
+            _modules[name] = importlib.import_module(name)
+        except ImportError:
+            _modules[name] = None
+    return _modules[name]
+
+
+_warned_missing = set()
+
+
+def configured_backends(names: Optional[str] = None) -> List[type]:
+    """
+    The installed backends in PDF_EXTRACTION_BACKENDS order, ending with pypdf.
+
+    Raises:
+        ValueError: If a configured name is not a known backend
+    """
+    chain = []
+    for name in (names or get("PDF_EXTRACTION_BACKENDS")).split(","):
+        name = name.strip()
+        if not name:
+            continue
+        if name not in BACKENDS:
+            raise ValueError(f"Unknown PDF extraction backend: {name}")
+        backend = BACKENDS[name]
+        if not backend.installed():
+            if name not in _warned_missing:
+                _warned_missing.add(name)
+                logger.warning(f"PDF extraction backend {name} is not installed, skipping it")
+            continue
+        if backend not in chain:
+            chain.append(backend)
+    if PypdfBackend not in chain:
+        chain.append(PypdfBackend)
+    return chain
+
+
+class DocumentExtractor:
+    """
+    Extracts the pages of one document with the configured backends.
+
+    The current backend is opened on the first page; after a failure the
+    document moves on to the next backend and stays there.
+    """
+
+    def __init__(self, pdf_reader: pypdf.PdfReader, names: Optional[str] = None) -> None:
+        self.pdf_reader = pdf_reader
+        self._chain = configured_backends(names)
+        self._document = None
+
+    @property
+    def backend(self) -> str:
+        """Name of the backend extracting the next page."""
+        return self._chain[0].name
+
+    def _fall_back(self, error: Exception, page_num: int) -> None:
+        failed = self._chain.pop(0)
+        logger.warning(f"PDF backend {failed.name} failed on page {page_num + 1} ({str(error)}), "
+                       f"falling back to {self.backend}")
+        metrics.increment("pdf_backend_fallbacks", backend=failed.name)
+        self._close_document(failed)
+
+    def _close_document(self, backend: type) -> None:
+        if self._document is not None:
+            try:
+                with backend.lock or nullcontext():
+                    backend.close(self._document)
+            except Exception as e:
+                logger.warning(f"Error closing PDF backend {backend.name}: {str(e)}")
+            self._document = None
+
+    def page_text(self, page_num: int) -> str:
+        """A page's text from the current backend, falling back until one succeeds; pypdf errors propagate."""
+        while True:
+            backend = self._chain[0]
+            try:
+                with backend.lock or nullcontext():
+                    if self._document is None:
+                        self._document = backend.open(self.pdf_reader)
+                    return backend.page_text(self._document, page_num)
+            except Exception as e:
+                if backend is PypdfBackend:
+                    raise
+                self._fall_back(e, page_num)
+
+    def close(self) -> None:
+        self._close_document(self._chain[0])
@@ -0,0 +1,120 @@
+import hashlib
+import threading
+from collections import OrderedDict
+from typing import Any, Dict, Optional, Tuple
+
+from pypdf import PageObject
+from pypdf.generic import ArrayObject, DictionaryObject, IndirectObject, StreamObject
+
+from app.core.config import get
+
+# Keys that never change a page's extracted text
+_IGNORED_KEYS = {"/Parent", "/Length"}
+_MAX_DEPTH = 32
+
+
+def _object_digest(obj: Any, memo: Dict[Tuple[int, int], bytes], depth: int = 0) -> bytes:
+    """
+    Digest a PDF object graph (fonts, encodings, form XObjects, ...).
+
+    ``memo`` caches digests of indirect objects so fonts shared by many pages of
+    a document are only hashed once, and breaks reference cycles.
+    """
+    if isinstance(obj, IndirectObject):
+        ref = (obj.idnum, obj.generation)
+        digest = memo.get(ref)
+        if digest is None:
+            memo[ref] = b"cycle"
+            digest = memo[ref] = _object_digest(obj.get_object(), memo, depth + 1)
+        return digest
+    if depth > _MAX_DEPTH:
+        return b"deep"
+
+    h = hashlib.sha256()
+    if isinstance(obj, StreamObject):
+        if obj.get("/Subtype") == "/Image":
+            # Pixels never affect extracted text
+            return b"image"
+        # The raw (possibly still encoded) bytes identify the stream without decoding it
+        h.update(b"S")
+        h.update(obj._data)
+    if isinstance(obj, DictionaryObject):
+        h.update(b"D")
+        for key in sorted(obj.keys()):
+            if key in _IGNORED_KEYS:
+                continue
+            h.update(key.encode("utf-8", "replace"))
+            h.update(_object_digest(obj.raw_get(key), memo, depth + 1))
+    elif isinstance(obj, ArrayObject):
+        h.update(b"A")
+        for item in obj:
+            h.update(_object_digest(item, memo, depth + 1))
+    else:
+        h.update(repr(obj).encode("utf-8", "replace"))
+    return h.digest()
+
+
+def page_fingerprint(page: PageObject, content_data: bytes, memo: Dict[Tuple[int, int], bytes]) -> str:
+    """
+    Key a page on its decoded content stream plus everything in its resources
+    that can change the extracted text.
+
+    Args:
+        page: The pypdf page
+        content_data: The page's decoded content stream
+        memo: Per-document digest memo shared by all pages of the document
+    """
+    h = hashlib.sha256(content_data)
+    h.update(_object_digest(page.raw_get("/Resources") if "/Resources" in page else None, memo))
+    h.update(str(page.get("/Rotate", 0)).encode())
+    return h.hexdigest()
+
+
+class PageTextCache:
+    """
+    Bounded, thread-safe LRU cache of extracted page text.
+
+    One instance is shared by every request in the worker process, including
+    extraction running in the threadpool. It is bounded both by entry count and
+    by the total number of cached characters.
+    """
+
+    def __init__(self, max_entries: int, max_chars: int):
+        self.max_entries = max_entries
+        self.max_chars = max_chars
+        self._entries: "OrderedDict[str, str]" = OrderedDict()
+        self._chars = 0
+        self._lock = threading.Lock()
+
+    def get(self, key: str) -> Optional[str]:
+        """Return the cached text for a page fingerprint, or None on a miss."""
+        with self._lock:
+            text = self._entries.get(key)
+            if text is not None:
+                self._entries.move_to_end(key)
+            return text
+
+    def put(self, key: str, text: str) -> None:
+        """Cache a page's text, evicting the least recently used pages as needed."""
+        if len(text) > self.max_chars:
+            return
+        with self._lock:
+            previous = self._entries.pop(key, None)
+            if previous is not None:
+                self._chars -= len(previous)
+            self._entries[key] = text
+            self._chars += len(text)
+            while len(self._entries) > self.max_entries or self._chars > self.max_chars:
+                _, evicted = self._entries.popitem(last=False)
+                self._chars -= len(evicted)
+
+    def stats(self) -> Dict[str, int]:
+        """Return the current size of the cache."""
+        with self._lock:
+            return {"entries": len(self._entries), "chars": self._chars}
+
+
+page_text_cache = PageTextCache(
+    max_entries=get("PDF_PAGE_CACHE_MAX_ENTRIES"),
+    max_chars=get("PDF_PAGE_CACHE_MAX_CHARS"),
+)
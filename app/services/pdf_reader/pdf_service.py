@@ -1,26 +1,258 @@
-import io
+import hashlib
 import logging
-from typing import Dict, Any, Optional
+import re
+import time
+from typing import Any, AsyncIterator, BinaryIO, Dict, Optional, Tuple
 
 import pypdf
 from fastapi import UploadFile, HTTPException
+from starlette.concurrency import run_in_threadpool
+
+from app.core import deadlines, metrics
+from app.core.config import get
+from app.services.pdf_reader.backends import DocumentExtractor
+from app.services.pdf_reader.page_cache import page_fingerprint, page_text_cache
+from app.services.pdf_reader.table_extraction import drop_repeated_header, extract_page_text
 
 logger = logging.getLogger(__name__)
 
+# A BT ... ET text object in a content stream means the page draws text
+TEXT_OBJECT_PATTERN = re.compile(rb"(?:^|[\s\]\)>])BT[\s/]")
+
+# Page classes that go through text extraction
+TEXT_PAGE_CLASSES = ("text", "mixed")
+
+# PDF_EXTRACTION_MODE values: pypdf's plain text, or tables detected and emitted as delimited rows
+EXTRACTION_MODES = ("plain", "tables")
+
 
 class PDFService:
     """Service for handling PDF operations like text extraction."""
     
     @staticmethod
-    async def extract_text_from_pdf(file: UploadFile) -> Dict[str, Any]:
+    def classify_page(page: pypdf.PageObject, content_data: Optional[bytes] = None) -> str:
+        """
+        Classify a page from its content stream and resources, without layout analysis.
+
+        Args:
+            page: The pypdf page to inspect
+            content_data: The page's decoded content stream, if already read
+
+        Returns:
+            "text" if the page draws text, "mixed" if it draws text and images,
+            "image" if it only paints image XObjects, or "empty" otherwise
+        """
+        has_image = False
+        has_form = False
+        resources = page.get("/Resources")
+        xobjects = resources.get_object().get("/XObject") if resources is not None else None
+        if xobjects is not None:
+            for xobject in xobjects.get_object().values():
+                subtype = xobject.get_object().get("/Subtype")
+                if subtype == "/Image":
+                    has_image = True
+                elif subtype == "/Form":
+                    has_form = True
+
+        if content_data is None:
+            content_data = PDFService._content_data(page)
+        has_text = TEXT_OBJECT_PATTERN.search(content_data) is not None
+
+        # Form XObjects can carry their own text, so they always go through extraction
+        if has_text or has_form:
+            return "mixed" if has_image else "text"
+        if has_image:
+            return "image"
+        return "empty"
+
+    @staticmethod
+    def _content_data(page: pypdf.PageObject) -> bytes:
+        """Return a page's decoded content stream, or b"" if it has none."""
+        contents = page.get_contents()
+        return contents.get_data() if contents is not None else b""
+
+    @staticmethod
+    def _process_page(
+        pdf_reader: pypdf.PdfReader,
+        page_num: int,
+        digest_memo: Dict[Tuple[int, int], bytes],
+        mode: str = "plain",
+        extractor: Optional[DocumentExtractor] = None
+    ) -> Tuple[str, str, str, Optional[bool]]:
+        """
+        Classify one page and, if it has text, extract it in the given
+        extraction mode. Plain text comes from the document's extraction
+        backend (see backends), or pypdf if there is none. Runs in a worker
+        thread.
+
+        Text for pages whose content and resources were seen before (in this or
+        any earlier document) comes from the shared page cache.
+
+        Returns:
+            (page class, page text, status, cache hit) where status is "extracted",
+            "cached", "skipped", "no_text" or "error", and cache hit is None if
+            the page cache was not consulted
+        """
+        page = pdf_reader.pages[page_num]
+
+        classify_started = time.perf_counter()
+        try:
+            content_data = PDFService._content_data(page)
+            page_class = PDFService.classify_page(page, content_data)
+        except Exception as e:
+            # If the page can't be inspected, let extraction have a go at it
+            logger.warning(f"Error classifying page {page_num + 1}: {str(e)}")
+            content_data = None
+            page_class = "text"
+        metrics.observe("pdf_classify_ms", (time.perf_counter() - classify_started) * 1000)
+        metrics.increment("pdf_pages", page_class=page_class)
+
+        if page_class not in TEXT_PAGE_CLASSES:
+            return page_class, "", "skipped", None
+
+        page_started = time.perf_counter()
+        cache_hit = None
+        try:
+            fingerprint = None
+            page_text = None
+            if content_data is not None:
+                fingerprint = page_fingerprint(page, content_data, digest_memo)
+                page_text = page_text_cache.get(PDFService._cache_key(fingerprint, mode, extractor))
+
+            cache_hit = page_text is not None
+            if cache_hit:
+                status = "cached"
+            elif mode == "tables":
+                status = "extracted"
+                page_text = extract_page_text(page)
+            elif extractor is not None:
+                status = "extracted"
+                page_text = extractor.page_text(page_num)
+            else:
+                status = "extracted"
+                page_text = page.extract_text() or ""
+            if not cache_hit and fingerprint is not None:
+                # Keyed by the backend that produced the text, which differs from the lookup after a fallback
+                page_text_cache.put(PDFService._cache_key(fingerprint, mode, extractor), page_text)
+
+            if not page_text:  # Some pages might not have extractable text
+                status = "no_text"
+        except Exception as e:
+            logger.warning(f"Error extracting text from page {page_num + 1}: {str(e)}")
+            page_text = ""
+            status = "error"
+        backend = extractor.backend if extractor is not None and mode == "plain" else "pypdf"
+        metrics.observe("pdf_page_extract_ms", (time.perf_counter() - page_started) * 1000,
+                        page_class=page_class, mode=mode, backend=backend)
+        return page_class, page_text, status, cache_hit
+
+    @staticmethod
+    def _cache_key(fingerprint: str, mode: str, extractor: Optional[DocumentExtractor]) -> str:
+        """Page cache key: backends and modes extract different text from the same page."""
+        if mode != "plain":
+            return f"{fingerprint}:{mode}"
+        if extractor is not None and extractor.backend != "pypdf":
+            return f"{fingerprint}:{extractor.backend}"
+        return fingerprint
+
+    @staticmethod
+    async def iter_pages(
+        pdf_reader: pypdf.PdfReader,
+        report: Optional[Dict[str, Any]] = None,
+        mode: Optional[str] = None,
+        backends: Optional[str] = None
+    ) -> AsyncIterator[Tuple[int, str, str]]:
+        """
+        Yield ``(page_number, text, status)`` for every page as it is extracted.
+
+        Each page is classified and extracted in the threadpool, one page at a
+        time, so consumers (chunkers, hashers, progress reporting) can process a
+        page while the next one is read. Pages are numbered from 1. Image-only and
+        empty pages are yielded with status "skipped" and empty text.
+
+        Args:
+            pdf_reader: The document to read
+            report: Optional dict that is filled with the per-page report
+                ("pages") and page cache stats ("page_cache") as pages are read
+            mode: "plain" or "tables" (see table_extraction); defaults to
+                PDF_EXTRACTION_MODE
+            backends: Comma-separated extraction backends for plain text (see
+                backends); defaults to PDF_EXTRACTION_BACKENDS. The backend that
+                extracted the last page is reported as "backend".
+
+        Raises:
+            HTTPException: After the last page, if the document had no text pages,
+                or before a page once the request's deadline has passed
+        """
+        if report is None:
+            report = {}
+        mode = mode or get("PDF_EXTRACTION_MODE")
+        if mode not in EXTRACTION_MODES:
+            raise ValueError(f"Unknown PDF extraction mode: {mode}")
+        pages = report.setdefault("pages", [])
+        page_cache = report.setdefault("page_cache", {"hits": 0, "misses": 0, "hit_rate": 0.0})
+        digest_memo: Dict[Tuple[int, int], bytes] = {}
+        has_text_page = False
+        extractor = DocumentExtractor(pdf_reader, backends) if mode == "plain" else None
+        report["backend"] = extractor.backend if extractor is not None else "pypdf"
+
+        try:
+            for page_num in range(len(pdf_reader.pages)):
+                deadlines.check("pdf_parse")
+                page_class, page_text, status, cache_hit = await run_in_threadpool(
+                    PDFService._process_page, pdf_reader, page_num, digest_memo, mode, extractor
+                )
+                has_text_page = has_text_page or page_class in TEXT_PAGE_CLASSES
+                pages.append({"page": page_num + 1, "class": page_class, "status": status})
+                if extractor is not None:
+                    report["backend"] = extractor.backend
+                if cache_hit is not None:
+                    page_cache["hits" if cache_hit else "misses"] += 1
+                    metrics.increment("pdf_page_cache_hits" if cache_hit else "pdf_page_cache_misses")
+                    lookups = page_cache["hits"] + page_cache["misses"]
+                    page_cache["hit_rate"] = round(page_cache["hits"] / lookups, 3)
+
+                yield page_num + 1, page_text, status
+        finally:
+            if extractor is not None:
+                extractor.close()
+
+        if not has_text_page:
+            # Nothing was extracted: image-only pages never reach extract_text
+            metrics.increment("pdf_rejected_no_text")
+            raise HTTPException(
+                status_code=422,
+                detail="Could not extract text from PDF. The file may be scanned or contain only images."
+            )
+
+    @staticmethod
+    async def extract_text_from_pdf(
+        file: UploadFile,
+        mode: Optional[str] = None,
+        backends: Optional[str] = None
+    ) -> Dict[str, Any]:
         """
         Extract text from a PDF file.
+
+        A thin wrapper around iter_pages that joins the page texts. Pages are
+        classified first (see classify_page); image-only and empty pages are
+        skipped, and a document with no text pages is rejected. Pages already
+        seen in earlier uploads are served from the shared page text cache.
+        In tables mode, a table header repeated at the top of a page is dropped
+        (see drop_repeated_header). The PDF is read from the upload's spooled
+        file rather than copied into memory.
         
         Args:
             file: The uploaded PDF file
+            mode: Extraction mode, "plain" or "tables"; defaults to PDF_EXTRACTION_MODE
+            backends: Extraction backends for plain text; defaults to PDF_EXTRACTION_BACKENDS
             
         Returns:
-            Dict containing the extracted text, filename, and page count
+            Dict containing the extracted text, filename, page count, the
+            SHA-256 of the file contents, a per-page report of each page's
+            class and extraction status, the page cache hit rate, the
+            extraction backend used and the document metadata (None if there
+            is none)
             
         Raises:
             HTTPException: If the file is not a PDF or text extraction fails
@@ -29,25 +261,26 @@ class PDFService:
             raise HTTPException(status_code=400, detail="Only PDF files are allowed")
         
         try:
-            # Read the uploaded file
-            contents = await file.read()
-            
-            # Extract text from PDF
-            pdf_reader = pypdf.PdfReader(io.BytesIO(contents))
+            await file.seek(0)
+            sha256 = await run_in_threadpool(PDFService._hash_stream, file.file)
+            pdf_reader = await run_in_threadpool(pypdf.PdfReader, file.file)
             
             # Get total page count
             page_count = len(pdf_reader.pages)
-            
-            # Extract text from each page
-            full_text = ""
-            for page_num in range(page_count):
-                try:
-                    page_text = pdf_reader.pages[page_num].extract_text()
-                    if page_text:  # Some pages might not have extractable text
-                        full_text += f"--- Page {page_num + 1} ---\n{page_text}\n\n"
-                except Exception as e:
-                    logger.warning(f"Error extracting text from page {page_num + 1}: {str(e)}")
-                    full_text += f"--- Page {page_num + 1} ---\n[Error extracting text from this page]\n\n"
+
+            report: Dict[str, Any] = {}
+            text_parts = []
+            tables_mode = (mode or get("PDF_EXTRACTION_MODE")) == "tables"
+            table_header = None
+            async for page_number, page_text, status in PDFService.iter_pages(pdf_reader, report, mode, backends):
+                if page_text and tables_mode:
+                    # Pages are extracted (and cached) on their own; a table's header is only needed once
+                    page_text, table_header = drop_repeated_header(page_text, table_header)
+                if status == "error":
+                    text_parts.append(f"--- Page {page_number} ---\n[Error extracting text from this page]\n\n")
+                elif page_text:
+                    text_parts.append(f"--- Page {page_number} ---\n{page_text}\n\n")
+            full_text = "".join(text_parts)
             
             # Check if we got any text
             if not full_text.strip():
@@ -55,6 +288,11 @@ class PDFService:
                     status_code=422, 
                     detail="Could not extract text from PDF. The file may be scanned or contain only images."
                 )
+
+            skipped = sum(1 for page in report["pages"] if page["status"] == "skipped")
+            if skipped:
+                logger.info(f"Skipped {skipped} of {page_count} pages with no text content")
+            logger.info(f"Page cache for {file.filename}: {report['page_cache']}")
             
             # Rewind the file for potential future use
             await file.seek(0)
@@ -62,7 +300,12 @@ class PDFService:
             return {
                 "filename": file.filename,
                 "text": full_text,
-                "page_count": page_count
+                "page_count": page_count,
+                "sha256": sha256,
+                "pages": report["pages"],
+                "page_cache": report["page_cache"],
+                "backend": report["backend"],
+                "metadata": PDFService._metadata_dict(pdf_reader)
             }
             
         except HTTPException:
@@ -71,6 +314,29 @@ class PDFService:
         except Exception as e:
             logger.error(f"Error processing PDF: {str(e)}")
             raise HTTPException(status_code=500, detail=f"Error processing PDF: {str(e)}")
+
+    @staticmethod
+    def _metadata_dict(pdf_reader: pypdf.PdfReader) -> Optional[Dict[str, str]]:
+        """A PDF's document information as a dict with string values, or None if it has none."""
+        try:
+            metadata = pdf_reader.metadata
+        except Exception as e:
+            logger.warning(f"Error extracting PDF metadata: {str(e)}")
+            return None
+        if not metadata:
+            return None
+        # Drop the leading slash from keys
+        return {key[1:] if key.startswith('/') else key: str(value) for key, value in metadata.items()}
+
+    @staticmethod
+    def _hash_stream(stream: BinaryIO) -> str:
+        """SHA-256 of a file object's contents, read in blocks; leaves it rewound."""
+        h = hashlib.sha256()
+        stream.seek(0)
+        for block in iter(lambda: stream.read(1024 * 1024), b""):
+            h.update(block)
+        stream.seek(0)
+        return h.hexdigest()
     
     @staticmethod
     async def get_pdf_metadata(file: UploadFile) -> Optional[Dict[str, Any]]:
@@ -84,26 +350,13 @@ class PDFService:
             Dict containing metadata or None if extraction fails
         """
         try:
-            # Read the uploaded file
-            contents = await file.read()
-            
-            # Get PDF metadata
-            pdf_reader = pypdf.PdfReader(io.BytesIO(contents))
-            metadata = pdf_reader.metadata
+            await file.seek(0)
+            pdf_reader = await run_in_threadpool(pypdf.PdfReader, file.file)
+            meta_dict = PDFService._metadata_dict(pdf_reader)
             
             # Rewind the file for potential future use
             await file.seek(0)
-            
-            if metadata:
-                # Convert metadata to a regular dict with string values
-                meta_dict = {}
-                for key, value in metadata.items():
-                    if key.startswith('/'):
-                        key = key[1:]  # Remove leading slash from keys
-                    meta_dict[key] = str(value)
-                return meta_dict
-            
-            return None
+            return meta_dict
             
         except Exception as e:
             logger.warning(f"Error extracting PDF metadata: {str(e)}")
@@ -0,0 +1,145 @@
+"""
+Table-aware page extraction.
+
+Ownership reports, EEO public file reports and EAS logs are mostly tables, and
+plain extraction flattens each row into one run of words, losing which value
+belongs to which column. Here the page is extracted with pypdf's layout mode,
+which places text by its position on the page, and blocks of consecutive
+lines whose cells line up in the same columns are emitted as compact
+``a|b|c`` rows, the first row being the header. Everything else is emitted as
+plain lines with runs of layout whitespace collapsed. A delimiter takes the
+place of the space between cells, and a header repeated at the top of each
+page of a long table is only kept the first time (see drop_repeated_header),
+so a document costs no more tokens than its plain text.
+"""
+import re
+from typing import List, Optional, Tuple
+
+import pypdf
+
+from app.core import metrics
+
+# A table needs a header and at least this many rows in total
+TABLE_MIN_ROWS = 3
+# Narrower blocks are only tables under a header of column titles; "Label:   value" lines are a form
+TABLE_MIN_COLUMNS = 3
+
+# Words within a cell are at most two spaces apart in the layout text; wider gaps separate cells
+_CELL = re.compile(r"\S+(?: {1,2}\S+)*")
+_WHITESPACE = re.compile(r"\s+")
+
+CELL_DELIMITER = "|"
+
+Cells = List[Tuple[int, str]]
+
+
+def split_cells(line: str) -> Cells:
+    """The cells of a layout-mode line, as (start column, text) pairs."""
+    return [(match.start(), match.group()) for match in _CELL.finditer(line)]
+
+
+def _column_slots(cells: Cells, columns: List[int]) -> Optional[List[int]]:
+    """Map the cells of a row with empty cells to table columns, or None if they do not line up."""
+    if len(cells) < 2 or len(cells) > len(columns):
+        return None
+    tolerance = max(4, min(b - a for a, b in zip(columns, columns[1:])) // 3)
+    slots = []
+    for start, _ in cells:
+        slot = min(range(len(columns)), key=lambda i: abs(columns[i] - start))
+        if abs(columns[slot] - start) > tolerance or (slots and slot <= slots[-1]):
+            return None
+        slots.append(slot)
+    return slots
+
+
+def _is_table_header(cells: Cells) -> bool:
+    """Whether a line can head a table: enough columns, or column titles rather than a form label."""
+    return len(cells) >= TABLE_MIN_COLUMNS or (len(cells) >= 2 and not any(text.endswith(":") for _, text in cells))
+
+
+def compact_layout_text(layout_text: str) -> Tuple[str, int]:
+    """
+    Turn layout-mode page text into compact text with delimited table rows.
+
+    A table starts at a line of three or more cells, or of two cells neither
+    of which ends with a colon (a "Label:   value" line is a form field, not
+    a header), and continues through lines with the same number of cells.
+    Lines with fewer cells (empty cells) belong to it if their cells line up
+    with the previous full row; layout columns drift by a few characters
+    along a line, so alignment is only checked against nearby rows.
+
+    Returns:
+        (text, number of tables found)
+    """
+    lines = layout_text.splitlines()
+    out: List[str] = []
+    tables = 0
+    i = 0
+    while i < len(lines):
+        header = split_cells(lines[i])
+        if _is_table_header(header):
+            width = len(header)
+            columns = [start for start, _ in header]
+            rows = [[text for _, text in header]]
+            j = i + 1
+            while j < len(lines):
+                if not lines[j].strip():
+                    j += 1
+                    continue
+                cells = split_cells(lines[j])
+                if len(cells) == width:
+                    columns = [start for start, _ in cells]
+                    rows.append([text for _, text in cells])
+                else:
+                    slots = _column_slots(cells, columns)
+                    if slots is None:
+                        break
+                    row = [""] * width
+                    for slot, (_, text) in zip(slots, cells):
+                        row[slot] = text
+                    rows.append(row)
+                j += 1
+            if len(rows) >= TABLE_MIN_ROWS:
+                out.extend(CELL_DELIMITER.join(row) for row in rows)
+                tables += 1
+                i = j
+                continue
+        line = _WHITESPACE.sub(" ", lines[i]).strip()
+        if line:
+            out.append(line)
+        i += 1
+    return "\n".join(out), tables
+
+
+def drop_repeated_header(page_text: str, previous_header: Optional[str]) -> Tuple[str, Optional[str]]:
+    """
+    Drop the header row of a page's first table if it repeats the header of
+    the previous page's last table, as continuation pages of a long table do.
+
+    Returns:
+        (page text, header of the page's last table, else ``previous_header``)
+    """
+    lines = page_text.split("\n")
+    starts = [i for i, line in enumerate(lines)
+              if CELL_DELIMITER in line and (i == 0 or CELL_DELIMITER not in lines[i - 1])]
+    if not starts:
+        return page_text, previous_header
+    last_header = lines[starts[-1]]
+    if previous_header is not None and lines[starts[0]] == previous_header:
+        del lines[starts[0]]
+        metrics.increment("pdf_table_headers_dropped")
+    return "\n".join(lines), last_header
+
+
+def extract_page_text(page: pypdf.PageObject) -> str:
+    """Extract a page's text with its tables as delimited rows; falls back to plain extraction."""
+    try:
+        layout_text = page.extract_text(extraction_mode="layout")
+    except Exception:
+        # Layout mode is stricter about fonts than plain extraction
+        metrics.increment("pdf_layout_fallbacks")
+        return page.extract_text() or ""
+    text, tables = compact_layout_text(layout_text or "")
+    if tables:
+        metrics.increment("pdf_tables", tables)
+    return text
@@ -0,0 +1,2 @@
+from .scan_history_service import ScanHistoryService  # noqa
+from .scan_export import ScanExportService  # noqa
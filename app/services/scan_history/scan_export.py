@@ -0,0 +1,137 @@
+import csv
+import io
+import time
+from datetime import date, datetime, time as dtime, timedelta
+from typing import Any, Iterator, List, Optional, Sequence
+
+import orjson
+from sqlalchemy import Select, select
+
+from app.core import metrics
+from app.core.config import get
+from app.core.logging import log_info
+from app.db.database import SessionLocal
+from app.models.scan_result import ScanResult
+
+EXPORT_FORMATS = ("ndjson", "csv")
+
+# Stored columns exported for every scan, in CSV column order
+EXPORT_COLUMNS = (
+    "document_id", "document_name", "document_hash", "org_name", "model", "prompt_version",
+    "compliance_score", "compliance_status", "reused_from", "created_at",
+)
+
+# Detailed report fields added as CSV columns; NDJSON rows carry the whole response
+CSV_REPORT_FIELDS = ("summary_of_findings", "specific_issues", "recommendations", "section_scores")
+
+
+class ScanExportService:
+    """
+    Streaming export of stored scans as NDJSON or CSV.
+
+    Rows are read in insertion (id) order through a server-side cursor,
+    EXPORT_BATCH_SIZE at a time, and written out batch by batch, so memory use
+    does not grow with the size of the export. Every row carries a ``cursor``,
+    its row id; passing the last one received as ``after`` resumes the export
+    after that row (a keyset on the primary key, not an offset), even if new
+    scans were stored in the meantime.
+    """
+
+    @staticmethod
+    def build_query(
+        org_name: Optional[str] = None,
+        statuses: Optional[Sequence[str]] = None,
+        min_score: Optional[int] = None,
+        max_score: Optional[int] = None,
+        start: Optional[date] = None,
+        end: Optional[date] = None,
+        after: Optional[int] = None,
+        scope: Optional[Any] = None,
+    ) -> Select:
+        """
+        The export query: scans in the scope (see ScanHistoryService.scope)
+        matching the filters, oldest first, after the cursor row if given.
+        """
+        query = select(
+            ScanResult.id, *(getattr(ScanResult, column) for column in EXPORT_COLUMNS), ScanResult.response
+        )
+        if scope is not None:
+            query = query.where(scope)
+        if org_name is not None:
+            query = query.where(ScanResult.org_name == org_name)
+        if statuses:
+            query = query.where(ScanResult.compliance_status.in_(statuses))
+        if min_score is not None:
+            query = query.where(ScanResult.compliance_score >= min_score)
+        if max_score is not None:
+            query = query.where(ScanResult.compliance_score <= max_score)
+        if start is not None:
+            query = query.where(ScanResult.created_at >= datetime.combine(start, dtime.min))
+        if end is not None:
+            # Inclusive day range
+            query = query.where(ScanResult.created_at < datetime.combine(end + timedelta(days=1), dtime.min))
+        if after is not None:
+            query = query.where(ScanResult.id > after)
+        return query.order_by(ScanResult.id)
+
+    @staticmethod
+    def _batches(query: Select) -> Iterator[List[Any]]:
+        # The stream outlives the request's session, so it reads with its own
+        db = SessionLocal()
+        try:
+            result = db.execute(query.execution_options(yield_per=get("EXPORT_BATCH_SIZE")))
+            for batch in result.partitions():
+                yield batch
+        finally:
+            db.close()
+
+    @staticmethod
+    def _record(row: Any) -> dict:
+        record = {column: getattr(row, column) for column in EXPORT_COLUMNS}
+        record["created_at"] = row.created_at.isoformat()
+        record["cursor"] = row.id
+        return record
+
+    @staticmethod
+    def _ndjson(rows: List[Any]) -> bytes:
+        return b"".join(
+            orjson.dumps({**ScanExportService._record(row), "response": row.response}) + b"\n" for row in rows
+        )
+
+    @staticmethod
+    def _csv(rows: List[Any], header: bool) -> bytes:
+        out = io.StringIO()
+        writer = csv.writer(out)
+        if header:
+            writer.writerow(("cursor",) + EXPORT_COLUMNS + CSV_REPORT_FIELDS)
+        for row in rows:
+            record = ScanExportService._record(row)
+            report = ((row.response or {}).get("document") or {}).get("detailedReport") or {}
+            writer.writerow(
+                [record["cursor"]]
+                + [record[column] for column in EXPORT_COLUMNS]
+                + [orjson.dumps(report.get(field)).decode() if field == "section_scores" else report.get(field)
+                   for field in CSV_REPORT_FIELDS]
+            )
+        return out.getvalue().encode("utf-8")
+
+    @staticmethod
+    def stream(query: Select, export_format: str) -> Iterator[bytes]:
+        """Yield the export body one batch of rows at a time."""
+        started = time.perf_counter()
+        rows = 0
+        if export_format == "csv":
+            # The header goes out even if nothing matches
+            yield ScanExportService._csv([], header=True)
+        try:
+            for batch in ScanExportService._batches(query):
+                rows += len(batch)
+                if export_format == "ndjson":
+                    yield ScanExportService._ndjson(batch)
+                else:
+                    yield ScanExportService._csv(batch, header=False)
+        finally:
+            elapsed_ms = (time.perf_counter() - started) * 1000
+            metrics.increment("scan_export_rows", rows, format=export_format)
+            metrics.observe("scan_export_ms", elapsed_ms, format=export_format)
+            log_info(f"Exported {rows} scans as {export_format} in {elapsed_ms:.0f} ms")
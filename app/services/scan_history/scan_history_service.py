@@ -0,0 +1,131 @@
+import hashlib
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+from sqlalchemy import or_
+from sqlalchemy.orm import Session
+
+from app.core.logging import log_info, log_exception
+from app.models.scan_result import ScanResult
+from app.models.user import User
+from app.schemas.compliance_scan import ComplianceScanResponse
+from app.services.org_profiles import OrgProfileService
+
+
+class ScanHistoryService:
+    """Service for persisting compliance scan results and reading them back."""
+
+    @staticmethod
+    def hash_document(contents: bytes) -> str:
+        """Return the hex SHA-256 used to identify a document."""
+        return hashlib.sha256(contents).hexdigest()
+
+    @staticmethod
+    def org_name_from_context(user_context: Optional[Dict[str, Any]]) -> Optional[str]:
+        """Pull the organization name out of a scan's user context, if present."""
+        if not isinstance(user_context, dict):
+            return None
+        organization = user_context.get("organization")
+        if isinstance(organization, dict) and organization.get("name"):
+            return str(organization["name"])
+        if user_context.get("name"):
+            return str(user_context["name"])
+        return None
+
+    @staticmethod
+    def record_scan(
+        db: Session,
+        result: ComplianceScanResponse,
+        document_hash: str,
+        org_name: Optional[str] = None,
+        model: Optional[str] = None,
+        prompt_version: Optional[str] = None,
+        context_hash: Optional[str] = None,
+        timings: Optional[Dict[str, float]] = None,
+        minhash: Optional[np.ndarray] = None,
+        reused_from: Optional[str] = None,
+        org_profile_id: Optional[int] = None,
+        user_id: Optional[int] = None,
+    ) -> Optional[ScanResult]:
+        """
+        Store a scan result, with the document's MinHash signature and context
+        hash (see NearDuplicateService.context_hash) if it has them, and the
+        document id of the scan it was reused from, if any. The registered
+        profile the scan used and the signed-in user who ran it decide who can
+        read it back (see scope).
+
+        Persisting history must never fail the scan itself, so database errors are
+        logged and swallowed.
+
+        Returns:
+            The stored row, or None if it could not be saved
+        """
+        document = result.document
+        scan_result = ScanResult(
+            document_id=document.id,
+            document_name=document.name,
+            document_hash=document_hash,
+            org_name=org_name,
+            context_hash=context_hash,
+            model=model,
+            prompt_version=prompt_version,
+            compliance_score=document.detailedReport.compliance_score,
+            compliance_status=document.complianceStatus,
+            response=result.model_dump(),
+            timings={key: round(value, 1) for key, value in (timings or {}).items()},
+            minhash=minhash.tobytes() if minhash is not None else None,
+            reused_from=reused_from,
+            org_profile_id=org_profile_id,
+            user_id=user_id,
+        )
+        try:
+            db.add(scan_result)
+            db.commit()
+            db.refresh(scan_result)
+            log_info(f"Stored scan result {document.id} for org {org_name or 'Unknown'}")
+            return scan_result
+        except Exception as e:
+            db.rollback()
+            log_exception(e, "ScanHistoryService.record_scan")
+            return None
+
+    @staticmethod
+    def scope(db: Session, user: User) -> Optional[Any]:
+        """
+        The scans a user may read, as a filter: those run with a profile they
+        registered, and those they ran themselves. None for superusers, who
+        may read every scan.
+        """
+        if user.is_superuser:
+            return None
+        return or_(
+            ScanResult.org_profile_id.in_(OrgProfileService.owned_ids(db, user)),
+            ScanResult.user_id == user.id,
+        )
+
+    @staticmethod
+    def list_scans(
+        db: Session,
+        org_name: Optional[str] = None,
+        document_hash: Optional[str] = None,
+        skip: int = 0,
+        limit: int = 100,
+        scope: Optional[Any] = None,
+    ) -> List[ScanResult]:
+        """List stored scans in a scope, newest first, optionally filtered by org or document hash."""
+        query = db.query(ScanResult)
+        if scope is not None:
+            query = query.filter(scope)
+        if org_name is not None:
+            query = query.filter(ScanResult.org_name == org_name)
+        if document_hash is not None:
+            query = query.filter(ScanResult.document_hash == document_hash)
+        return query.order_by(ScanResult.created_at.desc(), ScanResult.id.desc()).offset(skip).limit(limit).all()
+
+    @staticmethod
+    def get_scan(db: Session, document_id: str, scope: Optional[Any] = None) -> Optional[ScanResult]:
+        """Get a stored scan in a scope by the document id returned in the scan response."""
+        query = db.query(ScanResult).filter(ScanResult.document_id == document_id)
+        if scope is not None:
+            query = query.filter(scope)
+        return query.first()
@@ -0,0 +1 @@
+from .token_usage_service import TokenUsageService  # noqa
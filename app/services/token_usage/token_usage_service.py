@@ -0,0 +1,245 @@
+import json
+from datetime import date, datetime, timezone
+from typing import Callable, Dict, List, Optional
+
+from fastapi import HTTPException
+from sqlalchemy import func
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+
+from app.core import metrics
+from app.core.config import get
+from app.core.logging import log_info, log_warning, log_exception
+from app.models.token_usage import TokenUsageDaily
+from app.models.user import User
+from app.services.org_profiles.org_profile_service import (ANONYMOUS_ACCOUNT, USER_ACCOUNT_PREFIX, OrgProfileService,
+                                                          ResolvedProfile)
+
+UNKNOWN_ORG = "Unknown"
+
+
+class TokenUsageService:
+    """Service for per-organization LLM token accounting and daily token budgets."""
+
+    @staticmethod
+    def today() -> date:
+        """The UTC day that usage is rolled up under."""
+        return datetime.now(timezone.utc).date()
+
+    @staticmethod
+    def usage_account(org_profile: Optional[ResolvedProfile], user: Optional[User]) -> str:
+        """
+        The account a scan's tokens are charged to, and its budget checked
+        against: the registered profile it used (resolved and owner-checked),
+        else the signed-in user, else all anonymous traffic together. Never the
+        organization name in the request's context, which anyone can choose.
+        """
+        if org_profile is not None:
+            return org_profile.name
+        if user is not None:
+            return f"{USER_ACCOUNT_PREFIX}{user.username}"
+        return ANONYMOUS_ACCOUNT
+
+    @staticmethod
+    def readable_accounts(db: Session, user: User) -> Optional[List[str]]:
+        """
+        The usage accounts a user may read: the profiles they registered and
+        their own scans without a profile. None for superusers, who may read
+        every account.
+        """
+        if user.is_superuser:
+            return None
+        return OrgProfileService.owned_names(db, user) + [f"{USER_ACCOUNT_PREFIX}{user.username}"]
+
+    @staticmethod
+    def daily_budget(org_profile: Optional[ResolvedProfile]) -> int:
+        """
+        The daily token budget of an account: the registered profile's budget
+        if it has one, else ORG_DAILY_TOKEN_BUDGET. 0 means unlimited.
+        """
+        if org_profile is not None and org_profile.daily_token_budget is not None:
+            return org_profile.daily_token_budget
+        return get("ORG_DAILY_TOKEN_BUDGET")
+
+    @staticmethod
+    def tokens_used_today(db: Session, account: str) -> int:
+        """Total tokens an account has used today, across models."""
+        used = (
+            db.query(func.coalesce(func.sum(TokenUsageDaily.total_tokens), 0))
+            .filter(TokenUsageDaily.org_name == account, TokenUsageDaily.day == TokenUsageService.today())
+            .scalar()
+        )
+        return int(used)
+
+    @staticmethod
+    def check_budget(
+        db: Session,
+        account: str,
+        org_profile: Optional[ResolvedProfile],
+        estimate_tokens: Callable[[], int],
+        pending_tokens: int = 0,
+    ) -> int:
+        """
+        Refuse a scan before the model is called if it would take the account
+        over its daily token budget. Blocking (a query and a tokenizer pass);
+        call it from the threadpool.
+
+        Args:
+            account: The usage account the scan is charged to (see usage_account)
+            org_profile: The resolved profile the scan uses, for its budget
+            estimate_tokens: Estimates the prompt tokens of the upcoming call;
+                only called when the account has a budget
+            pending_tokens: Estimated tokens of work already accepted for the
+                account but not yet recorded (e.g. queued batch scans)
+
+        Returns:
+            The estimated tokens of this call, 0 if the budget is unlimited
+
+        Raises:
+            HTTPException: 429 if the budget is used up or the call would exceed it
+        """
+        budget = TokenUsageService.daily_budget(org_profile)
+        if budget <= 0:
+            return 0
+        estimated_tokens = estimate_tokens()
+        used = TokenUsageService.tokens_used_today(db, account) + pending_tokens
+        if used + estimated_tokens > budget:
+            metrics.increment("llm_budget_rejections")
+            log_warning(f"Token budget exceeded for {account}: {used} used + ~{estimated_tokens} estimated > {budget}")
+            raise HTTPException(
+                status_code=429,
+                detail={
+                    "message": "Daily token budget exceeded for this account",
+                    "budget": budget,
+                    "used": used,
+                    "estimated": estimated_tokens,
+                },
+                headers={"Retry-After": str(TokenUsageService._seconds_until_tomorrow())},
+            )
+        return estimated_tokens
+
+    @staticmethod
+    def _seconds_until_tomorrow() -> int:
+        now = datetime.now(timezone.utc)
+        midnight = datetime.combine(now.date(), datetime.min.time(), tzinfo=timezone.utc)
+        return max(1, int(86400 - (now - midnight).total_seconds()))
+
+    @staticmethod
+    def record_call(
+        db: Session,
+        account: Optional[str],
+        document_type: str,
+        model: str,
+        usage: Dict[str, int],
+        cost_usd: float,
+        latency_ms: float,
+    ) -> None:
+        """
+        Account for one model call: a structured log line, metrics by document
+        type, and the daily rollup row of the usage account (see usage_account).
+
+        Accounting must never fail the scan itself, so database errors are
+        logged and swallowed.
+        """
+        org_name = account or UNKNOWN_ORG
+        log_info("LLM usage " + json.dumps({
+            "org": org_name,
+            "document_type": document_type,
+            "model": model,
+            **usage,
+            "cost_usd": round(cost_usd, 6),
+            "latency_ms": round(latency_ms, 1),
+        }))
+        # Not labelled by org: names can come from anonymous requests, and every label value is
+        # a series kept for the life of the worker. Per-org numbers are in the daily rollup.
+        for key in ("prompt_tokens", "completion_tokens", "cached_tokens", "total_tokens"):
+            metrics.increment(f"llm_{key}", usage[key], document_type=document_type)
+        metrics.increment("llm_cost_usd_total", cost_usd, document_type=document_type)
+
+        try:
+            TokenUsageService._add_to_rollup(db, org_name, model, usage, cost_usd, latency_ms)
+        except Exception as e:
+            db.rollback()
+            log_exception(e, "TokenUsageService.record_call")
+
+    @staticmethod
+    def _add_to_rollup(
+        db: Session,
+        org_name: str,
+        model: str,
+        usage: Dict[str, int],
+        cost_usd: float,
+        latency_ms: float,
+    ) -> None:
+        """
+        Add a call to the (org, day, model) row with an in-database increment,
+        so concurrent workers never lose each other's updates.
+        """
+        day = TokenUsageService.today()
+        key = (
+            TokenUsageDaily.org_name == org_name,
+            TokenUsageDaily.day == day,
+            TokenUsageDaily.model == model,
+        )
+        increments = {
+            TokenUsageDaily.calls: TokenUsageDaily.calls + 1,
+            TokenUsageDaily.prompt_tokens: TokenUsageDaily.prompt_tokens + usage["prompt_tokens"],
+            TokenUsageDaily.completion_tokens: TokenUsageDaily.completion_tokens + usage["completion_tokens"],
+            TokenUsageDaily.cached_tokens: TokenUsageDaily.cached_tokens + usage["cached_tokens"],
+            TokenUsageDaily.total_tokens: TokenUsageDaily.total_tokens + usage["total_tokens"],
+            TokenUsageDaily.cost_usd: TokenUsageDaily.cost_usd + cost_usd,
+            TokenUsageDaily.llm_ms: TokenUsageDaily.llm_ms + latency_ms,
+        }
+
+        for _ in range(2):
+            if db.query(TokenUsageDaily).filter(*key).update(increments, synchronize_session=False):
+                db.commit()
+                return
+            db.add(TokenUsageDaily(
+                org_name=org_name,
+                day=day,
+                model=model,
+                calls=1,
+                prompt_tokens=usage["prompt_tokens"],
+                completion_tokens=usage["completion_tokens"],
+                cached_tokens=usage["cached_tokens"],
+                total_tokens=usage["total_tokens"],
+                cost_usd=cost_usd,
+                llm_ms=latency_ms,
+            ))
+            try:
+                db.commit()
+                return
+            except IntegrityError:
+                # Another worker created the row first; retry as an update
+                db.rollback()
+
+    @staticmethod
+    def list_usage(
+        db: Session,
+        org_name: Optional[str] = None,
+        start: Optional[date] = None,
+        end: Optional[date] = None,
+        skip: int = 0,
+        limit: int = 100,
+        accounts: Optional[List[str]] = None,
+    ) -> List[TokenUsageDaily]:
+        """
+        List daily usage rows of the given accounts (all if None), newest day
+        first, optionally filtered by org and day range.
+        """
+        query = db.query(TokenUsageDaily)
+        if accounts is not None:
+            query = query.filter(TokenUsageDaily.org_name.in_(accounts))
+        if org_name is not None:
+            query = query.filter(TokenUsageDaily.org_name == org_name)
+        if start is not None:
+            query = query.filter(TokenUsageDaily.day >= start)
+        if end is not None:
+            query = query.filter(TokenUsageDaily.day <= end)
+        return (
+            query.order_by(TokenUsageDaily.day.desc(), TokenUsageDaily.org_name, TokenUsageDaily.model)
+            .offset(skip)
+            .limit(limit)
+            .all()
+        )
@@ -0,0 +1,2 @@
+from .chunked_upload_service import ChunkedUploadService  # noqa
+from .zip_archive_service import ZipArchiveService  # noqa
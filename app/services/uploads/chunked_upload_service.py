@@ -0,0 +1,301 @@
+import fcntl
+import hashlib
+import json
+import os
+import re
+import time
+import uuid
+from contextlib import contextmanager
+from typing import Any, Dict, Iterator, Optional, Tuple
+
+from fastapi import HTTPException
+
+from app.core import memory
+from app.core.config import get
+from app.core.logging import log_info, log_warning
+
+UPLOAD_ID_PATTERN = re.compile(r"^[0-9a-f]{32}$")
+
+
+class ChunkedUploadService:
+    """
+    Resumable chunked uploads stored in server-side temp files.
+
+    Each upload is a ``<id>.part`` data file plus a ``<id>.json`` state file in
+    UPLOAD_TMP_DIR. State lives on disk (not in memory) and every change happens
+    under an flock, so chunks for the same upload may land on any gunicorn worker.
+    These methods do blocking file I/O; call them from the threadpool.
+
+    Each upload records the caller that started it, and a caller may only have
+    UPLOAD_MAX_ACTIVE_PER_CALLER unfinished uploads totalling
+    UPLOAD_MAX_ACTIVE_BYTES_PER_CALLER at a time, so anonymous clients cannot
+    fill the disk.
+    """
+
+    @staticmethod
+    def _upload_dir() -> str:
+        upload_dir = get("UPLOAD_TMP_DIR")
+        os.makedirs(upload_dir, exist_ok=True)
+        return upload_dir
+
+    @staticmethod
+    def _path(upload_id: str, suffix: str) -> str:
+        if not UPLOAD_ID_PATTERN.match(upload_id):
+            raise HTTPException(status_code=404, detail="Upload not found")
+        return os.path.join(ChunkedUploadService._upload_dir(), f"{upload_id}.{suffix}")
+
+    @staticmethod
+    @contextmanager
+    def _locked(upload_id: str) -> Iterator[None]:
+        """Hold an exclusive cross-process lock on one upload."""
+        with open(ChunkedUploadService._path(upload_id, "lock"), "a") as lock_file:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    @staticmethod
+    @contextmanager
+    def _locked_dir() -> Iterator[None]:
+        """Hold an exclusive cross-process lock on starting uploads, for the per-caller limits."""
+        with open(os.path.join(ChunkedUploadService._upload_dir(), "initiate.lock"), "a") as lock_file:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    @staticmethod
+    def _active_uploads(caller: str) -> Tuple[int, int]:
+        """The number and declared total size of a caller's unfinished uploads."""
+        upload_dir = ChunkedUploadService._upload_dir()
+        count = total = 0
+        for name in os.listdir(upload_dir):
+            if not name.endswith(".json"):
+                continue
+            try:
+                with open(os.path.join(upload_dir, name), encoding="utf-8") as f:
+                    state = json.load(f)
+            except (OSError, ValueError):
+                continue
+            if state.get("caller") == caller:
+                count += 1
+                total += state["total_size"]
+        return count, total
+
+    @staticmethod
+    def _load(upload_id: str) -> Dict[str, Any]:
+        try:
+            with open(ChunkedUploadService._path(upload_id, "json"), encoding="utf-8") as f:
+                return json.load(f)
+        except FileNotFoundError:
+            raise HTTPException(status_code=404, detail="Upload not found")
+
+    @staticmethod
+    def _save(state: Dict[str, Any]) -> None:
+        """Write the state file atomically so a crash never leaves it half-written."""
+        state_path = ChunkedUploadService._path(state["upload_id"], "json")
+        tmp_path = f"{state_path}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(state, f)
+        os.replace(tmp_path, state_path)
+
+    @staticmethod
+    def data_path(upload_id: str) -> str:
+        """Path of the assembled upload data."""
+        return ChunkedUploadService._path(upload_id, "part")
+
+    @staticmethod
+    def public_state(state: Dict[str, Any]) -> Dict[str, Any]:
+        """The subset of upload state returned to clients."""
+        return {
+            "upload_id": state["upload_id"],
+            "filename": state["filename"],
+            "total_size": state["total_size"],
+            "received": state["received"],
+            "complete": state["received"] == state["total_size"],
+            "chunk_count": len(state["chunks"]),
+            "min_chunk_size": get("UPLOAD_MIN_CHUNK_BYTES"),
+            "max_chunk_size": get("UPLOAD_MAX_CHUNK_BYTES"),
+        }
+
+    @staticmethod
+    def initiate(
+        filename: str,
+        total_size: int,
+        sha256: Optional[str] = None,
+        org_context: Optional[Dict[str, Any]] = None,
+        org_profile_id: Optional[int] = None,
+        caller: str = "anonymous",
+    ) -> Dict[str, Any]:
+        """
+        Start a new upload for ``caller`` ("user:<id>", or "ip:<address>" for
+        anonymous requests).
+
+        Raises:
+            HTTPException: If the file is not a PDF, or is larger than UPLOAD_MAX_BYTES
+                or than the largest file a scan has the memory for; 429 if the
+                caller already has their maximum of unfinished uploads
+        """
+        if not filename.lower().endswith(".pdf"):
+            raise HTTPException(status_code=400, detail="Only PDF files are allowed")
+        # Reject at the start a file that /complete would refuse to scan after the whole upload
+        max_bytes = min(get("UPLOAD_MAX_BYTES"), memory.max_upload_bytes())
+        if total_size <= 0 or total_size > max_bytes:
+            raise HTTPException(
+                status_code=413,
+                detail=f"total_size must be between 1 and {max_bytes} bytes",
+            )
+
+        ChunkedUploadService.cleanup_expired()
+
+        upload_id = uuid.uuid4().hex
+        state = {
+            "upload_id": upload_id,
+            "filename": filename,
+            "total_size": total_size,
+            "sha256": sha256.lower() if sha256 else None,
+            "org_context": org_context,
+            "org_profile_id": org_profile_id,
+            "caller": caller,
+            "received": 0,
+            "chunks": [],
+            "created_at": time.time(),
+        }
+        with ChunkedUploadService._locked_dir():
+            count, total = ChunkedUploadService._active_uploads(caller)
+            if (count >= get("UPLOAD_MAX_ACTIVE_PER_CALLER")
+                    or total + total_size > get("UPLOAD_MAX_ACTIVE_BYTES_PER_CALLER")):
+                raise HTTPException(
+                    status_code=429,
+                    detail={
+                        "message": "Too many unfinished uploads; complete or delete one first",
+                        "active_uploads": count,
+                        "active_bytes": total,
+                    },
+                )
+            open(ChunkedUploadService.data_path(upload_id), "wb").close()
+            ChunkedUploadService._save(state)
+        log_info(f"Initiated chunked upload {upload_id} for {filename} ({total_size} bytes)")
+        return state
+
+    @staticmethod
+    def append_chunk(upload_id: str, offset: int, data: bytes, chunk_sha256: Optional[str] = None) -> Dict[str, Any]:
+        """
+        Append one chunk at ``offset``.
+
+        Chunks must arrive in order, and every chunk but the last must be at
+        least UPLOAD_MIN_CHUNK_BYTES, which bounds the chunk list rewritten with
+        each one. Re-sending a chunk that was already stored (same offset and
+        checksum) is accepted and changes nothing, so a client that lost the
+        response can safely retry.
+
+        Raises:
+            HTTPException: 409 with the expected offset if the chunk is out of order,
+                400 if the checksum does not match or a chunk other than the last
+                is too small, 413 if the chunk is too large
+        """
+        if not data:
+            raise HTTPException(status_code=400, detail="Empty chunk")
+        if len(data) > get("UPLOAD_MAX_CHUNK_BYTES"):
+            raise HTTPException(status_code=413, detail=f"Chunks may be at most {get('UPLOAD_MAX_CHUNK_BYTES')} bytes")
+
+        digest = hashlib.sha256(data).hexdigest()
+        if chunk_sha256 and chunk_sha256.lower() != digest:
+            raise HTTPException(status_code=400, detail="Chunk checksum mismatch")
+
+        with ChunkedUploadService._locked(upload_id):
+            state = ChunkedUploadService._load(upload_id)
+
+            if offset < state["received"]:
+                previous = next((chunk for chunk in state["chunks"] if chunk["offset"] == offset), None)
+                if previous and previous["size"] == len(data) and previous["sha256"] == digest:
+                    return state
+            if offset != state["received"]:
+                raise HTTPException(
+                    status_code=409,
+                    detail={"message": "Unexpected chunk offset", "expected_offset": state["received"]},
+                )
+            if offset + len(data) > state["total_size"]:
+                raise HTTPException(status_code=400, detail="Chunk extends past total_size")
+            if len(data) < get("UPLOAD_MIN_CHUNK_BYTES") and offset + len(data) < state["total_size"]:
+                raise HTTPException(
+                    status_code=400,
+                    detail=f"Chunks other than the last must be at least {get('UPLOAD_MIN_CHUNK_BYTES')} bytes",
+                )
+
+            with open(ChunkedUploadService.data_path(upload_id), "r+b") as f:
+                # Drop any bytes from a write that failed before its state was saved
+                f.truncate(offset)
+                f.seek(offset)
+                f.write(data)
+                f.flush()
+                os.fsync(f.fileno())
+
+            state["chunks"].append({"offset": offset, "size": len(data), "sha256": digest})
+            state["received"] = offset + len(data)
+            ChunkedUploadService._save(state)
+            return state
+
+    @staticmethod
+    def status(upload_id: str) -> Dict[str, Any]:
+        """Return the upload state; ``received`` is the offset to resume from."""
+        return ChunkedUploadService._load(upload_id)
+
+    @staticmethod
+    def complete(upload_id: str) -> Dict[str, Any]:
+        """
+        Verify an upload has all of its bytes (and the whole-file checksum, if one
+        was given at initiation).
+
+        Raises:
+            HTTPException: 409 if bytes are missing, 400 if the file checksum does not match
+        """
+        with ChunkedUploadService._locked(upload_id):
+            state = ChunkedUploadService._load(upload_id)
+            if state["received"] != state["total_size"]:
+                raise HTTPException(
+                    status_code=409,
+                    detail={"message": "Upload is incomplete", "expected_offset": state["received"]},
+                )
+
+            h = hashlib.sha256()
+            with open(ChunkedUploadService.data_path(upload_id), "rb") as f:
+                for block in iter(lambda: f.read(1024 * 1024), b""):
+                    h.update(block)
+            state["file_sha256"] = h.hexdigest()
+            if state["sha256"] and state["sha256"] != state["file_sha256"]:
+                raise HTTPException(status_code=400, detail="File checksum mismatch")
+
+            ChunkedUploadService._save(state)
+            return state
+
+    @staticmethod
+    def discard(upload_id: str) -> None:
+        """Delete an upload's files."""
+        for suffix in ("part", "json", "lock"):
+            try:
+                os.remove(ChunkedUploadService._path(upload_id, suffix))
+            except FileNotFoundError:
+                pass
+
+    @staticmethod
+    def cleanup_expired() -> None:
+        """
+        Delete uploads with no activity (a stored chunk or a completion
+        attempt) in the last UPLOAD_EXPIRY_HOURS, going by their state file's
+        modification time.
+        """
+        upload_dir = ChunkedUploadService._upload_dir()
+        cutoff = time.time() - get("UPLOAD_EXPIRY_HOURS") * 3600
+        for name in os.listdir(upload_dir):
+            upload_id, _, suffix = name.partition(".")
+            if suffix != "json":
+                continue
+            try:
+                if os.path.getmtime(os.path.join(upload_dir, name)) < cutoff:
+                    ChunkedUploadService.discard(upload_id)
+                    log_info(f"Discarded expired chunked upload {upload_id}")
+            except (OSError, HTTPException) as e:
+                log_warning(f"Could not clean up upload {upload_id}: {str(e)}")
@@ -0,0 +1,122 @@
+import io
+import posixpath
+import zipfile
+from typing import IO, List, Optional
+
+from fastapi import HTTPException
+
+from app.core.config import get
+
+# PDF files start with this signature, somewhere in their first kilobyte
+PDF_SIGNATURE = b"%PDF-"
+
+READ_BLOCK_BYTES = 64 * 1024
+
+
+class ZipArchiveService:
+    """
+    Reading uploaded ZIP archives (online public file exports) entry by entry.
+
+    The central directory is read once; each entry is then decompressed on
+    its own, in blocks, straight into memory, so nothing is extracted to disk
+    and a scan never waits for the rest of the archive. Zip bombs are stopped
+    by the decompressed bytes actually produced, not the sizes the archive
+    declares: an entry may not exceed ZIP_MAX_ENTRY_BYTES or expand more than
+    ZIP_MAX_COMPRESSION_RATIO times its compressed size, and the whole archive
+    may not expand past ZIP_MAX_TOTAL_BYTES. These methods do blocking I/O;
+    call them from the threadpool.
+    """
+
+    @staticmethod
+    def open_archive(file: IO[bytes]) -> zipfile.ZipFile:
+        """
+        Open an uploaded archive and check its declared sizes.
+
+        Raises:
+            HTTPException: 400 if the upload is not a ZIP archive, 413 if it has
+                more than ZIP_MAX_ENTRIES entries or declares more than
+                ZIP_MAX_TOTAL_BYTES uncompressed
+        """
+        try:
+            archive = zipfile.ZipFile(file)
+        except (zipfile.BadZipFile, ValueError):
+            raise HTTPException(status_code=400, detail="The uploaded file is not a valid ZIP archive")
+        infos = archive.infolist()
+        if len(infos) > get("ZIP_MAX_ENTRIES"):
+            raise HTTPException(
+                status_code=413,
+                detail=f"The archive has {len(infos)} entries, over the {get('ZIP_MAX_ENTRIES')} entry limit"
+            )
+        declared = sum(info.file_size for info in infos)
+        if declared > get("ZIP_MAX_TOTAL_BYTES"):
+            raise HTTPException(
+                status_code=413,
+                detail=f"The archive expands to {declared} bytes, over the {get('ZIP_MAX_TOTAL_BYTES')} byte limit"
+            )
+        return archive
+
+    @staticmethod
+    def entries(archive: zipfile.ZipFile) -> List[zipfile.ZipInfo]:
+        """The archive's files, without directories and macOS resource forks."""
+        return [
+            info for info in archive.infolist()
+            if not info.is_dir()
+            and not info.filename.startswith("__MACOSX/")
+            and not posixpath.basename(info.filename).startswith(".")
+        ]
+
+    @staticmethod
+    def skip_reason(info: zipfile.ZipInfo) -> Optional[str]:
+        """Why an entry is not scanned, or None for a PDF entry."""
+        if not info.filename.lower().endswith(".pdf"):
+            return "not a PDF file"
+        if info.flag_bits & 0x1:
+            return "encrypted entry"
+        return None
+
+    @staticmethod
+    def read_entry(archive: zipfile.ZipFile, info: zipfile.ZipInfo, total_left: int) -> io.BytesIO:
+        """
+        Decompress one entry, enforcing the size and ratio limits as it expands.
+
+        Args:
+            total_left: Decompressed bytes the archive may still produce
+
+        Returns:
+            The entry's bytes, at position 0; they are decompressed into this
+            buffer and never copied
+
+        Raises:
+            HTTPException: 413 if the entry breaks a limit, 422 if it is corrupt
+                or not a PDF
+        """
+        limit = min(get("ZIP_MAX_ENTRY_BYTES"), total_left)
+        # Never more than the compressed bytes the entry declares are read, so this bounds the real ratio
+        ratio_limit = get("ZIP_MAX_COMPRESSION_RATIO") * max(info.compress_size, 1)
+        if info.file_size > limit:
+            raise HTTPException(status_code=413, detail=f"Entry expands to {info.file_size} bytes, over the {limit} byte limit")
+
+        data = io.BytesIO()
+        size = 0
+        try:
+            with archive.open(info) as entry:
+                while True:
+                    block = entry.read(READ_BLOCK_BYTES)
+                    if not block:
+                        break
+                    size += data.write(block)
+                    if size > limit:
+                        raise HTTPException(status_code=413, detail=f"Entry expands past the {limit} byte limit")
+                    if size > ratio_limit and info.compress_type != zipfile.ZIP_STORED:
+                        raise HTTPException(
+                            status_code=413,
+                            detail=f"Entry expands more than {get('ZIP_MAX_COMPRESSION_RATIO')}x its compressed size"
+                        )
+        except (zipfile.BadZipFile, EOFError, NotImplementedError, RuntimeError) as e:
+            raise HTTPException(status_code=422, detail=f"Entry could not be decompressed: {str(e)}")
+
+        data.seek(0)
+        if PDF_SIGNATURE not in data.read(1024):
+            raise HTTPException(status_code=422, detail="Entry is not a PDF document")
+        data.seek(0)
+        return data
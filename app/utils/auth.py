@@ -1,3 +1,4 @@
+import secrets
 from typing import Optional
 from fastapi import Depends, HTTPException, status
 from fastapi.security import OAuth2PasswordBearer
@@ -11,6 +12,8 @@ from app.schemas.token import TokenPayload
 from app.utils.security import verify_password
 
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl=f"{get('API_V1_STR')}/unauth/login")
+# For endpoints open to anonymous requests that treat signed-in users differently
+optional_oauth2_scheme = OAuth2PasswordBearer(tokenUrl=f"{get('API_V1_STR')}/unauth/login", auto_error=False)
 
 
 def authenticate_user(db: Session, username: str, password: str) -> Optional[User]:
@@ -54,6 +57,21 @@ def get_current_user(
     return user
 
 
+def get_optional_user(
+    db: Session = Depends(get_db), token: Optional[str] = Depends(optional_oauth2_scheme)
+) -> Optional[User]:
+    """
+    Get the current user if the request carries a valid token, otherwise None.
+    """
+    if token is None:
+        return None
+    try:
+        return get_current_user(db, token)
+    except HTTPException:
+        # An expired or invalid token on an open endpoint is treated as anonymous
+        return None
+
+
 def get_current_active_superuser(
     current_user: User = Depends(get_current_user),
 ) -> User:
@@ -64,4 +82,21 @@ def get_current_active_superuser(
         raise HTTPException(
             status_code=403, detail="The user doesn't have enough privileges"
         )
-    return current_user 
\ No newline at end of file
+    return current_user 
+
+def get_metrics_access(
+    db: Session = Depends(get_db), token: Optional[str] = Depends(optional_oauth2_scheme)
+) -> None:
+    """
+    Allow a metrics scraper with METRICS_SCRAPE_TOKEN as its bearer token, or a superuser.
+    """
+    scrape_token = get("METRICS_SCRAPE_TOKEN")
+    if token is not None and scrape_token and secrets.compare_digest(token.encode(), scrape_token.encode()):
+        return
+    if token is None:
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="Not authenticated",
+            headers={"WWW-Authenticate": "Bearer"},
+        )
+    get_current_active_superuser(get_current_user(db, token))
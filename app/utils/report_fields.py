@@ -0,0 +1,38 @@
+from typing import Any, Dict, Optional, Set
+
+from fastapi import HTTPException
+
+from app.schemas.compliance_scan import DetailedComplianceReport
+
+REPORT_FIELDS = set(DetailedComplianceReport.model_fields)
+
+
+def parse_report_fields(fields: Optional[str]) -> Optional[Set[str]]:
+    """
+    Parse a comma-separated ``fields`` query parameter.
+
+    Returns:
+        The requested detailed report field names, or None to return everything
+
+    Raises:
+        HTTPException: If an unknown field is requested
+    """
+    if not fields:
+        return None
+    selected = {field.strip() for field in fields.split(",") if field.strip()}
+    unknown = selected - REPORT_FIELDS
+    if unknown:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Unknown report fields: {', '.join(sorted(unknown))}. Allowed: {', '.join(sorted(REPORT_FIELDS))}",
+        )
+    return selected
+
+
+def select_report_fields(response: Dict[str, Any], selected: Set[str]) -> Dict[str, Any]:
+    """Return a copy of a serialized ComplianceScanResponse keeping only the selected report fields."""
+    document = dict(response["document"])
+    document["detailedReport"] = {
+        key: value for key, value in document["detailedReport"].items() if key in selected
+    }
+    return {**response, "document": document}
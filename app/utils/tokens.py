@@ -0,0 +1,32 @@
+from functools import lru_cache
+
+
+@lru_cache(maxsize=8)
+def _encoding_for_model(model: str):
+    try:
+        import tiktoken
+    except ImportError:
+        return None
+    try:
+        try:
+            return tiktoken.encoding_for_model(model)
+        except KeyError:
+            return tiktoken.get_encoding("cl100k_base")
+    except Exception:
+        # tiktoken downloads its encoding files on first use; offline workers estimate instead
+        return None
+
+
+def count_tokens(text: str, model: str = "gpt-4o") -> int:
+    """
+    Count the tokens in a piece of text for a model.
+
+    Uses tiktoken when it is installed (it ships with langchain-openai) and falls
+    back to the usual four-characters-per-token estimate otherwise.
+    """
+    if not text:
+        return 0
+    encoding = _encoding_for_model(model)
+    if encoding is None:
+        return max(1, len(text) // 4)
+    return len(encoding.encode(text, disallowed_special=()))
@@ -0,0 +1,121 @@
+"""
+Benchmark the PDF extraction backends against each other.
+
+Each installed backend extracts the same synthetic corpus (plain filings from
+synthetic_pdf and table-heavy filings from table_corpus) through
+PDFService.iter_pages, in a fresh process so the page cache is cold and peak
+memory is the backend's own. Reported per backend and document kind:
+
+* pages per second,
+* the largest RSS growth while extracting one document, sampled as in
+  app.core.memory, which includes the native libraries' allocations that
+  tracemalloc does not see,
+* text fidelity: how closely the extracted words match the words drawn on the
+  page, in order (difflib ratio over word sequences, 100% = identical), and
+* documents that fell back to another backend.
+
+Usage (from the repository root):
+
+    python -m benchmarks.pdf_backends --docs 5 --pages 40
+    python -m benchmarks.pdf_backends --backends pypdf,pypdfium2
+"""
+import argparse
+import asyncio
+import io
+import multiprocessing
+import time
+from collections import defaultdict
+from difflib import SequenceMatcher
+from typing import Any, Dict, List
+
+import pypdf
+
+from benchmarks.synthetic_pdf import make_filing, page_text
+from benchmarks.table_corpus import make_table_corpus
+
+
+def make_corpus(docs: int, pages: int, seed: int = 0) -> List[Dict[str, Any]]:
+    """``docs`` plain filings of ``pages`` pages and ``docs`` table documents of each kind, with their page texts."""
+    corpus = [
+        {
+            "kind": "filing",
+            "pdf": make_filing(pages, seed=seed * 1000 + i),
+            "page_texts": [page_text(page, seed=(seed * 1000 + i) * 100000 + page) for page in range(1, pages + 1)],
+        }
+        for i in range(docs)
+    ]
+    corpus.extend({"kind": "tables", "pdf": doc["pdf"], "page_texts": doc["page_texts"]}
+                  for doc in make_table_corpus(docs, seed))
+    return corpus
+
+
+def fidelity(expected: str, extracted: str) -> float:
+    return SequenceMatcher(None, expected.split(), extracted.split(), autojunk=False).ratio()
+
+
+async def _extract(pdf: bytes, backend: str) -> Dict[str, Any]:
+    from app.core import memory
+    from app.services.pdf_reader import PDFService
+
+    report: Dict[str, Any] = {}
+    texts = []
+    memory.start_request()
+    with memory.stage("pdf_parse"):
+        async for _, text, _ in PDFService.iter_pages(pypdf.PdfReader(io.BytesIO(pdf)), report, "plain", backend):
+            texts.append(text)
+    return {"texts": texts, "backend": report["backend"], "peak_mb": memory.request_report()["stages"]["pdf_parse"]}
+
+
+def run_backend(backend: str, corpus: List[Dict[str, Any]]) -> Dict[str, Dict[str, float]]:
+    """Extract the corpus with one backend; runs in its own process."""
+    from app.core.config import config
+
+    config["MEMORY_ACCOUNTING_ENABLED"] = True
+    totals: Dict[str, Dict[str, float]] = defaultdict(lambda: defaultdict(float))
+    for doc in corpus:
+        started = time.perf_counter()
+        result = asyncio.run(_extract(doc["pdf"], backend))
+        t = totals[doc["kind"]]
+        t["seconds"] += time.perf_counter() - started
+        t["docs"] += 1
+        t["pages"] += len(doc["page_texts"])
+        t["fidelity"] += sum(fidelity(expected, extracted) for expected, extracted
+                             in zip(doc["page_texts"], result["texts"])) / len(doc["page_texts"])
+        t["fallbacks"] += result["backend"] != backend
+        t["peak_mb"] = max(t["peak_mb"], result["peak_mb"])
+    # Plain dicts, to be pickled back to the parent process
+    return {kind: dict(t) for kind, t in totals.items()}
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--docs", type=int, default=5, help="Documents per kind")
+    parser.add_argument("--pages", type=int, default=40, help="Pages per plain filing")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--backends", default="pypdf,pypdfium2,pymupdf", help="Comma-separated backends to compare")
+    args = parser.parse_args()
+
+    from app.services.pdf_reader.backends import BACKENDS
+
+    corpus = make_corpus(args.docs, args.pages, args.seed)
+    backends = []
+    for name in args.backends.split(","):
+        if BACKENDS[name].installed():
+            backends.append(name)
+        else:
+            print(f"{name} is not installed, skipping it")
+
+    ctx = multiprocessing.get_context("spawn")
+    print(f"{len(corpus)} documents, {sum(len(doc['page_texts']) for doc in corpus)} pages")
+    print(f"{'backend':<10} {'kind':<7} {'pages/s':>8} {'peak MB':>8} {'fidelity':>8} {'fallbacks':>9}")
+    for backend in backends:
+        with ctx.Pool(1) as pool:
+            totals = pool.apply(run_backend, (backend, corpus))
+
+        for kind, t in totals.items():
+            print(f"{backend:<10} {kind:<7} {t['pages'] / t['seconds']:>8.0f} {t['peak_mb']:>8.1f} "
+                  f"{t['fidelity'] / t['docs']:>8.1%} {int(t['fallbacks']):>9}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,87 @@
+"""
+Benchmark PDFService.iter_pages against the joined-text API.
+
+Compares time to first page, total time and peak traced memory of
+
+* ``extract_text_from_pdf`` (returns only once every page is joined), and
+* a streaming consumer of ``iter_pages`` that hashes each page and drops it.
+
+Every run uses a fresh synthetic document, so the page text cache never hits.
+
+Usage (from the repository root):
+
+    python -m benchmarks.pdf_streaming --pages 500
+"""
+import argparse
+import asyncio
+import hashlib
+import io
+import tempfile
+import time
+import tracemalloc
+
+import pypdf
+from starlette.datastructures import UploadFile
+
+from app.services.pdf_reader import PDFService
+from benchmarks.synthetic_pdf import make_filing
+
+
+def _upload(pdf: bytes) -> UploadFile:
+    spooled = tempfile.SpooledTemporaryFile(max_size=1024 * 1024)
+    spooled.write(pdf)
+    spooled.seek(0)
+    return UploadFile(spooled, filename="filing.pdf", size=len(pdf))
+
+
+async def run_joined(pdf: bytes) -> dict:
+    started = time.perf_counter()
+    result = await PDFService.extract_text_from_pdf(_upload(pdf))
+    total = time.perf_counter() - started
+    # Nothing is available to the caller before the whole document is done
+    return {"first_page_ms": total * 1000, "total_ms": total * 1000, "chars": len(result["text"])}
+
+
+async def run_streaming(pdf: bytes) -> dict:
+    started = time.perf_counter()
+    first_page_ms = None
+    chars = 0
+    h = hashlib.sha256()
+    reader = pypdf.PdfReader(io.BytesIO(pdf))
+    async for _, text, _ in PDFService.iter_pages(reader):
+        if first_page_ms is None:
+            first_page_ms = (time.perf_counter() - started) * 1000
+        h.update(text.encode())
+        chars += len(text)
+    return {"first_page_ms": first_page_ms, "total_ms": (time.perf_counter() - started) * 1000, "chars": chars}
+
+
+def measure(runner, pdf_for_timing: bytes, pdf_for_memory: bytes) -> dict:
+    """Time one run, then repeat on a second document under tracemalloc for the peak."""
+    result = asyncio.run(runner(pdf_for_timing))
+    tracemalloc.start()
+    asyncio.run(runner(pdf_for_memory))
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    result["peak_mb"] = peak / (1024 * 1024)
+    return result
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--pages", type=int, default=300)
+    parser.add_argument("--image-every", type=int, default=0, help="Make every Nth page image-only")
+    args = parser.parse_args()
+
+    seeds = iter(range(1, 100))
+    filing = lambda: make_filing(args.pages, args.image_every, seed=next(seeds))  # noqa: E731
+    size_mb = len(filing()) / (1024 * 1024)
+    print(f"{args.pages} pages, {size_mb:.1f} MB per document")
+    print(f"{'mode':<12} {'first page ms':>14} {'total ms':>10} {'peak MB':>9} {'chars':>10}")
+    for name, runner in (("joined", run_joined), ("streaming", run_streaming)):
+        r = measure(runner, filing(), filing())
+        print(f"{name:<12} {r['first_page_ms']:>14.1f} {r['total_ms']:>10.1f} {r['peak_mb']:>9.1f} {r['chars']:>10}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,111 @@
+"""
+Build synthetic PDFs for the benchmarks without any PDF-writing dependency.
+
+Pages are drawn with the standard Helvetica font, so every text page goes
+through the normal pypdf text extraction path.
+"""
+import random
+from typing import List, Optional, Tuple
+
+WORDS = (
+    "station licensee public inspection file quarterly issues programs list EAS "
+    "required weekly test monthly test antenna structure registration tower lighting "
+    "ownership report political file sponsorship identification children's "
+    "programming commitments emergency alert system log entry filed certified"
+).split()
+
+
+def _escape(line: str) -> bytes:
+    return line.replace("\\", "\\\\").replace("(", "\\(").replace(")", "\\)").encode("latin-1", "replace")
+
+
+def page_text(page_number: int, lines: int = 45, seed: Optional[int] = None) -> str:
+    """Pseudo-random filing text for one page."""
+    rng = random.Random(seed if seed is not None else page_number)
+    return "\n".join(
+        f"{page_number}.{line} " + " ".join(rng.choice(WORDS) for _ in range(12))
+        for line in range(lines)
+    )
+
+
+def _assemble(contents: List[Optional[bytes]]) -> bytes:
+    """Write a PDF with one page per content stream; ``None`` makes an image-only page."""
+    objects: List[bytes] = []
+
+    def add(body: bytes) -> int:
+        objects.append(body)
+        return len(objects)
+
+    font_id = add(b"<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>")
+    image_id = add(
+        b"<< /Type /XObject /Subtype /Image /Width 1 /Height 1 /ColorSpace /DeviceGray "
+        b"/BitsPerComponent 8 /Length 1 >>\nstream\n\x00\nendstream"
+    )
+
+    page_parts = []
+    for content in contents:
+        if content is None:
+            content = b"q 100 0 0 100 0 0 cm /Im1 Do Q"
+            resources = b"<< /XObject << /Im1 %d 0 R >> >>" % image_id
+        else:
+            resources = b"<< /Font << /F1 %d 0 R >> >>" % font_id
+        content_id = add(b"<< /Length %d >>\nstream\n" % len(content) + content + b"\nendstream")
+        page_parts.append((content_id, resources))
+
+    pages_id = len(objects) + len(page_parts) + 1
+    page_ids = [
+        add(b"<< /Type /Page /Parent %d 0 R /MediaBox [0 0 612 792] /Contents %d 0 R /Resources %s >>"
+            % (pages_id, content_id, resources))
+        for content_id, resources in page_parts
+    ]
+    add(b"<< /Type /Pages /Kids [" + b" ".join(b"%d 0 R" % i for i in page_ids) + b"] /Count %d >>" % len(page_ids))
+    catalog_id = add(b"<< /Type /Catalog /Pages %d 0 R >>" % pages_id)
+
+    out = bytearray(b"%PDF-1.4\n")
+    offsets = []
+    for number, body in enumerate(objects, 1):
+        offsets.append(len(out))
+        out += b"%d 0 obj\n" % number + body + b"\nendobj\n"
+    xref_offset = len(out)
+    out += b"xref\n0 %d\n0000000000 65535 f \n" % (len(objects) + 1)
+    for offset in offsets:
+        out += b"%010d 00000 n \n" % offset
+    out += b"trailer\n<< /Size %d /Root %d 0 R >>\nstartxref\n%d\n%%%%EOF\n" % (len(objects) + 1, catalog_id, xref_offset)
+    return bytes(out)
+
+
+def make_pdf(pages: List[Optional[str]]) -> bytes:
+    """
+    Build a PDF with one page per entry; a ``None`` entry makes an image-only page.
+
+    Text lines are separated by newlines in each entry.
+    """
+    contents: List[Optional[bytes]] = []
+    for text in pages:
+        if text is None:
+            contents.append(None)
+            continue
+        ops = [b"BT /F1 10 Tf 50 750 Td 12 TL"]
+        ops.extend(b"(" + _escape(line) + b") Tj T*" for line in text.split("\n"))
+        ops.append(b"ET")
+        contents.append(b"\n".join(ops))
+    return _assemble(contents)
+
+
+def make_layout_pdf(pages: List[List[Tuple[float, float, str]]]) -> bytes:
+    """Build a PDF whose pages draw each ``(x, y, text)`` string at its own position."""
+    contents: List[Optional[bytes]] = []
+    for strings in pages:
+        ops = [b"BT /F1 9 Tf"]
+        ops.extend(b"1 0 0 1 %.1f %.1f Tm (" % (x, y) + _escape(text) + b") Tj" for x, y, text in strings)
+        ops.append(b"ET")
+        contents.append(b"\n".join(ops))
+    return _assemble(contents)
+
+
+def make_filing(page_count: int, image_every: int = 0, seed: int = 0) -> bytes:
+    """A filing of ``page_count`` distinct text pages, with an image-only page every ``image_every`` pages."""
+    return make_pdf([
+        None if image_every and page % image_every == 0 else page_text(page, seed=seed * 100000 + page)
+        for page in range(1, page_count + 1)
+    ])
@@ -0,0 +1,138 @@
+"""
+A synthetic corpus of table-heavy filings for the extraction benchmarks.
+
+Documents are ownership reports, EEO public file reports and EAS logs, built
+with make_layout_pdf so every cell is drawn at its own position, as in
+generated PDFs. Some carry a planted compliance problem (foreign voting
+interest above 25%, vacancies without a recruitment source, missed weekly EAS
+tests), which gives each document an expected scan status.
+"""
+import random
+from datetime import date, timedelta
+from typing import Any, Dict, List
+
+from benchmarks.synthetic_pdf import make_layout_pdf
+
+KINDS = ("ownership", "eeo", "eas")
+
+FIRST = ("Maria", "James", "Aisha", "Robert", "Mei", "Carlos", "Priya", "Thomas", "Olga", "Daniel")
+LAST = ("Lopez", "Whitaker", "Okafor", "Chen", "Novak", "Fitzgerald", "Raman", "Bauer", "Haddad", "Sullivan")
+POSITIONS = ("General Partner", "Director", "Officer and Director", "Limited Partner", "Trustee", "Member")
+FOREIGN = ("Canada", "Mexico", "United Kingdom", "Germany")
+JOB_TITLES = ("Account Executive", "Master Control Operator", "News Producer", "Chief Engineer",
+              "Traffic Coordinator", "Morning Show Host", "Promotions Assistant", "Web Content Editor")
+SOURCES = ("State Broadcasters Association", "Station website", "Community job fair",
+           "Indeed job board", "Employee referral", "Local college career office")
+
+ROWS_PER_PAGE = 44
+
+
+def _ownership(rng: random.Random, issue: bool) -> Dict[str, Any]:
+    people = rng.randint(6, 12)
+    weights = [rng.randint(1, 10) for _ in range(people)]
+    voting = [round(100 * w / sum(weights), 1) for w in weights]
+    foreign = set(rng.sample(range(people), 2))
+    while (sum(voting[i] for i in foreign) > 25) != issue:
+        foreign = set(rng.sample(range(people), rng.randint(1, people - 1) if issue else 1))
+    rows = [
+        [f"{rng.choice(FIRST)} {rng.choice(LAST)}", rng.choice(POSITIONS), f"{voting[i]}%",
+         f"{round(voting[i] * rng.uniform(0.6, 1.0), 1)}%",
+         rng.choice(FOREIGN) if i in foreign else "United States"]
+        for i in range(people)
+    ]
+    return {
+        "title": "FCC Form 323 Ownership Report - Interests in the Licensee",
+        "intro": ["The following persons hold attributable interests in the licensee as of the filing date.",
+                  "Voting and equity interests are stated as a percentage of the licensee's outstanding shares."],
+        "header": ["Name", "Position", "Voting Interest", "Equity Interest", "Citizenship"],
+        "columns": [50, 170, 290, 380, 470],
+        "rows": rows,
+    }
+
+
+def _eeo(rng: random.Random, issue: bool) -> Dict[str, Any]:
+    vacancies = rng.randint(8, 20)
+    missing = set(rng.sample(range(vacancies), 3)) if issue else set()
+    rows = [
+        [rng.choice(JOB_TITLES), str(rng.randint(1, 3)),
+         "None" if i in missing else rng.choice(SOURCES), str(rng.randint(2, 15)),
+         "None" if i in missing else rng.choice(SOURCES)]
+        for i in range(vacancies)
+    ]
+    return {
+        "title": "EEO Public File Report - Full-Time Vacancies Filled",
+        "intro": ["This report lists each full-time vacancy filled during the reporting period, the recruitment",
+                  "sources used for it, the number of interviewees and the source of the person hired."],
+        "header": ["Job Title", "Full-Time Hires", "Recruitment Source", "Interviewees", "Source of Hire"],
+        "columns": [50, 180, 260, 420, 490],
+        "rows": rows,
+    }
+
+
+def _eas(rng: random.Random, issue: bool) -> Dict[str, Any]:
+    start = date(2026, 1, 5) + timedelta(days=rng.randint(0, 60))
+    weeks = rng.randint(10, 26)
+    skipped = set(range(4, 7)) if issue else set()
+    rows = []
+    for week in range(weeks):
+        day = start + timedelta(weeks=week)
+        if week % 4 == 0:
+            rows.append([(day - timedelta(days=2)).isoformat(), f"{rng.randint(8, 22)}:{rng.randint(0, 59):02d}",
+                         "Required Monthly Test", "State EAS Relay", "Received and relayed"])
+        if week in skipped:
+            continue
+        rows.append([day.isoformat(), f"{rng.randint(8, 22)}:{rng.randint(0, 59):02d}",
+                     "Required Weekly Test", "WXYZ-FM", "Sent"])
+        rows.append([(day + timedelta(days=1)).isoformat(), f"{rng.randint(8, 22)}:{rng.randint(0, 59):02d}",
+                     "Required Weekly Test", rng.choice(("WABC-AM", "KLMN-FM")), "Received"])
+    return {
+        "title": "Emergency Alert System Log",
+        "intro": ["Log of EAS tests sent and received by the station during the period.",
+                  "Entries are made by the operator on duty at the time of the test."],
+        "header": ["Date", "Time", "Test Type", "Originator", "Received/Sent"],
+        "columns": [50, 140, 200, 340, 450],
+        "rows": rows,
+    }
+
+
+_BUILDERS = {"ownership": _ownership, "eeo": _eeo, "eas": _eas}
+
+
+def make_table_document(kind: str, seed: int) -> Dict[str, Any]:
+    """
+    One synthetic filing of the given kind.
+
+    Returns:
+        Dict with the kind, the PDF bytes, the table (header first), the
+        expected scan status ("compliant", or "issues" if a problem was planted)
+        and the text of each page, its strings in reading order
+    """
+    rng = random.Random(seed)
+    issue = rng.random() < 0.5
+    doc = _BUILDERS[kind](rng, issue)
+
+    pages = []
+    rows = doc["rows"]
+    for first in range(0, len(rows), ROWS_PER_PAGE):
+        strings = [(50, 750, doc["title"])]
+        strings.extend((50, 730 - 12 * i, line) for i, line in enumerate(doc["intro"]))
+        y = 690
+        # The header repeats on every page of the table
+        for row in [doc["header"]] + rows[first:first + ROWS_PER_PAGE]:
+            strings.extend((x, y, cell) for x, cell in zip(doc["columns"], row))
+            y -= 14
+        strings.append((50, y - 20, f"Certified true and complete. Page {first // ROWS_PER_PAGE + 1}."))
+        pages.append(strings)
+
+    return {
+        "kind": kind,
+        "pdf": make_layout_pdf(pages),
+        "table": [doc["header"]] + rows,
+        "expected_status": "issues" if issue else "compliant",
+        "page_texts": [" ".join(text for _, _, text in strings) for strings in pages],
+    }
+
+
+def make_table_corpus(per_kind: int, seed: int = 0) -> List[Dict[str, Any]]:
+    """``per_kind`` documents of each kind."""
+    return [make_table_document(kind, seed * 10000 + i * 10 + k) for i in range(per_kind) for k, kind in enumerate(KINDS)]
@@ -0,0 +1,129 @@
+"""
+Benchmark the "tables" PDF extraction mode against plain extraction.
+
+On a synthetic corpus of ownership reports, EEO public file reports and EAS
+logs (see table_corpus), reports per document kind and mode:
+
+* prompt tokens of the extracted text,
+* extraction time,
+* the share of table rows that can be read back as their exact cells: a
+  ``|``-delimited line with the same cells, or a plain line whose words can
+  only be split into the row's cells one way, and
+* scan accuracy: every document is scanned by the model in both modes and the
+  scan's status compared with the status expected from the planted problems.
+
+Scanning needs OPENAI_KEY and costs tokens, or cassettes to replay (see the
+README). Scans that fell back to the placeholder assessment are left out of
+the accuracy and counted separately; ``--no-scan`` skips the model entirely.
+Without tiktoken's encoding files, token counts are the four-characters-per-
+token estimate.
+
+Usage (from the repository root):
+
+    python -m benchmarks.table_extraction --docs 5
+    python -m benchmarks.table_extraction --docs 10 --no-scan
+"""
+import argparse
+import asyncio
+import tempfile
+import time
+from collections import defaultdict
+from math import comb
+from typing import Any, Dict, List
+
+from starlette.datastructures import UploadFile
+
+from app.core.config import get
+from app.services.pdf_reader import PDFService
+from app.utils.tokens import count_tokens
+from benchmarks.table_corpus import KINDS, make_table_corpus
+
+MODES = ("plain", "tables")
+
+
+def _upload(pdf: bytes) -> UploadFile:
+    spooled = tempfile.SpooledTemporaryFile(max_size=1024 * 1024)
+    spooled.write(pdf)
+    spooled.seek(0)
+    return UploadFile(spooled, filename="filing.pdf", size=len(pdf))
+
+
+def _parses_to(line: str, cells: List[str]) -> bool:
+    if "|" in line:
+        return [cell.strip() for cell in line.split("|")] == cells
+    words = line.split()
+    # Without delimiters the row is only recoverable if its words split into cells one way
+    return words == " ".join(cells).split() and comb(len(words) - 1, len(cells) - 1) == 1
+
+
+def rows_recovered(text: str, table: List[List[str]]) -> float:
+    """Share of the table's rows (header included) that some line of the text reads back exactly."""
+    lines = [line.strip() for line in text.splitlines() if line.strip()]
+    return sum(any(_parses_to(line, row) for line in lines) for row in table) / len(table)
+
+
+def scan_status(text: str) -> Dict[str, Any]:
+    from app.services.compliance_scan.compliance_scanner import ComplianceScanAgent
+
+    agent = ComplianceScanAgent()
+    result = agent.generate_compliance_scan({"compliance_data": text, "questions": []})
+    return {
+        "status": result.document.complianceStatus,
+        "fallback": agent.used_fallback,
+        "prompt_tokens": (agent.last_usage or {}).get("prompt_tokens", 0),
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--docs", type=int, default=10, help="Documents per kind")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--no-scan", dest="scan", action="store_false",
+                        help="Skip the model: tokens, timing and rows read back only")
+    args = parser.parse_args()
+
+    corpus = make_table_corpus(args.docs, args.seed)
+    model = get("OPENAI_LLM_MODEL")
+    totals: Dict[tuple, Dict[str, float]] = defaultdict(lambda: defaultdict(float))
+    for doc in corpus:
+        for mode in MODES:
+            started = time.perf_counter()
+            pdf_data = asyncio.run(PDFService.extract_text_from_pdf(_upload(doc["pdf"]), mode=mode))
+            elapsed_ms = (time.perf_counter() - started) * 1000
+            t = totals[(doc["kind"], mode)]
+            t["docs"] += 1
+            t["tokens"] += count_tokens(pdf_data["text"], model)
+            t["extract_ms"] += elapsed_ms
+            t["rows"] += rows_recovered(pdf_data["text"], doc["table"])
+            if args.scan:
+                scan = scan_status(pdf_data["text"])
+                if scan["fallback"]:
+                    t["fallbacks"] += 1
+                else:
+                    t["scanned"] += 1
+                    t["correct"] += scan["status"] == doc["expected_status"]
+                    t["prompt_tokens"] += scan["prompt_tokens"]
+
+    print(f"{len(corpus)} documents ({args.docs} per kind), token counts for {model}")
+    header = f"{'kind':<10} {'mode':<7} {'tokens/doc':>10} {'extract ms':>10} {'rows read back':>14}"
+    if args.scan:
+        header += f" {'scan accuracy':>13} {'prompt tokens':>13} {'fallbacks':>9}"
+    print(header)
+    for kind in KINDS + ("all",):
+        for mode in MODES:
+            keys = [(k, mode) for k in KINDS] if kind == "all" else [(kind, mode)]
+            t = {field: sum(totals[key][field] for key in keys)
+                 for field in ("docs", "tokens", "extract_ms", "rows", "scanned", "correct", "prompt_tokens",
+                               "fallbacks")}
+            line = (f"{kind:<10} {mode:<7} {t['tokens'] / t['docs']:>10.0f} {t['extract_ms'] / t['docs']:>10.1f} "
+                    f"{t['rows'] / t['docs']:>14.1%}")
+            if args.scan and t["scanned"]:
+                line += (f" {t['correct'] / t['scanned']:>13.1%} {t['prompt_tokens'] / t['scanned']:>13.0f}"
+                         f" {t['fallbacks']:>9.0f}")
+            elif args.scan:
+                line += f" {'n/a':>13} {'n/a':>13} {t['fallbacks']:>9.0f}"
+            print(line)
+
+
+if __name__ == "__main__":
+    main()
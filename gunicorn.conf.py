@@ -0,0 +1,31 @@
+import gc
+import os
+
+# Gunicorn settings, used by the Dockerfile CMD.
+bind = "0.0.0.0:8000"
+workers = int(os.getenv("WEB_CONCURRENCY", "2"))  # LOOK AT HOW MANY WORKERS ARE ON THE SERVER
+worker_class = "uvicorn.workers.UvicornWorker"
+
+# Import the app (langchain, openai, pypdf, SQLAlchemy, ...) once in the master
+# so workers share those pages copy-on-write instead of each importing cold.
+preload_app = True
+
+
+def when_ready(server):
+    # The model client libraries are imported lazily by the app; load them here,
+    # in the master, so the freeze and the fork below share them too.
+    from app.core import startup
+
+    startup.preload_modules()
+
+    # Move everything imported so far out of the GC's reach so collections in the
+    # workers don't touch (and therefore copy) the shared pages.
+    gc.freeze()
+
+
+def post_fork(server, worker):
+    # Connections must never be shared across processes; drop any the master opened
+    # without closing them from under the parent. Workers warm their own pool on startup.
+    from app.db.database import engine
+
+    engine.dispose(close=False)
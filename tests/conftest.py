@@ -0,0 +1,42 @@
+"""
+Shared test setup. The app reads its configuration at import time, so the
+environment points it at a throwaway SQLite database and a dummy OpenAI key
+before anything from ``app`` is imported.
+"""
+import os
+import tempfile
+
+_TMP_DIR = tempfile.mkdtemp(prefix="fcc-compliance-tests-")
+os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(_TMP_DIR, 'test.db')}"
+os.environ["OPENAI_KEY"] = "sk-test"
+os.environ["TRACE_EXPORTER"] = "none"
+
+import pytest  # noqa: E402
+
+from app.core.config import config  # noqa: E402
+
+
+@pytest.fixture
+def settings(monkeypatch):
+    """Override configuration values for one test: ``settings(KEY=value, ...)``."""
+    def override(**values):
+        for key, value in values.items():
+            monkeypatch.setitem(config, key, value)
+    return override
+
+
+@pytest.fixture
+def db():
+    """A session on the test database, with every table emptied afterwards."""
+    from app.db.database import Base, SessionLocal, create_tables
+
+    create_tables()
+    session = SessionLocal()
+    try:
+        yield session
+    finally:
+        session.rollback()
+        for table in reversed(Base.metadata.sorted_tables):
+            session.execute(table.delete())
+        session.commit()
+        session.close()
@@ -0,0 +1,128 @@
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+from app.models.batch_scan import BatchScanItem
+from app.models.scan_result import ScanResult
+from app.services.batch_scan import BatchScanService
+from app.services.batch_scan.batch_backends import LocalBatchBackend
+
+
+@pytest.fixture
+def batches(settings, tmp_path):
+    settings(BATCH_DIR=str(tmp_path), BATCH_LOCAL_DELAY_SECONDS=0.0, BATCH_MAX_ITEMS=10,
+             BATCH_MAX_SUBMIT_ATTEMPTS=2, BATCH_SUBMIT_STALE_SECONDS=60.0)
+    return BatchScanService
+
+
+def _enqueue(db, count):
+    return [
+        BatchScanService.enqueue(
+            db,
+            {"compliance_data": f"Station log {i}: weekly EAS test received.", "questions": []},
+            "WXYZ", "user:tester", None, 1, estimated_tokens=100,
+        )
+        for i in range(count)
+    ]
+
+
+def _statuses(db):
+    db.expire_all()
+    return sorted(status for (status,) in db.query(BatchScanItem.status).all())
+
+
+class FailingBackend(LocalBatchBackend):
+    """Fails the submit call, after the batch was accepted if ``accepted``."""
+
+    def __init__(self, accepted=False):
+        self.accepted = accepted
+        self.submitted = 0
+
+    def submit(self, path, submission_id):
+        self.submitted += 1
+        if self.accepted:
+            super().submit(path, submission_id)
+        raise ConnectionError("connection reset")
+
+
+def test_pending_items_are_submitted_once_and_written_back(db, batches):
+    _enqueue(db, 3)
+    backend = LocalBatchBackend()
+
+    assert batches.submit_pending(db, backend) == 3
+    assert batches.submit_pending(db, backend) == 0
+    assert batches.collect(db, backend) == {"completed": 3, "failed": 0}
+
+    assert _statuses(db) == ["completed"] * 3
+    assert db.query(ScanResult).count() == 3
+    assert batches.queued_tokens(db, "user:tester") == 0
+
+
+def test_claimed_items_are_not_submitted_by_another_poller(db, batches):
+    _enqueue(db, 2)
+    other_poller = []
+
+    class RacingBackend(LocalBatchBackend):
+        def submit(self, path, submission_id):
+            other_poller.append(batches.submit_pending(db, LocalBatchBackend()))
+            return super().submit(path, submission_id)
+
+    assert batches.submit_pending(db, RacingBackend()) == 2
+    assert other_poller == [0]
+
+
+def test_failed_submission_goes_back_to_pending_then_fails(db, batches):
+    (item,) = _enqueue(db, 1)
+    backend = FailingBackend()
+
+    assert batches.submit_pending(db, backend) == 0
+    db.refresh(item)
+    assert (item.status, item.submit_attempts, item.submission_id) == ("pending", 1, None)
+    assert "connection reset" in item.error
+
+    batches.submit_pending(db, backend)
+    db.refresh(item)
+    assert (item.status, item.submit_attempts) == ("failed", 2)
+    assert batches.submit_pending(db, backend) == 0
+    assert backend.submitted == 2
+
+
+def test_batch_accepted_before_the_error_is_not_sent_again(db, batches):
+    (item,) = _enqueue(db, 1)
+    backend = FailingBackend(accepted=True)
+
+    batches.submit_pending(db, backend)
+
+    db.refresh(item)
+    assert item.status == "submitted" and item.batch_id == f"local_batch_{item.submission_id}"
+    assert batches.submit_pending(db, backend) == 0
+    assert backend.submitted == 1
+
+
+def _interrupt(db, item, submission_id, age):
+    """Leave an item as a crash between the claim and the commit of the batch id would."""
+    item.status = "submitting"
+    item.backend = "local"
+    item.submission_id = submission_id
+    item.submit_attempts = 1
+    item.submitted_at = datetime.now(timezone.utc) - timedelta(seconds=age)
+    db.commit()
+
+
+def test_stale_submissions_are_settled_with_the_backend(db, batches, tmp_path):
+    accepted, lost, recent = _enqueue(db, 3)
+    backend = LocalBatchBackend()
+    _interrupt(db, accepted, "accepted", age=120)
+    _interrupt(db, lost, "lost", age=120)
+    _interrupt(db, recent, "recent", age=5)
+    path = tmp_path / "accepted.jsonl"
+    path.write_text("")
+    backend.submit(str(path), "accepted")
+
+    assert batches.reconcile_stale(db, backend) == 2
+
+    for item in (accepted, lost, recent):
+        db.refresh(item)
+    assert (accepted.status, accepted.batch_id) == ("submitted", "local_batch_accepted")
+    assert (lost.status, lost.error) == ("pending", "Submission interrupted")
+    assert recent.status == "submitting"
@@ -0,0 +1,107 @@
+import hashlib
+
+import pytest
+from fastapi import HTTPException
+
+from app.services.uploads import ChunkedUploadService
+
+
+@pytest.fixture
+def uploads(settings, tmp_path):
+    settings(
+        UPLOAD_TMP_DIR=str(tmp_path),
+        UPLOAD_MIN_CHUNK_BYTES=4,
+        UPLOAD_MAX_CHUNK_BYTES=8,
+        UPLOAD_MAX_ACTIVE_PER_CALLER=2,
+        UPLOAD_MAX_ACTIVE_BYTES_PER_CALLER=100,
+    )
+    return ChunkedUploadService
+
+
+DATA = b"%PDF-1.4 chunked body"
+
+
+def _start(uploads, caller="ip:127.0.0.1", data=DATA):
+    return uploads.initiate("filing.pdf", len(data), hashlib.sha256(data).hexdigest(), {"name": "W"}, None, caller)
+
+
+def test_resume_from_received_after_lost_chunks(uploads):
+    upload_id = _start(uploads)["upload_id"]
+    uploads.append_chunk(upload_id, 0, DATA[:8])
+    uploads.append_chunk(upload_id, 8, DATA[8:16])
+
+    # The client lost track; the status says where to carry on
+    resume_at = uploads.status(upload_id)["received"]
+    assert resume_at == 16
+    uploads.append_chunk(upload_id, resume_at, DATA[resume_at:])
+
+    state = uploads.complete(upload_id)
+    assert state["file_sha256"] == hashlib.sha256(DATA).hexdigest()
+    with open(uploads.data_path(upload_id), "rb") as f:
+        assert f.read() == DATA
+
+
+def test_resent_chunk_is_accepted_without_change(uploads):
+    upload_id = _start(uploads)["upload_id"]
+    uploads.append_chunk(upload_id, 0, DATA[:8])
+
+    state = uploads.append_chunk(upload_id, 0, DATA[:8])
+
+    assert state["received"] == 8 and len(state["chunks"]) == 1
+
+
+def test_out_of_order_chunk_reports_expected_offset(uploads):
+    upload_id = _start(uploads)["upload_id"]
+    uploads.append_chunk(upload_id, 0, DATA[:8])
+
+    with pytest.raises(HTTPException) as exc_info:
+        uploads.append_chunk(upload_id, 16, DATA[16:])
+    assert exc_info.value.status_code == 409
+    assert exc_info.value.detail["expected_offset"] == 8
+
+
+def test_checksum_mismatch_is_rejected(uploads):
+    upload_id = _start(uploads)["upload_id"]
+    with pytest.raises(HTTPException) as exc_info:
+        uploads.append_chunk(upload_id, 0, DATA[:8], chunk_sha256="0" * 64)
+    assert exc_info.value.status_code == 400
+
+    corrupt = _start(uploads, data=DATA)["upload_id"]
+    for offset in range(0, len(DATA), 8):
+        uploads.append_chunk(corrupt, offset, DATA[offset:offset + 8].replace(b"P", b"Q"))
+    with pytest.raises(HTTPException) as exc_info:
+        uploads.complete(corrupt)
+    assert exc_info.value.status_code == 400
+
+
+def test_only_the_last_chunk_may_be_small(uploads):
+    upload_id = _start(uploads)["upload_id"]
+    with pytest.raises(HTTPException) as exc_info:
+        uploads.append_chunk(upload_id, 0, DATA[:2])
+    assert exc_info.value.status_code == 400
+
+    uploads.append_chunk(upload_id, 0, DATA[:8])
+    uploads.append_chunk(upload_id, 8, DATA[8:16])
+    assert uploads.append_chunk(upload_id, 16, DATA[16:])["received"] == len(DATA)
+
+
+def test_unfinished_uploads_are_limited_per_caller(uploads):
+    first = _start(uploads)["upload_id"]
+    _start(uploads)
+
+    with pytest.raises(HTTPException) as exc_info:
+        _start(uploads)
+    assert exc_info.value.status_code == 429
+    # Other callers have their own allowance
+    _start(uploads, caller="user:7")
+
+    uploads.discard(first)
+    _start(uploads)
+
+
+def test_declared_bytes_are_limited_per_caller(uploads):
+    _start(uploads, data=b"x" * 60 + DATA)
+
+    with pytest.raises(HTTPException) as exc_info:
+        _start(uploads, data=b"x" * 60 + DATA)
+    assert exc_info.value.status_code == 429
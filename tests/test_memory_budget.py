@@ -0,0 +1,102 @@
+import asyncio
+
+import pytest
+from fastapi import HTTPException
+
+from app.core import memory
+from app.core.memory import MB, MemoryBudget
+
+
+@pytest.fixture
+def budget(settings):
+    settings(MEMORY_GLOBAL_BUDGET_MB=100, MEMORY_QUEUE_TIMEOUT_SECONDS=5.0)
+    return MemoryBudget()
+
+
+@pytest.mark.asyncio
+async def test_requests_that_do_not_fit_wait_in_line(budget):
+    await budget.acquire(60 * MB)
+    granted = []
+
+    async def request(name, nbytes):
+        await budget.acquire(nbytes)
+        granted.append(name)
+
+    large = asyncio.create_task(request("large", 70 * MB))
+    await asyncio.sleep(0)
+    # Would fit, but the large request is first in line
+    small = asyncio.create_task(request("small", 10 * MB))
+    await asyncio.sleep(0)
+    assert granted == [] and budget.queued() == 2
+
+    budget.release(60 * MB)
+    await asyncio.gather(large, small)
+    assert granted == ["large", "small"]
+    assert budget.reserved == 80 * MB
+
+
+@pytest.mark.asyncio
+async def test_queue_timeout_is_503_and_frees_the_line(budget, settings):
+    settings(MEMORY_QUEUE_TIMEOUT_SECONDS=0.01)
+    await budget.acquire(90 * MB)
+
+    with pytest.raises(HTTPException) as exc_info:
+        await budget.acquire(20 * MB)
+    assert exc_info.value.status_code == 503
+    assert "Retry-After" in exc_info.value.headers
+    assert budget.queued() == 0 and budget.reserved == 90 * MB
+
+
+@pytest.mark.asyncio
+async def test_cancelled_waiter_lets_the_next_one_in(budget):
+    await budget.acquire(60 * MB)
+    blocked = asyncio.create_task(budget.acquire(70 * MB))
+    await asyncio.sleep(0)
+    behind = asyncio.create_task(budget.acquire(30 * MB))
+    await asyncio.sleep(0)
+
+    blocked.cancel()
+    with pytest.raises(asyncio.CancelledError):
+        await blocked
+    await behind
+    assert budget.reserved == 90 * MB
+
+
+@pytest.mark.asyncio
+async def test_oversized_request_runs_alone(budget):
+    await budget.acquire(150 * MB)
+    assert budget.reserved == 150 * MB
+
+
+def test_shrink_hands_back_the_difference(budget):
+    budget.reserved = 80 * MB
+    assert budget.shrink(80 * MB, 20 * MB) == 20 * MB
+    assert budget.reserved == 20 * MB
+    assert budget.shrink(20 * MB, 50 * MB) == 20 * MB
+
+
+def test_upload_size_cap_follows_the_request_budget(settings):
+    settings(MEMORY_REQUEST_BUDGET_MB=2560, MEMORY_REQUEST_BASE_MB=16, MEMORY_BYTES_PER_UPLOAD_BYTE=8.0)
+    assert memory.max_upload_bytes() >= 300 * MB
+    memory.check_upload_size(300 * MB)
+
+    with pytest.raises(HTTPException) as exc_info:
+        memory.check_upload_size(400 * MB)
+    assert exc_info.value.status_code == 413
+
+
+@pytest.mark.asyncio
+async def test_reservation_takes_over_handed_over_bytes(settings):
+    settings(MEMORY_BYTES_PER_UPLOAD_BYTE=1.0, MEMORY_REQUEST_BASE_MB=0, MEMORY_REQUEST_BUDGET_MB=100,
+             MEMORY_GLOBAL_BUDGET_MB=100)
+    budget = memory.memory_budget
+    before = budget.reserved
+    await budget.acquire(30 * MB)
+    memory.hand_over(30 * MB)
+
+    held = await memory.reserve_for_upload(10 * MB)
+
+    assert held == 10 * MB
+    assert budget.reserved == before + 10 * MB
+    budget.release(held)
+    assert budget.reserved == before
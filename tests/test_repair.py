@@ -0,0 +1,159 @@
+import json
+from types import SimpleNamespace
+
+import pytest
+
+from app.services.compliance_scan.repair import (can_reask, coerce_fields, merge_repair, repair_inputs,
+                                                 salvage_fields)
+
+COMPLETE = {
+    "compliance_score": 82,
+    "compliance_status": "Needs attention",
+    "compliance_message": "Two weekly EAS tests are missing.",
+    "summary_of_findings": "Mostly compliant.",
+    "section_breakdown": "EAS logs are incomplete.",
+    "specific_issues": "Missed RWTs in March.",
+    "recommendations": "Log every RWT.",
+    "section_scores": {"EAS Compliance": 60, "RF Exposure": 95},
+}
+
+
+def _tool_call(arguments):
+    return SimpleNamespace(
+        additional_kwargs={"tool_calls": [{"function": {"name": "compliance_scan", "arguments": arguments}}]},
+        content="",
+    )
+
+
+def _text(content):
+    return SimpleNamespace(additional_kwargs={}, content=content)
+
+
+def test_fixable_values_are_coerced():
+    fields = dict(COMPLETE, compliance_score="85/100", specific_issues=["a", "b"],
+                  section_scores=[{"section": "EAS Compliance", "score": "90%"}])
+
+    valid, problems = coerce_fields(fields)
+
+    assert problems == {}
+    assert valid["compliance_score"] == 85
+    assert valid["specific_issues"] == "- a\n- b"
+    assert valid["section_scores"] == {"EAS Compliance": 90}
+
+
+def test_missing_and_invalid_fields_are_reported():
+    fields = {key: value for key, value in COMPLETE.items() if key != "recommendations"}
+    fields["compliance_score"] = "not scored"
+
+    valid, problems = coerce_fields(fields)
+
+    assert set(problems) == {"recommendations", "compliance_score"}
+    assert problems["recommendations"] == "missing"
+    assert "compliance_score" not in valid
+
+
+def test_truncated_arguments_keep_complete_fields():
+    arguments = json.dumps(COMPLETE)
+    cut = arguments[:arguments.index('"section_breakdown"') + len('"section_breakdown": "EAS lo')]
+
+    fields = salvage_fields(_tool_call(cut))
+
+    assert "section_breakdown" not in fields
+    assert fields["summary_of_findings"] == "Mostly compliant."
+
+
+@pytest.mark.parametrize("content, expected", [
+    ('Sure: {"compliance_score": 80, "summ', {"compliance_score": 80}),
+    ('Sure: {"compliance_score": 80, "summary_of_findings": "ok"} Hope this helps',
+     {"compliance_score": 80, "summary_of_findings": "ok"}),
+    ('{"compliance_score": 8', {}),
+    ("no JSON here", {}),
+])
+def test_fields_are_salvaged_from_message_text(content, expected):
+    assert salvage_fields(_text(content)) == expected
+
+
+def test_reask_needs_the_score_and_another_field():
+    assert not can_reask(coerce_fields({})[0])
+    assert not can_reask(coerce_fields({"compliance_score": 70})[0])
+    assert not can_reask(coerce_fields({"summary_of_findings": "x", "recommendations": "y"})[0])
+    assert can_reask(coerce_fields({"compliance_score": 70, "summary_of_findings": "x"})[0])
+
+
+def test_document_excerpt_only_for_score_fields():
+    valid, problems = coerce_fields({key: value for key, value in COMPLETE.items() if key != "section_scores"})
+    assert "DOCUMENT TEXT" in repair_inputs(valid, problems, "DOCUMENT TEXT")["document_excerpt"]
+
+    valid, problems = coerce_fields({key: value for key, value in COMPLETE.items() if key != "recommendations"})
+    assert "DOCUMENT TEXT" not in repair_inputs(valid, problems, "DOCUMENT TEXT")["document_excerpt"]
+
+
+def test_merge_uses_the_follow_up_for_missing_fields_only():
+    valid, _ = coerce_fields({key: value for key, value in COMPLETE.items() if key != "recommendations"})
+    follow_up = {"parsed": None, "raw": _tool_call(json.dumps({"recommendations": "Fix it", "compliance_score": 5}))}
+
+    merged = merge_repair(valid, follow_up)
+
+    assert merged.recommendations == "Fix it"
+    assert merged.compliance_score == 82
+
+
+def test_merge_raises_when_fields_are_still_missing():
+    valid, _ = coerce_fields({key: value for key, value in COMPLETE.items() if key != "recommendations"})
+    with pytest.raises(ValueError):
+        merge_repair(valid, {"parsed": None, "raw": _tool_call("{}")})
+
+
+class _Chain:
+    def __init__(self, result):
+        self.result = result
+        self.calls = []
+
+    def invoke(self, inputs):
+        self.calls.append(inputs)
+        return self.result
+
+
+def _with_usage(raw, total_tokens):
+    raw.response_metadata = {"token_usage": {"prompt_tokens": total_tokens - 100, "completion_tokens": 100,
+                                             "total_tokens": total_tokens}}
+    raw.usage_metadata = None
+    return raw
+
+
+def _scan_with(monkeypatch, raw, follow_up="{}"):
+    from app.services.compliance_scan import compliance_scanner
+
+    scan = _Chain({"raw": _with_usage(raw, 1000), "parsed": None, "parsing_error": ValueError("validation failed")})
+    repair = _Chain({"raw": _with_usage(_tool_call(follow_up), 150), "parsed": None, "parsing_error": None})
+    monkeypatch.setattr(compliance_scanner, "get_compliance_scan_chain", lambda *args, **kwargs: scan)
+    monkeypatch.setattr(compliance_scanner, "get_repair_chain", lambda *args, **kwargs: repair)
+    agent = compliance_scanner.ComplianceScanAgent()
+    result = agent.generate_compliance_scan({"compliance_data": "DOCUMENT TEXT", "questions": []})
+    return agent, repair, result
+
+
+def test_scan_with_nothing_salvaged_falls_back_without_reasking(monkeypatch):
+    agent, repair, _ = _scan_with(monkeypatch, _text("I cannot help with that."))
+
+    assert agent.used_fallback
+    assert repair.calls == []
+
+
+def test_scan_with_cut_off_text_falls_back_without_crashing(monkeypatch):
+    agent, repair, _ = _scan_with(monkeypatch, _text('Sure: {"compliance_score": 80, "summ'))
+
+    assert agent.used_fallback
+    assert repair.calls == []
+
+
+def test_scan_missing_scores_reasks_with_the_document(monkeypatch):
+    partial = {key: value for key, value in COMPLETE.items() if key != "section_scores"}
+    follow_up = json.dumps({"section_scores": {"EAS Compliance": 61}})
+
+    agent, repair, result = _scan_with(monkeypatch, _tool_call(json.dumps(partial)), follow_up)
+
+    assert not agent.used_fallback
+    (inputs,) = repair.calls
+    assert "DOCUMENT TEXT" in inputs["document_excerpt"]
+    assert result.document.detailedReport.compliance_score == 82
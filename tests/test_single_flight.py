@@ -0,0 +1,87 @@
+import asyncio
+
+import pytest
+
+from app.services.compliance_scan.single_flight import SingleFlight
+
+
+class Work:
+    """A scan stand-in that runs until released, counting starts and cancellations."""
+
+    def __init__(self):
+        self.started = 0
+        self.cancelled = 0
+        self.release = asyncio.Event()
+
+    async def __call__(self):
+        self.started += 1
+        try:
+            await self.release.wait()
+        except asyncio.CancelledError:
+            self.cancelled += 1
+            raise
+        return "assessment"
+
+
+@pytest.mark.asyncio
+async def test_identical_calls_share_one_run():
+    flights, work = SingleFlight("test"), Work()
+    leader = asyncio.create_task(flights.run("doc", work))
+    follower = asyncio.create_task(flights.run("doc", work))
+    await asyncio.sleep(0)
+    work.release.set()
+
+    assert await leader == ("assessment", False)
+    assert await follower == ("assessment", True)
+    assert work.started == 1
+    assert flights.in_flight() == 0
+
+
+@pytest.mark.asyncio
+async def test_cancelled_waiter_does_not_cancel_the_others():
+    flights, work = SingleFlight("test"), Work()
+    leader = asyncio.create_task(flights.run("doc", work))
+    follower = asyncio.create_task(flights.run("doc", work))
+    await asyncio.sleep(0)
+
+    leader.cancel()
+    with pytest.raises(asyncio.CancelledError):
+        await leader
+    work.release.set()
+
+    assert await follower == ("assessment", True)
+    assert work.cancelled == 0
+
+
+@pytest.mark.asyncio
+async def test_work_is_cancelled_when_every_waiter_has_gone():
+    flights, work = SingleFlight("test"), Work()
+    waiters = [asyncio.create_task(flights.run("doc", work)) for _ in range(2)]
+    await asyncio.sleep(0)
+
+    for waiter in waiters:
+        waiter.cancel()
+    await asyncio.gather(*waiters, return_exceptions=True)
+    await asyncio.sleep(0)
+
+    assert work.cancelled == 1
+    assert flights.in_flight() == 0
+
+    # The next identical call starts fresh work rather than joining the cancelled run
+    work.release.set()
+    assert await flights.run("doc", work) == ("assessment", False)
+    assert work.started == 2
+
+
+@pytest.mark.asyncio
+async def test_failure_reaches_every_waiter():
+    flights = SingleFlight("test")
+
+    async def fail():
+        await asyncio.sleep(0)
+        raise RuntimeError("model unavailable")
+
+    results = await asyncio.gather(flights.run("doc", fail), flights.run("doc", fail), return_exceptions=True)
+
+    assert [str(result) for result in results] == ["model unavailable"] * 2
+    assert flights.in_flight() == 0
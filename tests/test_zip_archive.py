@@ -0,0 +1,105 @@
+import io
+import struct
+import zipfile
+
+import pytest
+from fastapi import HTTPException
+
+from app.services.uploads import ZipArchiveService
+
+PDF = b"%PDF-1.4\n" + b"1 0 obj << >> endobj\n" * 20 + b"%%EOF\n"
+
+
+@pytest.fixture
+def limits(settings):
+    settings(
+        ZIP_MAX_ENTRIES=10,
+        ZIP_MAX_ENTRY_BYTES=64 * 1024,
+        ZIP_MAX_TOTAL_BYTES=256 * 1024,
+        ZIP_MAX_COMPRESSION_RATIO=50.0,
+    )
+
+
+def _zip(entries, compression=zipfile.ZIP_DEFLATED):
+    buffer = io.BytesIO()
+    with zipfile.ZipFile(buffer, "w", compression) as archive:
+        for name, data in entries:
+            archive.writestr(name, data)
+    buffer.seek(0)
+    return buffer
+
+
+def _declare_size(buffer, size):
+    """Rewrite every header of a one-entry archive to declare ``size`` uncompressed bytes."""
+    data = bytearray(buffer.getvalue())
+    local = data.index(b"PK\x03\x04")
+    struct.pack_into("<I", data, local + 22, size)
+    central = data.index(b"PK\x01\x02")
+    struct.pack_into("<I", data, central + 24, size)
+    return io.BytesIO(bytes(data))
+
+
+def _read_only_entry(buffer):
+    archive = ZipArchiveService.open_archive(buffer)
+    (info,) = ZipArchiveService.entries(archive)
+    return ZipArchiveService.read_entry(archive, info, total_left=256 * 1024)
+
+
+def test_pdf_entry_is_read_into_memory(limits):
+    assert _read_only_entry(_zip([("filings/report.pdf", PDF)])).read() == PDF
+
+
+def test_not_a_zip_is_400(limits):
+    with pytest.raises(HTTPException) as exc_info:
+        ZipArchiveService.open_archive(io.BytesIO(PDF))
+    assert exc_info.value.status_code == 400
+
+
+def test_too_many_entries_is_413(limits):
+    with pytest.raises(HTTPException) as exc_info:
+        ZipArchiveService.open_archive(_zip([(f"{i}.pdf", PDF) for i in range(11)]))
+    assert exc_info.value.status_code == 413
+
+
+def test_declared_total_over_the_limit_is_413(limits):
+    entries = [(f"{i}.pdf", PDF + b"\0" * 60 * 1024) for i in range(5)]
+    with pytest.raises(HTTPException) as exc_info:
+        ZipArchiveService.open_archive(_zip(entries))
+    assert exc_info.value.status_code == 413
+
+
+def test_entry_over_the_size_limit_is_413(limits):
+    big = PDF + bytes(range(256)) * 300
+    with pytest.raises(HTTPException) as exc_info:
+        _read_only_entry(_zip([("big.pdf", big)], zipfile.ZIP_STORED))
+    assert exc_info.value.status_code == 413
+
+
+def test_bomb_is_stopped_by_compression_ratio(limits):
+    bomb = PDF + b"\0" * 60 * 1024
+    with pytest.raises(HTTPException) as exc_info:
+        _read_only_entry(_zip([("bomb.pdf", bomb)]))
+    assert exc_info.value.status_code == 413
+    assert "compressed size" in exc_info.value.detail
+
+
+def test_understated_size_never_yields_more_than_declared(limits):
+    archive = _declare_size(_zip([("bomb.pdf", PDF + b"\0" * 60 * 1024)]), len(PDF))
+    with pytest.raises(HTTPException) as exc_info:
+        _read_only_entry(archive)
+    assert exc_info.value.status_code in (413, 422)
+
+
+def test_entry_that_is_not_a_pdf_is_422(limits):
+    with pytest.raises(HTTPException) as exc_info:
+        _read_only_entry(_zip([("report.pdf", b"MZ not a pdf")]))
+    assert exc_info.value.status_code == 422
+
+
+def test_non_pdf_and_hidden_entries_are_skipped(limits):
+    archive = ZipArchiveService.open_archive(
+        _zip([("a.pdf", PDF), ("notes.txt", b"x"), ("__MACOSX/._a.pdf", b"x"), ("dir/.hidden.pdf", PDF)])
+    )
+    entries = ZipArchiveService.entries(archive)
+    assert [info.filename for info in entries] == ["a.pdf", "notes.txt"]
+    assert [ZipArchiveService.skip_reason(info) for info in entries] == [None, "not a PDF file"]